@@ -2,17 +2,17 @@ import os
 import random
 import json
 
-from groq import Groq
+from llm_gateway import gateway
+from text_analyser import analyse
 
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 MODEL_NAME = "llama-3.1-8b-instant"
+# bump when the exam guide prompt changes so cached guides are not reused
+EXAM_PROMPT_VERSION = "1"
+EXAM_ERROR_TEXT = "Error generating exam guide."
 
-TOPICS = {
-    "study": ["study", "learn", "syllabus", "notes"],
-    "exam": ["exam", "test", "marks", "result", "prepare"],
-    "stress": ["stress", "pressure", "overwhelmed", "tired"],
-    "coding": ["python", "code", "debug", "error", "logic"],
-}
+# per-call deadlines (seconds)
+CHAT_DEADLINE = float(os.getenv("LLM_CHAT_DEADLINE", "30"))
+EXAM_DEADLINE = float(os.getenv("LLM_EXAM_DEADLINE", "90"))
 
 SUGGESTIONS = {
     "study": ["Create study timetable", "Memory tricks", "Explain topic"],
@@ -24,11 +24,7 @@ SUGGESTIONS = {
 
 
 def detect_topic(text):
-    t = text.lower()
-    for topic, words in TOPICS.items():
-        if any(w in t for w in words):
-            return topic
-    return "general"
+    return analyse(text).topic
 
 
 def get_suggestions(topic):
@@ -97,6 +93,20 @@ def clean_exam_output(text):
 # AI CHAT BULLET GENERATOR
 # ---------------------------------------------------------
 
+def format_bullet_line(l):
+    """Turn one stripped line into a clean • bullet."""
+    if l.startswith("- "):
+        l = "• " + l[2:]
+
+    if l.startswith("* "):
+        l = "• " + l[2:]
+
+    if not l.startswith("• "):
+        l = "• " + l
+
+    return l
+
+
 def format_bullets_clean(text):
     """(kept for chat part) converts raw bullets to clean • bullets"""
     lines = []
@@ -107,46 +117,110 @@ def format_bullets_clean(text):
         if not l:
             continue
 
-        if l.startswith("- "):
-            l = "• " + l[2:]
-
-        if l.startswith("* "):
-            l = "• " + l[2:]
+        lines.append(format_bullet_line(l))
 
-        if not l.startswith("• "):
-            l = "• " + l
+    return "\n".join(lines)
 
-        lines.append(l)
 
-    return "\n".join(lines)
+class BulletStreamFormatter:
+    """
+    Incremental version of format_bullets_clean for streamed replies.
 
+    feed() takes raw token text and returns the formatted text that is safe
+    to send right away. A line's bullet prefix is only decided once its first
+    few characters are known, and trailing whitespace is held back, so the
+    concatenated output is identical to format_bullets_clean(full_text).
+    """
 
-def generate_ai_reply(history, user_text):
+    def __init__(self):
+        self.parts = []
+        self._lead = ""          # start of the current line, before the prefix is decided
+        self._decided = False
+        self._ws = ""            # held-back whitespace inside the current line
+        self._line_started = False
+        self._any_line = False
+
+    def _start_line(self, formatted):
+        out = ("\n" if self._any_line else "") + formatted
+        self._any_line = True
+        self._line_started = True
+        return out
+
+    def _end_line(self):
+        out = ""
+        if not self._decided and self._lead.strip():
+            out = self._start_line(format_bullet_line(self._lead.strip()))
+        self._lead = ""
+        self._decided = False
+        self._ws = ""
+        self._line_started = False
+        return out
+
+    def feed(self, chunk):
+        out = []
+        for c in chunk:
+            if c == "\n":
+                out.append(self._end_line())
+            elif not self._decided:
+                if not self._lead and c.isspace():
+                    continue
+                self._lead += c
+                head = self._lead.rstrip()
+                if len(head) >= 3 or self._lead[0] not in "-*•":
+                    self._decided = True
+                    self._ws = self._lead[len(head):]
+                    out.append(self._start_line(format_bullet_line(head)))
+            elif c.isspace():
+                self._ws += c
+            else:
+                out.append(self._ws + c)
+                self._ws = ""
+        text = "".join(out)
+        self.parts.append(text)
+        return text
+
+    def flush(self):
+        text = self._end_line()
+        self.parts.append(text)
+        return text
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+
+SYSTEM_PROMPT_CHAT = (
+    "You are a helpful AI student assistant.\n"
+    "STRICT BULLET RULES:\n"
+    "1. Answer ONLY in bullet points.\n"
+    "2. MAX 5 bullets.\n"
+    "3. Each bullet must be short.\n"
+    "4. No paragraphs.\n"
+    "5. No emojis unless user uses them.\n"
+)
+
+CHAT_ERROR_REPLY = ("• Something went wrong\n• Try again later", ["Try again", "Help me", "Explain more"])
+
+
+def build_chat_messages(history, user_text):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT_CHAT}]
+
+    for m in history:
+        messages.append({
+            "role": m["role"],
+            "content": m["content"]
+        })
+
+    messages.append({"role": "user", "content": user_text})
+    return messages
+
+
+def generate_ai_reply(history, user_text, topic=None):
     try:
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are a helpful AI student assistant.\n"
-                    "STRICT BULLET RULES:\n"
-                    "1. Answer ONLY in bullet points.\n"
-                    "2. MAX 5 bullets.\n"
-                    "3. Each bullet must be short.\n"
-                    "4. No paragraphs.\n"
-                    "5. No emojis unless user uses them.\n"
-                )
-            }
-        ]
-
-        for m in history:
-            messages.append({
-                "role": m["role"],
-                "content": m["content"]
-            })
-
-        messages.append({"role": "user", "content": user_text})
-
-        response = client.chat.completions.create(
+        messages = build_chat_messages(history, user_text)
+
+        response = gateway.complete(
+            deadline=CHAT_DEADLINE,
             model=MODEL_NAME,
             messages=messages,
             temperature=0.3
@@ -155,14 +229,97 @@ def generate_ai_reply(history, user_text):
         bot = response.choices[0].message.content.strip()
 
         bot_clean = format_bullets_clean(bot)
-        topic = detect_topic(user_text)
+        topic = topic or detect_topic(user_text)
         suggestions = get_suggestions(topic)
 
         return bot_clean, suggestions
 
     except Exception as e:
         print("🔥 AI ERROR:", e)
-        return ("• Something went wrong\n• Try again later", ["Try again", "Help me", "Explain more"])
+        return CHAT_ERROR_REPLY
+
+
+def stream_ai_reply(history, user_text, topic=None):
+    """
+    Streaming variant of generate_ai_reply.
+
+    Yields ("token", text) pieces of the already bullet-formatted reply as the
+    model produces them, then one final ("done", (reply, suggestions)).
+    """
+    fmt = BulletStreamFormatter()
+    try:
+        messages = build_chat_messages(history, user_text)
+
+        stream = gateway.stream(
+            deadline=CHAT_DEADLINE,
+            model=MODEL_NAME,
+            messages=messages,
+            temperature=0.3
+        )
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            piece = chunk.choices[0].delta.content or ""
+            out = fmt.feed(piece)
+            if out:
+                yield "token", out
+
+        out = fmt.flush()
+        if out:
+            yield "token", out
+
+        reply = fmt.text
+        if not reply:
+            yield "done", CHAT_ERROR_REPLY
+            return
+
+        topic = topic or detect_topic(user_text)
+        yield "done", (reply, get_suggestions(topic))
+
+    except Exception as e:
+        print("🔥 AI STREAM ERROR:", e)
+        if fmt.text:
+            # keep what the student already saw, and close the reply cleanly
+            fmt.flush()
+            yield "done", (fmt.text, CHAT_ERROR_REPLY[1])
+        else:
+            yield "done", CHAT_ERROR_REPLY
+
+
+def summarize_conversation(previous_summary, turns):
+    """
+    Fold a batch of older chat turns into the rolling session summary.
+    Returns the new summary, or None if the model call failed.
+    """
+    try:
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        prompt = (
+            "Current summary of the conversation:\n"
+            f"{previous_summary or '(none yet)'}\n\n"
+            "New messages:\n"
+            f"{transcript}\n\n"
+            "Rewrite the summary so it also covers the new messages. "
+            "Keep facts about the student, their goals and open questions. "
+            "Max 120 words, plain text."
+        )
+
+        response = gateway.complete(
+            deadline=CHAT_DEADLINE,
+            model=MODEL_NAME,
+            messages=[
+                {"role": "system", "content": "You summarise student support chats."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.2,
+            max_tokens=300
+        )
+
+        return response.choices[0].message.content.strip() or None
+
+    except Exception as e:
+        print("🔥 AI SUMMARY ERROR:", e)
+        return None
 
 
 # ---------------------------------------------------------
@@ -205,7 +362,8 @@ Now generate the exam preparation guide for: {subject}.
 Make the content relevant, simple, and exam-focused.
 """
 
-        response = client.chat.completions.create(
+        response = gateway.complete(
+            deadline=EXAM_DEADLINE,
             model=MODEL_NAME,
             messages=[
                 {"role": "system", "content": "Return ONLY JSON. No formatting mistakes."},
@@ -226,7 +384,7 @@ Make the content relevant, simple, and exam-focused.
 
     except Exception as e:
         print("❌ AI Engine Error:", e)
-        return "Error generating exam guide."
+        return EXAM_ERROR_TEXT
 
 def format_exam_sections(data):
     """Convert JSON structure into clean ChatGPT-style formatted exam guide."""
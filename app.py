@@ -1,40 +1,57 @@
 # app.py
 import os
-import re
-from werkzeug.utils import secure_filename
+import click
+import json
+import base64
+import time
+import queue
+from urllib.parse import unquote
 from datetime import datetime, timedelta, timezone, date
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_from_directory
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_from_directory, send_file, Response, stream_with_context
+from sqlalchemy import insert
 from flask_login import LoginManager, login_required, login_user, logout_user, current_user
-from config import Config
-from db import db
-from models import User, ChatSession, Message, Assignment, Note, ExamHelper
-from ai_engine import generate_ai_reply
+from config import get_config
+from db import db, apply_sqlite_pragmas, missing_tables
+from models import User, ChatSession, Message, Assignment, Note, NoteShare, ExamHelper, Attachment, Job, PomodoroSession
+from attachments import attachment_store, AttachmentTooLarge
+from ai_engine import generate_ai_reply, stream_ai_reply, EXAM_ERROR_TEXT
+from chat_context import build_history
+from text_analyser import analyse, title_from_tokens
+from fast_path import triage, PATH_LLM
+from exam_cache import exam_guides, cache_key
+from jobqueue import jobs, job_status
+import pomodoro_stats
+import assignments_api
+from conditional import conditional, bump, version, ASSIGNMENTS, NOTES, POMODORO, EXAM_HISTORY
+from reminders import reminder_scheduler
+from assets import asset_pipeline
+from fragments import fragment_cache
+from sidebar import sidebar_index, start_sweeper
+from search import search, search_available, rebuild_search, html_to_text
 from datetime import datetime, date, timedelta
 from flask import jsonify, request, render_template
 from flask_login import login_required, current_user
 
 
-STOPWORDS = {
-    "i","me","my","we","our","you","your","the","a","an","and","or","but","to","for","of","in","on",
-    "is","are","was","were","this","that","these","those","with","by","from","at","be","as","it's","its"
-}
 ALLOWED_EXT = {"png","jpg","jpeg","gif","pdf","txt","docx","pptx"}
 
 def make_title_from_text(text, max_words=4):
-    t = re.sub(r"[^0-9A-Za-z\s]", " ", (text or "")).lower()
-    words = [w for w in t.split() if w and w not in STOPWORDS]
-    if not words:
-        words = [w for w in t.split()][:max_words]
-    words = words[:max_words]
-    title = " ".join(w.capitalize() for w in words).strip()
-    return title or "New Chat"
+    return title_from_tokens(analyse(text).title_tokens, max_words=max_words)
 
 def create_app():
     app = Flask(__name__, template_folder="templates", static_folder="static")
-    app.config.from_object(Config)
+    app.config.from_object(get_config())
+    app.logger.setLevel(app.config["LOG_LEVEL"])
 
     os.makedirs(os.path.join(app.root_path, "instance"), exist_ok=True)
+    fragment_cache.init_app(app)
     db.init_app(app)
+    exam_guides.init_app(app)
+    sidebar_index.init_app(app)
+    attachment_store.init_app(app)
+    jobs.init_app(app)
+    reminder_scheduler.init_app(app)
+    asset_pipeline.init_app(app)
 
     login_manager = LoginManager()
     login_manager.login_view = "login"
@@ -47,46 +64,12 @@ def create_app():
         except Exception:
             return None
 
-    # cleanup empty old chats
-    def cleanup_old_empty_chats(user_id, older_than_minutes=60):
-        cutoff = datetime.now(timezone.utc) - timedelta(minutes=older_than_minutes)
-        empty_sessions = (ChatSession.query
-                          .filter_by(user_id=user_id)
-                          .outerjoin(Message, ChatSession.id == Message.session_id)
-                          .group_by(ChatSession.id)
-                          .having(db.func.count(Message.id) == 0)
-                          .filter(ChatSession.created_at < cutoff)
-                          .all())
-        for s in empty_sessions:
-            db.session.delete(s)
-        if empty_sessions:
-            db.session.commit()
-
     @app.context_processor
     def inject_sessions():
         if not current_user.is_authenticated:
             return {"chat_sessions": []}
         try:
-            cleanup_old_empty_chats(current_user.id, older_than_minutes=60)
-
-            # chats that have messages (active not archived)
-            sub = (db.session.query(Message.session_id.label("sid"))
-                   .group_by(Message.session_id)
-                   .subquery())
-
-            active_chats = (ChatSession.query
-                            .filter(ChatSession.user_id == current_user.id, ChatSession.archived == False)
-                            .join(sub, ChatSession.id == sub.c.sid)
-                            .order_by(ChatSession.updated_at.desc())
-                            .all())
-
-            archived = (ChatSession.query
-                        .filter_by(user_id=current_user.id, archived=True)
-                        .order_by(ChatSession.updated_at.desc())
-                        .all())
-
-            # return active first then archived appended so templates can render both
-            return {"chat_sessions": active_chats + archived}
+            return {"chat_sessions": sidebar_index.get(current_user.id)}
         except Exception:
             return {"chat_sessions": []}
 
@@ -95,7 +78,7 @@ def create_app():
     def index():
         if not current_user.is_authenticated:
             return redirect(url_for("login"))
-        s = ChatSession.query.filter_by(user_id=current_user.id).order_by(ChatSession.updated_at.desc()).first()
+        s = ChatSession.latest_for(current_user.id).first()
         return redirect(url_for("chat", session_id=s.id)) if s else redirect(url_for("new_chat"))
 
     @app.route("/login", methods=["GET", "POST"])
@@ -103,7 +86,7 @@ def create_app():
         if request.method == "POST":
             username = (request.form.get("username") or "").strip()
             password = request.form.get("password") or ""
-            user = User.query.filter_by(username=username).first()
+            user = User.by_username(username).first()
             if user and user.check_password(password):
                 login_user(user)
                 return redirect(url_for("index"))
@@ -121,7 +104,7 @@ def create_app():
                 flash("All fields are required", "danger")
                 return redirect(url_for("register"))
 
-            if User.query.filter_by(username=username).first():
+            if User.by_username(username).first():
                 flash("Username already exists", "danger")
                 return redirect(url_for("register"))
 
@@ -149,13 +132,14 @@ def create_app():
     def new_chat():
         s = ChatSession(user_id=current_user.id, title="New Chat")
         db.session.add(s)
+        sidebar_index.invalidate(current_user.id)
         db.session.commit()
         return redirect(url_for("chat", session_id=s.id))
 
     @app.route("/chat")
     @login_required
     def chat_redirect():
-        s = ChatSession.query.filter_by(user_id=current_user.id).order_by(ChatSession.updated_at.desc()).first()
+        s = ChatSession.latest_for(current_user.id).first()
         if not s:
             return redirect(url_for("new_chat"))
         return redirect(url_for("chat", session_id=s.id))
@@ -164,16 +148,38 @@ def create_app():
     @login_required
     def chat(session_id):
         s = ChatSession.query.filter_by(id=session_id, user_id=current_user.id).first_or_404()
-        msgs = Message.query.filter_by(session_id=session_id).order_by(Message.created_at.asc()).all()
-        return render_template("chat.html", session=s, recent_messages=msgs, due_today=[])
-
-    def get_history(session_id):
-        msgs = Message.query.filter_by(session_id=session_id).order_by(Message.created_at.asc()).all()
-        arr = []
-        for m in msgs:
-            role = "assistant" if m.emotion == "bot_reply" else "user"
-            arr.append({"role": role, "content": m.text})
-        return arr
+        msgs, has_more = message_page(session_id)
+        return render_template("chat.html", session=s, recent_messages=msgs, has_more=has_more, due_today=[])
+
+    def message_page(session_id, before=None):
+        """Newest CHAT_PAGE_SIZE messages older than `before` (a Message.id), oldest first."""
+        size = app.config["CHAT_PAGE_SIZE"]
+        rows = Message.page_for(session_id, before=before, limit=size).all()
+        has_more = len(rows) > size
+        rows = rows[:size]
+        rows.reverse()
+        return rows, has_more
+
+    @app.route("/chat/<int:session_id>/messages")
+    @login_required
+    def chat_messages(session_id):
+        """Older transcript pages for scroll-up; ?before= is the id of the oldest message shown."""
+        ChatSession.query.filter_by(id=session_id, user_id=current_user.id).first_or_404()
+        before = request.args.get("before", type=int)
+        msgs, has_more = message_page(session_id, before=before)
+        return jsonify({
+            "messages": [
+                {
+                    "id": m.id,
+                    "role": "assistant" if m.emotion == "bot_reply" else "user",
+                    "text": m.text,
+                    "time": m.created_at.strftime('%H:%M') if m.created_at else ""
+                }
+                for m in msgs
+            ],
+            "before": msgs[0].id if msgs else None,
+            "has_more": has_more
+        })
 
     @app.route("/send/<int:session_id>", methods=["POST"])
     @login_required
@@ -183,20 +189,35 @@ def create_app():
         if not text:
             return jsonify({"reply": "Empty message", "suggestions": []})
 
-        user_msg = Message(user_id=current_user.id, session_id=session_id, text=text, emotion="user")
+        # one pass over the text: emotion labels, topic and title words
+        info = analyse(text)
+        user_msg = Message(user_id=current_user.id, session_id=session_id, text=text,
+                           emotion=info.emotion, score=info.score, crisis_flag=info.crisis)
         db.session.add(user_msg)
-        db.session.commit()
 
         # auto-name chat from first user message
         if not s.title or s.title.strip().lower().startswith("new chat"):
-            new_title = make_title_from_text(text, max_words=4)
+            new_title = title_from_tokens(info.title_tokens, max_words=4)
             s.title = new_title[:120]
             s.updated_at = datetime.now(timezone.utc)
-            db.session.commit()
+        sidebar_index.invalidate(current_user.id)
+        db.session.commit()
+
+        # crisis, greetings, thanks ... are answered locally without an LLM call
+        fast = triage(text, info)
+        if fast:
+            save_bot_reply(s, fast.reply, path=fast.path)
+            if wants_stream():
+                return stream_fast_reply(fast)
+            return jsonify({"reply": fast.reply, "suggestions": fast.suggestions, "path": fast.path})
+
+        history = build_history(s, exclude_id=user_msg.id)
+
+        if wants_stream():
+            return stream_reply(s, history, text, info.topic)
 
-        history = get_history(session_id)
         try:
-            ai_result = generate_ai_reply(history, text)
+            ai_result = generate_ai_reply(history, text, topic=info.topic)
             if isinstance(ai_result, tuple):
                 bot_reply = ai_result[0] or "Sorry, I couldn't generate a reply."
                 suggestions = ai_result[1] if len(ai_result) > 1 else []
@@ -207,13 +228,67 @@ def create_app():
             bot_reply = "Sorry, I'm having trouble right now."
             suggestions = []
 
-        bot_msg = Message(user_id=current_user.id, session_id=session_id, text=bot_reply, emotion="bot_reply")
+        save_bot_reply(s, bot_reply)
+
+        return jsonify({"reply": bot_reply, "suggestions": suggestions, "path": PATH_LLM})
+
+    def wants_stream():
+        if request.args.get("stream") == "1":
+            return True
+        return "text/event-stream" in (request.headers.get("Accept") or "")
+
+    def save_bot_reply(s, bot_reply, path=PATH_LLM):
+        bot_msg = Message(user_id=s.user_id, session_id=s.id, text=bot_reply, emotion="bot_reply",
+                          reply_path=path)
         db.session.add(bot_msg)
 
         s.updated_at = datetime.now(timezone.utc)
+        sidebar_index.invalidate(s.user_id)
         db.session.commit()
 
-        return jsonify({"reply": bot_reply, "suggestions": suggestions})
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def stream_reply(s, history, text, topic=None):
+        """Send the reply as Server-Sent Events; the bot Message is saved once the stream ends."""
+
+        def events():
+            bot_reply = "Sorry, I couldn't generate a reply."
+            suggestions = []
+            try:
+                for kind, value in stream_ai_reply(history, text, topic=topic):
+                    if kind == "token":
+                        yield sse("token", {"text": value})
+                    else:
+                        bot_reply = value[0] or bot_reply
+                        suggestions = value[1] or []
+                save_bot_reply(s, bot_reply)
+            except Exception:
+                app.logger.exception("streamed reply failed for chat %s", s.id)
+                db.session.rollback()
+                bot_reply = "Sorry, I'm having trouble right now."
+                try:
+                    save_bot_reply(s, bot_reply)
+                except Exception:
+                    db.session.rollback()
+                # the client replaces whatever partial reply it has shown
+                yield sse("error", {"reply": bot_reply})
+                return
+            yield sse("done", {"reply": bot_reply, "suggestions": suggestions, "path": PATH_LLM})
+
+        return sse_response(stream_with_context(events()))
+
+    def stream_fast_reply(fast):
+        """Same event shape as stream_reply, for a reply that is already complete."""
+        body = (sse("token", {"text": fast.reply}) +
+                sse("done", {"reply": fast.reply, "suggestions": fast.suggestions, "path": fast.path}))
+        return sse_response(body)
+
+    def sse_response(body):
+        resp = Response(body, mimetype="text/event-stream")
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.headers["X-Accel-Buffering"] = "no"
+        return resp
 
     # rename - supports AJAX (json) and form submit
     @app.route("/rename_chat/<int:session_id>", methods=["POST"])
@@ -228,6 +303,7 @@ def create_app():
         title = title or "Untitled Chat"
         s.title = title[:120]
         s.updated_at = datetime.now(timezone.utc)
+        sidebar_index.invalidate(current_user.id)
         db.session.commit()
         if request.is_json or request.headers.get("X-Requested-With") == "XMLHttpRequest":
             return jsonify({"ok": True, "title": s.title})
@@ -240,6 +316,7 @@ def create_app():
         s = ChatSession.query.filter_by(id=session_id, user_id=current_user.id).first_or_404()
         s.archived = True
         s.updated_at = datetime.now(timezone.utc)
+        sidebar_index.invalidate(current_user.id)
         db.session.commit()
         return jsonify({"ok": True, "sid": s.id, "title": s.title})
 
@@ -249,6 +326,7 @@ def create_app():
         s = ChatSession.query.filter_by(id=session_id, user_id=current_user.id).first_or_404()
         s.archived = False
         s.updated_at = datetime.now(timezone.utc)
+        sidebar_index.invalidate(current_user.id)
         db.session.commit()
         return jsonify({"ok": True, "sid": s.id, "title": s.title})
     
@@ -258,6 +336,7 @@ def create_app():
         s = ChatSession.query.filter_by(id=session_id, user_id=current_user.id).first_or_404()
         Message.query.filter_by(session_id=session_id).delete()
         db.session.delete(s)
+        sidebar_index.invalidate(current_user.id)
         db.session.commit()
         return jsonify({"ok": True, "sid": session_id})
     
@@ -267,23 +346,17 @@ def create_app():
     @login_required
     def fragment_assignments():
         today = date.today()
-        assignments = Assignment.query.filter_by(user_id=current_user.id).order_by(Assignment.due_date.asc()).all()
-        return render_template("fragments/assignments.html", assignments=assignments, today=today)
+        key = (current_user.id, version(current_user.id, ASSIGNMENTS), today)
+        return fragment_cache.render("fragments/assignments.html", key, lambda: {
+            "assignments": Assignment.query.filter_by(user_id=current_user.id)
+                                           .order_by(Assignment.due_date.asc()).all(),
+            "today": today,
+        })
     @app.route("/api/assignments", methods=["GET"])
     @login_required
+    @conditional(ASSIGNMENTS)
     def api_get_assignments():
-        assignments = Assignment.query.filter_by(user_id=current_user.id).order_by(Assignment.due_date.asc()).all()
-        return jsonify([{
-            "id": a.id,
-            "title": a.title,
-            "subject": a.subject,
-            "due_date": a.due_date.isoformat() if a.due_date else None,
-            "notes": a.notes,
-            "priority": a.priority if a.priority else "medium",
-            "status": a.status if a.status else "not_started",
-            "progress": a.progress if a.progress is not None else 0,
-            "is_overdue": a.due_date < date.today() if a.due_date else False
-        } for a in assignments])
+        return assignments_api.json_response(assignments_api.list_for(current_user.id, date.today()))
 
     @app.route("/api/assignments", methods=["POST"])
     @login_required
@@ -314,20 +387,14 @@ def create_app():
                 progress=progress
             )
             db.session.add(assignment)
+            db.session.flush()
+            bump(current_user.id, ASSIGNMENTS)
+            reminder_scheduler.record("assignment", assignment.id)
             db.session.commit()
-            return jsonify({
+            reminder_scheduler.schedule_assignment(assignment)
+            return assignments_api.json_response({
                 "ok": True,
-                "assignment": {
-                    "id": assignment.id,
-                    "title": assignment.title,
-                    "subject": assignment.subject,
-                    "due_date": assignment.due_date.isoformat() if assignment.due_date else None,
-                    "notes": assignment.notes,
-                    "priority": assignment.priority,
-                    "status": assignment.status,
-                    "progress": assignment.progress,
-                    "is_overdue": assignment.due_date < date.today() if assignment.due_date else False
-                }
+                "assignment": assignments_api.assignment_dict(assignment, date.today())
             })
         except Exception as e:
             db.session.rollback()
@@ -348,20 +415,13 @@ def create_app():
             due_date_str = data.get("due_date")
             if due_date_str:
                 assignment.due_date = datetime.strptime(due_date_str, "%Y-%m-%d").date()
+            bump(current_user.id, ASSIGNMENTS)
+            reminder_scheduler.record("assignment", assignment.id)
             db.session.commit()
-            return jsonify({
+            reminder_scheduler.schedule_assignment(assignment)
+            return assignments_api.json_response({
                 "ok": True,
-                "assignment": {
-                    "id": assignment.id,
-                    "title": assignment.title,
-                    "subject": assignment.subject,
-                    "due_date": assignment.due_date.isoformat() if assignment.due_date else None,
-                    "notes": assignment.notes,
-                    "priority": assignment.priority,
-                    "status": assignment.status,
-                    "progress": assignment.progress,
-                    "is_overdue": assignment.due_date < date.today() if assignment.due_date else False
-                }
+                "assignment": assignments_api.assignment_dict(assignment, date.today())
             })
         except Exception as e:
             db.session.rollback()
@@ -374,7 +434,10 @@ def create_app():
         try:
             assignment = Assignment.query.filter_by(id=assignment_id, user_id=current_user.id).first_or_404()
             db.session.delete(assignment)
+            bump(current_user.id, ASSIGNMENTS)
+            reminder_scheduler.record("assignment", assignment_id)
             db.session.commit()
+            reminder_scheduler.cancel("assignment", assignment_id)
             return jsonify({"ok": True, "id": assignment_id})
         except Exception as e:
             db.session.rollback()
@@ -382,55 +445,45 @@ def create_app():
 
     @app.route("/api/assignments/reminders", methods=["GET"])
     @login_required
+    @conditional(ASSIGNMENTS)
     def api_assignments_reminders():
         try:
             n_days = int(request.args.get("days", 3))
-            today = date.today()
-            soon = today + timedelta(days=n_days)
-
-            rows = Assignment.query.filter(
-                Assignment.user_id == current_user.id,
-                Assignment.due_date.isnot(None),        # must have due date
-                Assignment.due_date >= today,
-                Assignment.due_date <= soon,
-                Assignment.status != "completed"        # don’t remind completed ones
-            ).order_by(Assignment.due_date.asc()).all()
-
-            return jsonify([
-                {
-                    "id": r.id,
-                    "title": r.title,
-                    "subject": r.subject,
-                    "due_date": r.due_date.isoformat() if r.due_date else None,
-                    "notes": r.notes,
-                    "priority": getattr(r, "priority", "medium"),
-                    "status": getattr(r, "status", "not_started"),
-                    "progress": int(getattr(r, "progress", 0)),
-                }
-                for r in rows
-            ])
+            return assignments_api.json_response(
+                assignments_api.reminders_for(current_user.id, date.today(), days=n_days))
         except Exception as e:
             print("REMINDER ERROR:", e)
             return jsonify({"error": str(e)}), 500
 
 
+    @app.route("/reminders/stream")
+    @login_required
+    def reminders_stream():
+        """Server-Sent Events: one "reminder" event per assignment / note reminder as it falls due."""
+        user_id = current_user.id
+        heartbeat = app.config["REMINDER_HEARTBEAT_SECONDS"]
+
+        def events():
+            q = reminder_scheduler.subscribe(user_id)
+            try:
+                yield "retry: 10000\n\n"
+                while True:
+                    try:
+                        yield sse("reminder", q.get(timeout=heartbeat))
+                    except queue.Empty:
+                        yield ": keep-alive\n\n"
+            finally:
+                reminder_scheduler.unsubscribe(user_id, q)
+
+        return sse_response(events())
+
     @app.route("/api/assignments/due_today", methods=["GET"])
     @login_required
+    @conditional(ASSIGNMENTS)
     def api_assignments_due_today():
         try:
-            today = date.today()
-            assignments = Assignment.query.filter(
-                Assignment.user_id == current_user.id,
-                Assignment.due_date == today
-            ).all()
-            return jsonify([{
-                "id": a.id,
-                "title": a.title,
-                "subject": a.subject,
-                "priority": getattr(a, "priority", "medium"),
-                "status": getattr(a, "status", "not_started"),
-                "progress": getattr(a, "progress", 0)
-            } for a in assignments])
+            return assignments_api.json_response(
+                assignments_api.due_today_for(current_user.id, date.today()))
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
@@ -444,7 +497,7 @@ def create_app():
     @app.route('/fragment/notes')
     @login_required
     def fragment_notes():
-        return render_template('fragments/notes.html')
+        return fragment_cache.render('fragments/notes.html')
 
 
     @app.route('/notes/add', methods=['POST'])
@@ -464,7 +517,12 @@ def create_app():
             return jsonify({"error": "Content required"}), 400
         note = Note(user_id=current_user.id, title=title, content=content, tags=tags, reminder_at=reminder_at)
         db.session.add(note)
+        bump(current_user.id, NOTES)
+        if reminder_at:
+            db.session.flush()
+            reminder_scheduler.record("note", note.id)
         db.session.commit()
+        reminder_scheduler.schedule_note(note)
         return jsonify({"ok": True, "id": note.id})
 
 
@@ -472,28 +530,95 @@ def create_app():
     @login_required
     def notes_delete(nid):
         n = Note.query.filter_by(id=nid, user_id=current_user.id).first_or_404()
+        bump(note_audience(n), NOTES)
+        if n.reminder_at:
+            reminder_scheduler.record("note", nid)
+        attachment_store.remove_all(n)
         db.session.delete(n)
         db.session.commit()
+        reminder_scheduler.cancel("note", nid)
         return jsonify({"ok": True})
     
+    def note_audience(note):
+        """Everyone whose notes list shows this note: the owner and the users it is shared with."""
+        return [note.user_id] + [sh.user_id for sh in note.shares]
+
+    def shared_with_map(notes):
+        """note id -> comma-separated usernames, for the notes the current user owns."""
+        own_ids = [n.id for n in notes if n.user_id == current_user.id]
+        if not own_ids:
+            return {}
+        rows = NoteShare.usernames_for(own_ids).all()
+        out = {}
+        for note_id, username in rows:
+            out.setdefault(note_id, []).append(username)
+        return {k: ",".join(v) for k, v in out.items()}
+
+    def encode_cursor(created_at, nid):
+        raw = f"{created_at.isoformat()}|{nid}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def decode_cursor(cursor):
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        at, nid = raw.split("|")
+        return datetime.fromisoformat(at), int(nid)
+
+    def make_excerpt(head, length=160):
+        t = html_to_text(head)
+        return t if len(t) <= length else t[:length].rstrip() + "…"
+
     @app.route('/notes/list')
     @login_required
+    @conditional(NOTES)
     def notes_list():
-        user_notes = Note.query.filter_by(user_id=current_user.id)
-        shared_notes = Note.query.filter(Note.shared_with.like(f"%{current_user.username}%"))
-        notes = user_notes.union(shared_notes).order_by(Note.created_at.desc()).all()
-        return jsonify([
-            {
-                "id": n.id,
-                "title": n.title,
-                "content": n.content,
-                "tags": n.tags,
-                "reminder_at": n.reminder_at.strftime("%Y-%m-%d %H:%M") if n.reminder_at else "",
-                "shared_with": n.shared_with,
-                "attachments": n.attachments.split(",") if n.attachments else []
-            }
-            for n in notes
-            ])
+        """One page of note summaries; ?cursor= is the next_cursor of the previous page."""
+        limit = request.args.get("limit", app.config["NOTES_PAGE_SIZE"], type=int)
+        limit = max(1, min(limit, app.config["NOTES_MAX_PAGE_SIZE"]))
+        cursor = request.args.get("cursor")
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except Exception:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        rows = db.session.execute(Note.page_for(current_user.id, before=before, limit=limit)).all()
+        shared = shared_with_map(rows)
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if len(rows) == limit else None
+        return jsonify({
+            "notes": [
+                {
+                    "id": n.id,
+                    "title": n.title,
+                    "tags": n.tags,
+                    "excerpt": make_excerpt(n.head),
+                    "reminder_at": n.reminder_at.strftime("%Y-%m-%d %H:%M") if n.reminder_at else "",
+                    "shared_with": shared.get(n.id, ""),
+                    "owned": n.user_id == current_user.id
+                }
+                for n in rows
+            ],
+            "next_cursor": next_cursor
+        })
+
+    @app.route('/notes/<int:nid>')
+    @login_required
+    @conditional(NOTES)
+    def notes_get(nid):
+        """Full content and attachments of one note the user owns or was shared."""
+        n = db.session.get(Note, nid)
+        if not can_read_note(n):
+            return jsonify({"error": "Not found"}), 404
+        return jsonify({
+            "id": n.id,
+            "title": n.title,
+            "content": n.content,
+            "tags": n.tags,
+            "reminder_at": n.reminder_at.strftime("%Y-%m-%d %H:%M") if n.reminder_at else "",
+            "attachments": [a.to_dict() for a in n.files]
+        })
+
+    def can_read_note(n):
+        return n is not None and (n.user_id == current_user.id or
+                                  db.session.get(NoteShare, (n.id, current_user.id)) is not None)
 
     @app.route('/notes/share/<int:nid>', methods=['POST'])
     @login_required
@@ -502,155 +627,159 @@ def create_app():
         username = (request.form.get('username') or "").strip()
         if not username or username == current_user.username:
             return jsonify({"error": "Invalid username"}), 400
-        user = User.query.filter_by(username=username).first()
+        user = User.by_username(username).first()
         if not user:
             return jsonify({"error": "No such user"}), 404
-        shared = [u for u in (note.shared_with or "").split(",") if u]
-        if username in shared:
+        if db.session.get(NoteShare, (note.id, user.id)):
             return jsonify({"error": "Already shared"}), 400
-        shared.append(username)
-        note.shared_with = ",".join(shared)
+        db.session.add(NoteShare(note_id=note.id, user_id=user.id, note_created_at=note.created_at))
+        bump([note.user_id, user.id], NOTES)
         db.session.commit()
-        return jsonify({"ok": True, "shared_with": note.shared_with})
+        return jsonify({"ok": True, "shared_with": shared_with_map([note]).get(note.id, "")})
     
+    def allowed_filename(fn):
+        return "." in fn and fn.rsplit(".",1)[1].lower() in ALLOWED_EXT
+
+    @app.route('/notes/upload/<int:nid>', methods=['POST'])
     @app.route('/notes/attach/<int:nid>', methods=['POST'])
     @login_required
-    def notes_attach(nid):
+    def notes_upload(nid):
+        """
+        Attach a file to a note. The body is either the raw file (filename in
+        X-Filename or ?filename=) or a multipart form with a "file" field.
+        """
         note = Note.query.filter_by(id=nid, user_id=current_user.id).first_or_404()
 
-        file = request.files.get("file")
-        if not file or file.filename == "":
-            return jsonify({"error": "No file selected"}), 400
-
-    # Create upload folder
-        upload_dir = os.path.join(app.root_path, "static/uploads/notes")
-        os.makedirs(upload_dir, exist_ok=True)
+        if request.content_length and request.content_length > app.config["MAX_CONTENT_LENGTH"]:
+            return jsonify({"error": "File too large"}), 413
 
-    # Save file
-        filename = f"{current_user.id}_{nid}_{int(datetime.utcnow().timestamp())}_{file.filename}"
-        filepath = os.path.join(upload_dir, filename)
-        file.save(filepath)
-
-    # Update DB
-        existing = note.attachments.split(",") if note.attachments else []
-        existing.append(filename)
-        note.attachments = ",".join(existing)
-
-        db.session.commit()
+        if request.mimetype == "multipart/form-data":
+            f = request.files.get("file")
+            if not f or f.filename == "":
+                return jsonify({"error": "No file selected"}), 400
+            filename, stream = f.filename, f.stream
+        else:
+            filename = unquote(request.headers.get("X-Filename") or request.args.get("filename") or "")
+            stream = request.stream
 
-        return jsonify({
-            "ok": True,
-            "filename": filename,
-            "url": f"/static/uploads/notes/{filename}"
-        })
+        if not filename:
+            return jsonify({"error": "Empty filename"}), 400
+        if not allowed_filename(filename):
+            return jsonify({"error": "File type not allowed"}), 400
 
+        try:
+            att = attachment_store.add(note, current_user.id, stream, filename)
+            bump(note_audience(note), NOTES)
+            db.session.commit()
+        except AttachmentTooLarge:
+            db.session.rollback()
+            return jsonify({"error": "File too large"}), 413
 
-    def allowed_filename(fn):
-        return "." in fn and fn.rsplit(".",1)[1].lower() in ALLOWED_EXT
+        return jsonify({"ok": True, "attachment": att.to_dict(),
+                        "attachments": [a.to_dict() for a in note.files]})
 
-    @app.route('/notes/upload/<int:nid>', methods=['POST'])
+    @app.route('/attachments/<int:aid>/<path:filename>')
     @login_required
-    def notes_upload(nid):
-        note = Note.query.filter_by(id=nid, user_id=current_user.id).first_or_404()
-        if 'file' not in request.files:
-            return jsonify({"error":"No file sent"}), 400
-        f = request.files['file']
-        if f.filename == '':
-            return jsonify({"error":"Empty filename"}), 400
-        if not allowed_filename(f.filename):
-            return jsonify({"error":"File type not allowed"}), 400
-
-        filename = secure_filename(f.filename)
-    # optionally prefix with uid + timestamp to avoid collisions
-        from time import time
-        fname = f"{current_user.id}_{int(time())}_{filename}"
-        upload_dir = os.path.join(app.root_path, "static", "uploads", "notes")
-        os.makedirs(upload_dir, exist_ok=True)
-        save_path = os.path.join(upload_dir, fname)
-        f.save(save_path)
-
-    # update attachments field (comma-separated)
-        existing = (note.attachments or "").strip()
-        lst = [x for x in existing.split(",") if x] if existing else []
-        lst.append(fname)
-        note.attachments = ",".join(lst)
+    def attachment_file(aid, filename):
+        """Serve an attachment with ETag / Range support (or X-Sendfile when enabled)."""
+        att = db.session.get(Attachment, aid)
+        if att is None or not can_read_note(att.note):
+            return jsonify({"error": "Not found"}), 404
+        # blobs never change, so the content hash is a strong ETag
+        resp = send_file(attachment_store.path_for(att.blob_sha256), mimetype=att.content_type,
+                         download_name=att.filename, conditional=True, etag=att.blob_sha256,
+                         max_age=3600)
+        resp.cache_control.private = True
+        resp.cache_control.public = False
+        return resp
+
+    @app.route('/attachments/<int:aid>/delete', methods=['POST'])
+    @login_required
+    def attachment_delete(aid):
+        att = db.session.get(Attachment, aid)
+        if att is None or att.note.user_id != current_user.id:
+            return jsonify({"error": "Not found"}), 404
+        attachment_store.remove(att)
+        bump(note_audience(att.note), NOTES)
         db.session.commit()
+        return jsonify({"ok": True})
 
-    # return the updated attachments array so frontend can refresh
-        return jsonify({"ok": True, "attachments": lst, "filename": fname})
-    
 
     @app.route("/fragment/exam_helper")
     @login_required
     def fragment_exam_helper():
         """Display the exam helper page"""
-        return render_template("fragments/exam_helper.html")
+        return fragment_cache.render("fragments/exam_helper.html")
 
 
     @app.route("/exam_helper/generate", methods=["POST"])
     @login_required
     def exam_generate():
-        """Generate AI-powered exam guide"""
-        
-        print("=" * 60)
-        print("🚀 EXAM HELPER CALLED")
-        print(f"User: {current_user.username}")
-        print(f"Topic: {request.form.get('topic', '')}")
-        print("=" * 60)
-        
+        """Queue an exam guide generation; poll /jobs/<id> for the result."""
         topic = request.form.get("topic", "").strip()
-        
+
         if not topic:
             return jsonify({"ok": False, "error": "Please enter a subject"}), 400
-        
-        try:
-            # Import AI function
-            from ai_engine import generate_exam_helper
-            
-            # Generate AI response
-            print(f"🤖 Generating AI content for: {topic}")
-            ai_response = generate_exam_helper(topic)
-            print(f"✅ AI generated {len(ai_response)} characters")
-            
-            # Save to database
-            exam_helper = ExamHelper(
-                user_id=current_user.id,
-                topic=topic,
-                generated_content=ai_response
-            )
-            db.session.add(exam_helper)
-            db.session.commit()
-            print(f"💾 Saved to database with ID: {exam_helper.id}")
-            
-            return jsonify({
-                "ok": True,
-                "answer": ai_response,
-                "saved_id": exam_helper.id
-            })
-        
-        except Exception as e:
-            db.session.rollback()
-            print(f"❌ ERROR: {e}")
-            import traceback
-            traceback.print_exc()
-            
-            return jsonify({
-                "ok": False,
-                "error": f"Server error: {str(e)}"
-            }), 500
-            
+
+        # same user + same normalised topic while one is pending -> same job
+        job, created = jobs.submit("exam_guide", {"topic": topic, "user_id": current_user.id},
+                                   user_id=current_user.id,
+                                   dedup_key=f"exam:{current_user.id}:{cache_key(topic)}")
+        app.logger.info("exam guide job %s for %s: %s (%s)", job.id, current_user.username, topic,
+                        "queued" if created else "already pending")
+
+        return jsonify({
+            "ok": True,
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": url_for("job_get", job_id=job.id)
+        }), 202
+
+    @jobs.handler("exam_guide")
+    def exam_guide_job(payload, job):
+        """Worker side of /exam_helper/generate: generate (or reuse) the guide and save it."""
+        ai_response, cache_source = exam_guides.get(payload["topic"])
+        if ai_response == EXAM_ERROR_TEXT:
+            raise RuntimeError("exam guide generation failed")
+
+        exam_helper = ExamHelper(
+            user_id=payload["user_id"],
+            topic=payload["topic"],
+            generated_content=ai_response
+        )
+        db.session.add(exam_helper)
+        bump(payload["user_id"], EXAM_HISTORY)
+        # no commit here: the job queue commits this together with the done state,
+        # so a crash in between cannot leave a saved guide on a job that will run again
+        db.session.flush()
+        app.logger.info("job %s: saving exam guide %s (cache: %s)", job.id, exam_helper.id, cache_source)
+
+        return {
+            "ok": True,
+            "answer": ai_response,
+            "saved_id": exam_helper.id,
+            "cached": cache_source != "miss",
+            "cache_source": cache_source
+        }
+
+    @app.route("/jobs/<int:job_id>")
+    @login_required
+    def job_get(job_id):
+        """Status of a background job; includes the result once it is done."""
+        job = db.session.get(Job, job_id)
+        if job is None or job.user_id != current_user.id:
+            return jsonify({"error": "Not found"}), 404
+        return jsonify(job_status(job))
+
     @app.route("/api/exam_helper/history", methods=["GET"])
     @login_required
+    @conditional(EXAM_HISTORY)
     def get_exam_helper_history():
         """Get user's exam helper history"""
         try:
             limit = request.args.get('limit', 10, type=int)
             
-            history = ExamHelper.query.filter_by(
-                user_id=current_user.id
-            ).order_by(
-                ExamHelper.created_at.desc()
-            ).limit(limit).all()
+            history = ExamHelper.history_for(current_user.id, limit=limit).all()
             
             return jsonify({
                 "ok": True,
@@ -684,6 +813,7 @@ def create_app():
             ).first_or_404()
             
             db.session.delete(helper)
+            bump(current_user.id, EXAM_HISTORY)
             db.session.commit()
             
             return jsonify({
@@ -697,59 +827,191 @@ def create_app():
                 "ok": False,
                 "error": str(e)
             }), 500
-# ---- POMODORO STORAGE (in-memory for now) ----
-    pomodoro_sessions = []
+    @app.route("/api/search", methods=["GET"])
+    @login_required
+    def api_search():
+        """Ranked, highlighted search over the user's messages, notes and exam guides."""
+        if not search_available():
+            return jsonify({"ok": False, "error": "Search needs SQLite FTS5"}), 501
+        q = (request.args.get("q") or "").strip()
+        if not q:
+            return jsonify({"ok": True, "results": []})
+        types = [t for t in (request.args.get("type") or "").split(",") if t] or None
+        limit = max(1, min(request.args.get("limit", 20, type=int), 50))
+        try:
+            return jsonify({"ok": True, "results": search(current_user.id, q, types=types, limit=limit)})
+        except Exception as e:
+            print(f"Search error: {e}")
+            return jsonify({"ok": False, "error": "Search failed"}), 500
 
+# ---- POMODORO ----
 
     @app.route("/fragment/pomodoro")
     @login_required
     def fragment_pomodoro():
-        return render_template("fragments/pomodoro.html")
+        return fragment_cache.render("fragments/pomodoro.html")
 
+    def pomodoro_row(data, today):
+        """Validate one posted session into insert parameters."""
+        try:
+            work_minutes = int(data.get("work_minutes", 25))
+        except (TypeError, ValueError):
+            work_minutes = 25
+        # sessions queued offline carry the day they happened on
+        try:
+            day = date.fromisoformat(str(data.get("date")))
+        except ValueError:
+            day = today
+        return {
+            "user_id": current_user.id,
+            "date": day,
+            "weekday": day.weekday(),
+            "start": str(data.get("start") or "")[:20],
+            "end": str(data.get("end") or "")[:20],
+            "success": str(data.get("success", "")).lower() == "true",
+            "work_minutes": max(0, min(work_minutes, 24 * 60)),
+            "note": str(data.get("note") or "")[:1000],
+            "reflection": str(data.get("reflection") or "")[:1000],
+            "created_at": datetime.utcnow(),
+        }
 
     @app.route("/pomodoro/log", methods=["POST"])
     @login_required
     def log_pomodoro():
-        """Log one pomodoro session (success or cancelled)."""
-        success_raw = str(request.form.get("success", "")).lower()
-        success = success_raw == "true"
+        """
+        Log pomodoro sessions (success or cancelled): one as form fields, or
+        a batch as JSON {"sessions": [...]}, inserted in one statement.
+        """
+        if request.is_json:
+            items = (request.get_json(silent=True) or {}).get("sessions") or []
+        else:
+            items = [request.form]
+        today = date.today()
+        rows = [pomodoro_row(d, today) for d in items[:app.config["POMODORO_MAX_BATCH"]]
+                if hasattr(d, "get")]
+        if not rows:
+            return jsonify({"ok": False, "error": "No sessions"}), 400
+
+        db.session.execute(insert(PomodoroSession), rows)
+        pomodoro_stats.apply_sessions(current_user.id, rows)
+        bump(current_user.id, POMODORO)
+        db.session.commit()
+        return jsonify({"ok": True, "logged": len(rows)})
 
-        # Work minutes used in that session (for stats)
+    @app.route("/pomodoro/stats")
+    @login_required
+    @conditional(POMODORO)
+    def pomodoro_stats_view():
+        """Focus minutes / success rate by day and week for ?start=&end= (YYYY-MM-DD), plus totals."""
         try:
-            work_minutes = int(request.form.get("work_minutes", "25"))
+            end = date.fromisoformat(request.args["end"]) if request.args.get("end") else date.today()
+            start = (date.fromisoformat(request.args["start"]) if request.args.get("start")
+                     else end - timedelta(days=13))
         except ValueError:
-            work_minutes = 25
-
-        now = datetime.now()
-
-        session = {
-            "start": request.form.get("start"),
-            "end": request.form.get("end"),
-            "success": success,
-            "note": request.form.get("note", ""),
-            "reflection": request.form.get("reflection", ""),
-
-            # extra fields for charts
-            "date": now.date().isoformat(),  # e.g. 2025-11-22
-            "weekday": now.weekday(),        # 0=Mon, 6=Sun
-            "work_minutes": work_minutes,
-        }
-
-        pomodoro_sessions.append(session)
-        return jsonify({"ok": True})
+            return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+        if start > end:
+            return jsonify({"error": "start is after end"}), 400
+        start = max(start, end - timedelta(days=app.config["POMODORO_STATS_MAX_DAYS"] - 1))
 
+        return jsonify(pomodoro_stats.stats(current_user.id, start, end))
 
     @app.route("/pomodoro/history")
     @login_required
+    @conditional(POMODORO)
     def pomodoro_history():
-        return jsonify(pomodoro_sessions)
+        """The user's sessions, newest first; ?before= is the id of the last one shown."""
+        limit = request.args.get("limit", app.config["POMODORO_PAGE_SIZE"], type=int)
+        limit = max(1, min(limit, app.config["POMODORO_MAX_PAGE_SIZE"]))
+        before = request.args.get("before", type=int)
+
+        rows = PomodoroSession.page_for(current_user.id, before=before, limit=limit).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return jsonify({
+            "sessions": [r.to_dict() for r in rows],
+            "before": rows[-1].id if rows and has_more else None,
+            "has_more": has_more
+        })
 
   
+    @app.cli.command("upgrade-db")
+    def upgrade_db_command():
+        """Create missing tables, columns and indexes on an existing database."""
+        from schema import upgrade
+        created = upgrade(upload_dir=os.path.join(app.root_path, UPLOAD_FOLDER))
+        print(f"done, {len(created)} index(es) created")
+
+    @app.cli.command("check-query-plans")
+    def check_query_plans_command():
+        """Fail if any hot route query falls back to a full table scan."""
+        from schema import check_query_plans
+        failed = check_query_plans()
+        if failed:
+            raise SystemExit(f"full table scan in: {', '.join(failed)}")
+
+    @app.cli.command("backfill-emotions")
+    @click.option("--workers", type=int, default=None, help="Classifier processes (default: CPUs - 1).")
+    @click.option("--chunk-size", type=int, default=2000, help="Rows read, classified and written per batch.")
+    @click.option("--pause", type=float, default=0.0, help="Seconds to sleep between chunk writes.")
+    @click.option("--reset", is_flag=True, help="Ignore the saved checkpoint and start from the first row.")
+    def backfill_emotions_command(workers, chunk_size, pause, reset):
+        """Label historic user messages with emotion, score and crisis_flag (resumable)."""
+        from backfill import backfill_emotions      # pulls in multiprocessing; CLI only
+        backfill_emotions(workers=workers, chunk_size=chunk_size, pause=pause, reset=reset)
+
+    @app.cli.command("gc-attachments")
+    @click.option("--grace-minutes", type=int, default=60, help="Keep unreferenced blobs at least this long.")
+    def gc_attachments_command(grace_minutes):
+        """Delete attachment blobs that no note references any more."""
+        attachment_store.collect_garbage(grace_minutes)
+
+    @app.cli.command("run-jobs")
+    @click.option("--workers", type=int, default=2, help="Worker threads in this process.")
+    def run_jobs_command(workers):
+        """Run background job workers in this process (use with JOB_WORKERS=0 on the web side)."""
+        threads = jobs.start_workers(app, workers)
+        print(f"{len(threads)} job worker(s) running, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """Write content-hashed, gzip/brotli-precompressed copies of static/ to static/dist/."""
+        from assets import build as build_assets
+        build_assets(app.static_folder)
+
+    @app.cli.command("rebuild-search")
+    def rebuild_search_command():
+        """Refill the full-text search indexes from the messages, notes and exam_helpers tables."""
+        rebuild_search()
+
     with app.app_context():
-        db.create_all()
+        apply_sqlite_pragmas(db.engine, app.config["SQLITE_PRAGMAS"])
+        if app.config["SCHEMA_ON_BOOT"]:
+            from schema import create_schema
+            create_schema()
+        missing = missing_tables()
+    if missing:
+        # a server process stops here rather than fail on the first request;
+        # `flask` commands (upgrade-db above all) still load, without workers
+        if click.get_current_context(silent=True) is None:
+            raise RuntimeError(f"database has no {missing[0]} table ({len(missing)} missing); "
+                               "run `flask --app app upgrade-db` first (or set SCHEMA_ON_BOOT=1)")
+        return app
+
+    start_sweeper(app)
+    if app.config["JOB_WORKERS"] > 0:
+        jobs.start_workers(app, app.config["JOB_WORKERS"])
+    if app.config["REMINDER_SCHEDULER"]:
+        reminder_scheduler.start()      # loads the heap before the first request
 
     return app
 
 
 if __name__ == "__main__":
-    create_app().run(debug=True)
+    app = create_app()
+    app.run(debug=True)
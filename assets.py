@@ -0,0 +1,143 @@
+"""
+Fingerprinted, precompressed static assets.
+
+`flask build-assets` copies every file under static/ (except user uploads)
+to static/dist/ under a content-hashed name:
+
+    static/chat.css  ->  static/dist/chat.3f2a9c01d7.css  (+ .gz, + .br)
+
+Text files also get gzip and, when the brotli package is installed, brotli
+copies. static/dist/manifest.json maps each original name to its hashed one.
+
+At runtime url_for("static", filename="chat.css") is rewritten through the
+manifest, so templates keep using plain names. Hashed files never change,
+so they are served with a one-year immutable Cache-Control. The .br / .gz
+copy is picked by Accept-Encoding, and nothing is compressed per request.
+Files that are missing from the manifest, or every file when no build has
+been run, are served by Flask's normal static view.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:          # optional: gzip only
+    brotli = None
+
+
+DIST = "dist"
+MANIFEST = "manifest.json"
+SKIP_DIRS = {DIST, "uploads"}
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+MIN_COMPRESS_BYTES = 512
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def hashed_name(path, digest):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest[:10]}{ext}"
+
+
+def build(static_dir, log=print):
+    """Write static/dist/ and its manifest; returns the manifest."""
+    out_dir = os.path.join(static_dir, DIST)
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    manifest = {}
+    saved = 0
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        rel_dir = os.path.relpath(dirpath, static_dir)
+        if rel_dir == ".":
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for fn in sorted(filenames):
+            rel = os.path.normpath(os.path.join(rel_dir, fn)).replace(os.sep, "/")
+            with open(os.path.join(dirpath, fn), "rb") as f:
+                data = f.read()
+            target = hashed_name(rel, hashlib.sha256(data).hexdigest())
+            dest = os.path.join(out_dir, target)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with open(dest, "wb") as f:
+                f.write(data)
+            manifest[rel] = target
+
+            if os.path.splitext(fn)[1].lower() not in COMPRESSIBLE or len(data) < MIN_COMPRESS_BYTES:
+                continue
+            variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append((".br", brotli.compress(data, quality=11)))
+            for suffix, body in variants:
+                if len(body) < len(data):
+                    with open(dest + suffix, "wb") as f:
+                        f.write(body)
+                    saved += len(data) - len(body)
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    log(f"built {len(manifest)} asset(s) into {out_dir}"
+        f"{'' if brotli else ' (brotli not installed: gzip only)'}")
+    return manifest
+
+
+class AssetPipeline:
+    def __init__(self):
+        self.static_dir = None
+        self.manifest = {}
+        self.served = set()        # hashed names, relative to static/dist
+
+    def init_app(self, app):
+        self.static_dir = app.static_folder
+        if app.config["STATIC_FINGERPRINT"]:
+            self.load()
+        app.url_defaults(self.fingerprint)
+        self.send_static = app.view_functions["static"]
+        app.view_functions["static"] = self.serve
+
+    def load(self):
+        path = os.path.join(self.static_dir, DIST, MANIFEST)
+        try:
+            with open(path) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        self.served = set(self.manifest.values())
+        return self.manifest
+
+    def fingerprint(self, endpoint, values):
+        """url_defaults hook: static/<name> -> static/dist/<hashed name>."""
+        if endpoint != "static" or not self.manifest:
+            return
+        hashed = self.manifest.get(values.get("filename"))
+        if hashed:
+            values["filename"] = f"{DIST}/{hashed}"
+
+    def serve(self, filename):
+        name = filename[len(DIST) + 1:] if filename.startswith(DIST + "/") else None
+        if name not in self.served:
+            return self.send_static(filename=filename)
+
+        directory = os.path.join(self.static_dir, DIST)
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        encoding = None
+        accepted = request.accept_encodings
+        for enc, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if accepted[enc] and os.path.exists(os.path.join(directory, name + suffix)):
+                encoding, name = enc, name + suffix
+                break
+
+        resp = send_from_directory(directory, name, mimetype=mimetype, max_age=31536000)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        resp.vary.add("Accept-Encoding")
+        resp.headers["Cache-Control"] = IMMUTABLE
+        return resp
+
+
+asset_pipeline = AssetPipeline()
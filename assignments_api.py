@@ -0,0 +1,117 @@
+"""
+Read-side serialisation for the assignments API.
+
+The list endpoints select only the columns they return (plain Row tuples, no
+ORM objects or identity map). `today` is computed once per request and
+passed in. Responses are encoded with orjson when it is installed, and with
+the stdlib json module otherwise.
+
+    python benchmarks/assignments_bench.py     # old vs new on 5,000 rows
+"""
+import json
+from datetime import date, timedelta
+
+from flask import Response
+from sqlalchemy import select
+
+from db import db
+from models import Assignment
+
+try:
+    import orjson
+except ImportError:          # optional speed-up
+    orjson = None
+
+
+COLUMNS = (Assignment.id, Assignment.title, Assignment.subject, Assignment.due_date,
+           Assignment.notes, Assignment.priority, Assignment.status, Assignment.progress)
+
+
+def assignment_dict(a, today):
+    """Full API shape; `a` is a projected Row or an Assignment."""
+    due = a.due_date
+    return {
+        "id": a.id,
+        "title": a.title,
+        "subject": a.subject,
+        "due_date": due.isoformat() if due else None,
+        "notes": a.notes,
+        "priority": a.priority or "medium",
+        "status": a.status or "not_started",
+        "progress": a.progress or 0,
+        "is_overdue": due < today if due else False,
+    }
+
+
+def reminder_dict(a):
+    due = a.due_date
+    return {
+        "id": a.id,
+        "title": a.title,
+        "subject": a.subject,
+        "due_date": due.isoformat() if due else None,
+        "notes": a.notes,
+        "priority": a.priority or "medium",
+        "status": a.status or "not_started",
+        "progress": int(a.progress or 0),
+    }
+
+
+def due_today_dict(a):
+    return {
+        "id": a.id,
+        "title": a.title,
+        "subject": a.subject,
+        "priority": a.priority or "medium",
+        "status": a.status or "not_started",
+        "progress": a.progress or 0,
+    }
+
+
+# ---------- projected queries ----------
+def list_query(user_id):
+    return select(*COLUMNS).where(Assignment.user_id == user_id).order_by(Assignment.due_date.asc())
+
+
+def reminders_query(user_id, today, days=3):
+    """Not-completed assignments due between today and today + days."""
+    return (select(*COLUMNS)
+            .where(Assignment.user_id == user_id,
+                   Assignment.due_date.isnot(None),
+                   Assignment.due_date >= today,
+                   Assignment.due_date <= today + timedelta(days=days),
+                   Assignment.status != "completed")
+            .order_by(Assignment.due_date.asc()))
+
+
+def due_today_query(user_id, today):
+    return select(*COLUMNS).where(Assignment.user_id == user_id, Assignment.due_date == today)
+
+
+def list_for(user_id, today):
+    return [assignment_dict(r, today) for r in db.session.execute(list_query(user_id))]
+
+
+def reminders_for(user_id, today, days=3):
+    return [reminder_dict(r) for r in db.session.execute(reminders_query(user_id, today, days))]
+
+
+def due_today_for(user_id, today):
+    return [due_today_dict(r) for r in db.session.execute(due_today_query(user_id, today))]
+
+
+# ---------- encoding ----------
+def _default(o):
+    if isinstance(o, date):
+        return o.isoformat()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), default=_default)
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype="application/json")
@@ -0,0 +1,160 @@
+"""
+Content-addressed storage for note attachments.
+
+Uploads are streamed to a temp file in fixed-size chunks and hashed as they
+are written, so the body is never held in memory. The size limit is checked
+while reading. The finished file is stored once under its SHA-256:
+
+    <ATTACHMENT_DIR>/ab/cd/abcdef...
+
+Every Attachment row points at a Blob row. Blob.refcount counts those rows,
+so the same lecture PDF uploaded by 200 students is one file on disk. When
+the count drops to 0 the file is kept for a grace period and then removed by
+`flask gc-attachments`.
+
+An upload of content that is already stored must not lose its file to the
+collector. The upload takes the Blob row first (refcount + 1, which holds the
+row until the caller commits) and only then looks at the disk, moving its
+temp file into place if the stored file is gone. The collector deletes the
+row and unlinks the file in one transaction, so an upload either waits for
+it and stores the file again, or holds the row and the collector skips it.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from db import db
+from models import Attachment, Blob
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+class AttachmentStore:
+    def __init__(self):
+        self.root = None
+        self.max_bytes = 25 * 1024 * 1024
+
+    def init_app(self, app):
+        self.root = app.config["ATTACHMENT_DIR"]
+        self.max_bytes = app.config["ATTACHMENT_MAX_BYTES"]
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    # ---------- blobs on disk ----------
+    def _spool(self, stream):
+        """Copy a file-like object to a temp file in the store. Returns (tmp_path, sha256, size)."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise AttachmentTooLarge(self.max_bytes)
+                    digest.update(chunk)
+                    out.write(chunk)
+            return tmp, digest.hexdigest(), size
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _place(self, tmp, sha):
+        """Move a spooled file to its content address, or drop it if that is already stored.
+
+        Call with the Blob row referenced in the current transaction.
+        """
+        final = self.path_for(sha)
+        if os.path.exists(final):
+            os.unlink(tmp)              # already stored: dedup
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp, final)
+
+    # ---------- refcounts ----------
+    def _incref(self, sha, size):
+        res = db.session.execute(update(Blob)
+                                 .where(Blob.sha256 == sha)
+                                 .values(refcount=Blob.refcount + 1, unreferenced_at=None))
+        if res.rowcount:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(Blob(sha256=sha, size=size, refcount=1))
+        except IntegrityError:
+            # another request inserted the same blob first
+            self._incref(sha, size)
+
+    def _decref(self, sha):
+        last = Blob.refcount <= 1
+        db.session.execute(update(Blob)
+                           .where(Blob.sha256 == sha)
+                           .values(refcount=case((last, 0), else_=Blob.refcount - 1),
+                                   unreferenced_at=case((last, datetime.utcnow()),
+                                                        else_=Blob.unreferenced_at)))
+
+    # ---------- attachments ----------
+    def add(self, note, user_id, stream, filename):
+        """Store an upload and attach it to a note. Caller commits."""
+        name = secure_filename(filename) or "file"
+        tmp, sha, size = self._spool(stream)
+        try:
+            self._incref(sha, size)
+            self._place(tmp, sha)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        att = Attachment(note_id=note.id, user_id=user_id, blob_sha256=sha, filename=name, size=size,
+                         content_type=mimetypes.guess_type(name)[0] or "application/octet-stream")
+        db.session.add(att)
+        return att
+
+    def remove(self, att):
+        """Detach one file. Caller commits."""
+        self._decref(att.blob_sha256)
+        db.session.delete(att)
+
+    def remove_all(self, note):
+        for att in list(note.files):
+            self.remove(att)
+
+    def collect_garbage(self, grace_minutes=60, log=print):
+        """Delete blobs nobody has referenced for grace_minutes. Returns the count."""
+        cutoff = datetime.utcnow() - timedelta(minutes=grace_minutes)
+        shas = [sha for (sha,) in db.session.query(Blob.sha256)
+                .filter(Blob.refcount == 0, Blob.unreferenced_at < cutoff)]
+        removed = 0
+        for sha in shas:
+            # re-check under the delete; the file goes before the row is committed,
+            # so an upload waiting on the row sees it missing and stores it again
+            res = db.session.execute(Blob.__table__.delete()
+                                     .where(Blob.sha256 == sha, Blob.refcount == 0))
+            if res.rowcount:
+                try:
+                    os.unlink(self.path_for(sha))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+            db.session.commit()
+        log(f"removed {removed} unreferenced blobs")
+        return removed
+
+
+attachment_store = AttachmentStore()
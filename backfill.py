@@ -0,0 +1,116 @@
+"""
+Backfill emotion / score / crisis_flag on historic user messages.
+
+Old rows have emotion = "user" and no score. The job walks the messages table
+in primary-key order, one chunk at a time, so memory stays flat however big
+the table is. Chunks are classified on a process pool while the main process
+keeps reading and writing. Each chunk is written with one executemany UPDATE
+in its own short transaction, and the checkpoint row is updated in the same
+transaction. Live writers only wait for one chunk at a time, and an
+interrupted run carries on from the last committed chunk.
+
+    flask --app app backfill-emotions --workers 4 --chunk-size 2000
+"""
+import multiprocessing as mp
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import text
+
+from text_analyser import analyse_many
+
+
+JOB_NAME = "message_emotions"
+
+READ_SQL = text(
+    "SELECT id, text FROM messages "
+    "WHERE id > :last_id AND emotion = 'user' "
+    "ORDER BY id LIMIT :limit"
+)
+UPDATE_SQL = text(
+    "UPDATE messages SET emotion = :emotion, score = :score, crisis_flag = :crisis "
+    "WHERE id = :id AND emotion = 'user'"
+)
+
+
+def classify_rows(rows):
+    """Pool worker: [(id, text)] -> list of UPDATE parameter dicts."""
+    results = analyse_many([t for _, t in rows])
+    return [
+        {"id": mid, "emotion": a.emotion, "score": a.score, "crisis": a.crisis}
+        for (mid, _), a in zip(rows, results)
+    ]
+
+
+def _load_checkpoint(reset):
+    from db import db
+    from models import BackfillCheckpoint
+
+    cp = db.session.get(BackfillCheckpoint, JOB_NAME)
+    if cp is None:
+        cp = BackfillCheckpoint(name=JOB_NAME, last_id=0, rows_done=0)
+        db.session.add(cp)
+    elif reset:
+        cp.last_id, cp.rows_done = 0, 0
+    cp.updated_at = datetime.utcnow()
+    db.session.commit()
+    return cp.last_id, cp.rows_done
+
+
+def _write_chunk(engine, params, last_id, rows_done):
+    from models import BackfillCheckpoint
+
+    table = BackfillCheckpoint.__table__
+    with engine.begin() as conn:
+        if params:
+            conn.execute(UPDATE_SQL, params)      # executemany
+        conn.execute(table.update()
+                     .where(table.c.name == JOB_NAME)
+                     .values(last_id=last_id, rows_done=rows_done, updated_at=datetime.utcnow()))
+
+
+def backfill_emotions(workers=None, chunk_size=2000, pause=0.0, reset=False, log=print):
+    """Run (or resume) the backfill. Returns the number of rows updated in this run."""
+    from db import db
+
+    engine = db.engine
+    last_id, rows_done = _load_checkpoint(reset)
+    db.session.remove()
+    log(f"starting after id {last_id} ({rows_done} rows already done)")
+
+    workers = workers or max(1, (mp.cpu_count() or 2) - 1)
+    in_flight = deque()         # (last id of chunk, AsyncResult), oldest first
+    updated = 0
+    started = time.monotonic()
+    exhausted = False
+
+    with mp.get_context("spawn").Pool(workers) as pool:
+        while in_flight or not exhausted:
+            # keep every worker busy: read ahead up to two chunks per worker
+            while not exhausted and len(in_flight) < workers * 2:
+                with engine.connect() as conn:
+                    rows = conn.execute(READ_SQL, {"last_id": last_id, "limit": chunk_size}).all()
+                if not rows:
+                    exhausted = True
+                    break
+                last_id = rows[-1][0]
+                in_flight.append((last_id, pool.apply_async(classify_rows, ([tuple(r) for r in rows],))))
+
+            if not in_flight:
+                break
+
+            # write results in read order so the checkpoint only ever moves forward
+            chunk_last_id, result = in_flight.popleft()
+            params = result.get()
+            rows_done += len(params)
+            updated += len(params)
+            _write_chunk(engine, params, chunk_last_id, rows_done)
+
+            rate = updated / max(time.monotonic() - started, 1e-6)
+            log(f"up to id {chunk_last_id}: {rows_done} rows done ({rate:,.0f} rows/s)")
+            if pause:
+                time.sleep(pause)     # give live writers a gap between chunks
+
+    log(f"finished, {updated} rows updated in this run")
+    return updated
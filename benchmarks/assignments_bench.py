@@ -0,0 +1,122 @@
+"""
+GET /api/assignments serialisation: ORM + jsonify vs projection + fast encoder.
+
+Builds a throwaway SQLite database with one user who has N assignments and
+times, inside a request context, the query + dict building + JSON encoding of
+the old route body and of assignments_api.list_for() + json_response().
+
+    python benchmarks/assignments_bench.py --rows 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from db import db
+from models import User, Assignment
+import assignments_api
+
+
+def make_app(rows):
+    path = os.path.join(tempfile.mkdtemp(prefix="assignbench_"), "bench.db")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + path
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(fullname="Bench", username="bench", password_hash="x")
+        db.session.add(user)
+        db.session.commit()
+        rnd = random.Random(1)
+        today = date.today()
+        db.session.execute(db.insert(Assignment), [{
+            "user_id": user.id,
+            "title": f"Assignment {i}",
+            "subject": rnd.choice(["Maths", "Physics", "History", "CS"]),
+            "due_date": today + timedelta(days=rnd.randint(-30, 60)),
+            "notes": "Read chapter and write a summary " * 3,
+            "priority": rnd.choice(["low", "medium", "high"]),
+            "status": rnd.choice(["not_started", "in_progress", "completed"]),
+            "progress": rnd.randint(0, 100),
+        } for i in range(rows)])
+        db.session.commit()
+        return app, user.id
+
+
+def old_route(user_id):
+    """The route body before assignments_api (ORM objects, per-row date.today(), jsonify)."""
+    assignments = Assignment.query.filter_by(user_id=user_id).order_by(Assignment.due_date.asc()).all()
+    return jsonify([{
+        "id": a.id,
+        "title": a.title,
+        "subject": a.subject,
+        "due_date": a.due_date.isoformat() if a.due_date else None,
+        "notes": a.notes,
+        "priority": a.priority if a.priority else "medium",
+        "status": a.status if a.status else "not_started",
+        "progress": a.progress if a.progress is not None else 0,
+        "is_overdue": a.due_date < date.today() if a.due_date else False
+    } for a in assignments])
+
+
+def new_route(user_id):
+    return assignments_api.json_response(assignments_api.list_for(user_id, date.today()))
+
+
+def timed(app, fn, user_id, repeat):
+    times = []
+    for _ in range(repeat):
+        with app.test_request_context():
+            t0 = time.perf_counter()
+            resp = fn(user_id)
+            resp.get_data()
+            times.append(time.perf_counter() - t0)
+            db.session.remove()
+    return times, resp
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    app, user_id = make_app(args.rows)
+    # warm up both paths, then check they return the same data
+    (_, old_resp), (_, new_resp) = timed(app, old_route, user_id, 2), timed(app, new_route, user_id, 2)
+    assert json.loads(old_resp.get_data()) == json.loads(new_resp.get_data()), "responses differ"
+
+    results = []
+    for name, fn in (("orm+jsonify", old_route), ("projection+" + ("orjson" if assignments_api.orjson else "json"), new_route)):
+        times, _ = timed(app, fn, user_id, args.repeat)
+        med = statistics.median(times)
+        results.append({
+            "variant": name,
+            "rows": args.rows,
+            "median_ms": round(med * 1000, 2),
+            "requests_per_sec": round(1 / med, 1),
+        })
+    results[1]["speedup"] = round(results[0]["median_ms"] / results[1]["median_ms"], 2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        extra = f"   x{r['speedup']}" if "speedup" in r else ""
+        print(f"{r['variant']:<20} {r['median_ms']:>8} ms/request   {r['requests_per_sec']:>7} req/s   "
+              f"({r['rows']} rows){extra}")
+
+
+if __name__ == "__main__":
+    main()
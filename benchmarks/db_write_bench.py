@@ -0,0 +1,109 @@
+"""
+Write throughput of the default vs production database profile.
+
+Several processes (standing in for gunicorn workers) each do what /send does:
+insert a message, bump the session's updated_at, commit. Prints commits/sec
+and how many commits failed with "database is locked".
+
+    python benchmarks/db_write_bench.py --workers 4 --seconds 5
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from config import CONFIGS
+from db import apply_sqlite_pragmas
+
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS chat_sessions (id INTEGER PRIMARY KEY, updated_at TEXT)",
+    "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY, session_id INTEGER, text TEXT, created_at TEXT)",
+]
+
+
+def make_engine(profile, uri):
+    cfg = CONFIGS[profile]
+    options = dict(getattr(cfg, "SQLALCHEMY_ENGINE_OPTIONS", {}) or {})
+    engine = create_engine(uri, **options)
+    apply_sqlite_pragmas(engine, cfg.SQLITE_PRAGMAS)
+    return engine
+
+
+def worker(profile, uri, seconds, wid, out):
+    engine = make_engine(profile, uri)
+    ok = locked = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("INSERT INTO messages (session_id, text, created_at) "
+                                  "VALUES (:sid, :t, datetime('now'))"),
+                             {"sid": wid, "t": "benchmark message " * 8})
+                conn.execute(text("UPDATE chat_sessions SET updated_at = datetime('now') WHERE id = :sid"),
+                             {"sid": wid})
+            ok += 1
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+    engine.dispose()
+    out.put((ok, locked))
+
+
+def run(profile, workers, seconds):
+    path = os.path.join(tempfile.mkdtemp(prefix="dbbench_"), "bench.db")
+    uri = "sqlite:///" + path
+    engine = make_engine(profile, uri)
+    with engine.begin() as conn:
+        for stmt in SCHEMA:
+            conn.execute(text(stmt))
+        for wid in range(workers):
+            conn.execute(text("INSERT INTO chat_sessions (id, updated_at) VALUES (:i, datetime('now'))"), {"i": wid})
+    engine.dispose()
+
+    out = mp.Queue()
+    procs = [mp.Process(target=worker, args=(profile, uri, seconds, w, out)) for w in range(workers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    commits = sum(r[0] for r in results)
+    return {
+        "profile": profile,
+        "workers": workers,
+        "seconds": seconds,
+        "commits": commits,
+        "commits_per_sec": round(commits / seconds, 1),
+        "locked_errors": sum(r[1] for r in results),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    results = [run(p, args.workers, args.seconds) for p in ("default", "production")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"{r['profile']:<11} {r['commits_per_sec']:>9} commits/s   "
+              f"{r['locked_errors']} locked errors   ({r['workers']} workers, {r['seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+End-to-end load test: the app under gunicorn, a stub LLM, many virtual users.
+
+1. starts benchmarks/stub_llm.py in-process (latency, token rate and error
+   injection are configurable) and points the app at it with GROQ_BASE_URL
+2. creates a throwaway SQLite database with `flask upgrade-db`
+3. starts gunicorn (gthread workers) on a free port
+4. runs --users virtual users for --duration seconds. Each registers and
+   logs in, opens a chat, then loops over a weighted mix of sends (plain
+   and streamed), notes, assignments, pomodoro and exam guide jobs.
+5. prints per-route throughput and p50 / p95 / p99 latency as JSON, which
+   you can diff between releases
+
+    python benchmarks/load_test.py --users 30 --duration 60 --workers 2 --threads 8 --out before.json
+    python benchmarks/load_test.py --latency-ms 800 --error-rate 0.05
+"""
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stub_llm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "send=4,send_stream=2,notes=3,assignments=3,pomodoro=2,exam=1"
+
+MESSAGES = [
+    "I have my maths exam next week and I can't focus on revision",
+    "how do I make a study timetable for physics and chemistry",
+    "I keep procrastinating on my history essay, any tips?",
+    "thanks!",
+    "can you explain how to revise for a programming exam",
+    "I feel stressed about my grades this semester",
+    "hi",
+]
+TOPICS = ["Linear Algebra", "Organic Chemistry", "World War II", "Data Structures",
+          "Microeconomics", "Cell Biology", "Thermodynamics", "Python Programming"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)      # route -> [(ms, ok)]
+
+    def add(self, route, ms, ok):
+        with self.lock:
+            self.samples[route].append((ms, ok))
+
+    def report(self, seconds):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            times = sorted(ms for ms, _ in samples)
+            errors = sum(1 for _, ok in samples if not ok)
+            routes[route] = {
+                "requests": len(samples),
+                "errors": errors,
+                "throughput_rps": round(len(samples) / seconds, 2),
+                "p50_ms": round(percentile(times, 50), 1),
+                "p95_ms": round(percentile(times, 95), 1),
+                "p99_ms": round(percentile(times, 99), 1),
+                "mean_ms": round(statistics.fmean(times), 1),
+                "max_ms": round(times[-1], 1),
+            }
+        return routes
+
+
+class VirtualUser:
+    def __init__(self, n, base_url, mix, recorder, deadline, exam_timeout):
+        self.n = n
+        self.http = httpx.Client(base_url=base_url, timeout=120, follow_redirects=False)
+        self.actions = [a for a, _ in mix]
+        self.weights = [w for _, w in mix]
+        self.rec = recorder
+        self.deadline = deadline
+        self.exam_timeout = exam_timeout
+        self.rnd = random.Random(n)
+        self.session_id = None
+
+    def timed(self, route, fn, ok_status=(200, 201, 202, 204, 302, 304)):
+        t0 = time.perf_counter()
+        try:
+            resp = fn()
+            ok = resp.status_code in ok_status
+        except httpx.HTTPError:
+            resp, ok = None, False
+        self.rec.add(route, (time.perf_counter() - t0) * 1000, ok)
+        return resp
+
+    # ---------- setup ----------
+    def login(self):
+        username = f"load{self.n}_{os.getpid()}"
+        self.http.post("/register", data={"fullname": f"Load {self.n}", "username": username,
+                                          "password": "load-pass"})
+        self.timed("POST /login", lambda: self.http.post(
+            "/login", data={"username": username, "password": "load-pass"}))
+        resp = self.timed("GET /new_chat", lambda: self.http.get("/new_chat"))
+        if resp is not None and resp.headers.get("location"):
+            self.session_id = int(resp.headers["location"].rstrip("/").rsplit("/", 1)[1])
+
+    # ---------- actions ----------
+    def send(self):
+        self.timed("POST /send", lambda: self.http.post(
+            f"/send/{self.session_id}", data={"message": self.rnd.choice(MESSAGES)}))
+
+    def send_stream(self):
+        def call():
+            with self.http.stream("POST", f"/send/{self.session_id}?stream=1",
+                                  data={"message": self.rnd.choice(MESSAGES)},
+                                  headers={"Accept": "text/event-stream"}) as resp:
+                for _ in resp.iter_bytes():
+                    pass
+                return resp
+        self.timed("POST /send (stream)", call)
+
+    def notes(self):
+        if self.rnd.random() < 0.25:
+            self.timed("POST /notes/add", lambda: self.http.post(
+                "/notes/add", data={"title": "Lecture notes", "content": "Chapter summary " * 20,
+                                    "tags": "revision"}))
+        self.timed("GET /notes/list", lambda: self.http.get("/notes/list"))
+
+    def assignments(self):
+        if self.rnd.random() < 0.25:
+            due = (date.today() + timedelta(days=self.rnd.randint(0, 30))).isoformat()
+            self.timed("POST /api/assignments", lambda: self.http.post(
+                "/api/assignments", json={"title": "Problem set", "subject": "Maths", "due_date": due}))
+        self.timed("GET /api/assignments", lambda: self.http.get("/api/assignments"))
+        self.timed("GET /api/assignments/reminders", lambda: self.http.get(
+            "/api/assignments/reminders?days=7"))
+
+    def pomodoro(self):
+        self.timed("POST /pomodoro/log", lambda: self.http.post(
+            "/pomodoro/log", data={"success": "true", "work_minutes": "25"}))
+        self.timed("GET /pomodoro/stats", lambda: self.http.get("/pomodoro/stats"))
+
+    def exam(self):
+        topic = f"{self.rnd.choice(TOPICS)} {self.rnd.randint(1, 1000)}"
+        started = time.perf_counter()
+        resp = self.timed("POST /exam_helper/generate", lambda: self.http.post(
+            "/exam_helper/generate", data={"topic": topic}))
+        if resp is None or resp.status_code != 202:
+            return
+        status_url = resp.json()["status_url"]
+        ok = False
+        while time.perf_counter() - started < self.exam_timeout:
+            time.sleep(0.25)
+            job = self.timed("GET /jobs/<id>", lambda: self.http.get(status_url))
+            status = job.json().get("status") if job is not None and job.status_code == 200 else None
+            if status in ("done", "failed"):
+                ok = status == "done"
+                break
+        self.rec.add("exam guide job (end to end)", (time.perf_counter() - started) * 1000, ok)
+
+    def run(self):
+        try:
+            self.login()
+            while time.monotonic() < self.deadline:
+                getattr(self, self.rnd.choices(self.actions, self.weights)[0])()
+        finally:
+            self.http.close()
+
+
+def parse_mix(text):
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if not hasattr(VirtualUser, name.strip()):
+            raise SystemExit(f"unknown action in --mix: {name}")
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+def wait_until_up(url, proc, timeout=30):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if proc.poll() is not None:
+            raise SystemExit("gunicorn exited during startup")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"app did not come up on {url}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    ap.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    ap.add_argument("--threads", type=int, default=8, help="threads per gunicorn worker")
+    ap.add_argument("--job-workers", type=int, default=2, help="JOB_WORKERS per gunicorn worker")
+    ap.add_argument("--profile", default="production", help="APP_CONFIG profile")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="action=weight,...")
+    ap.add_argument("--exam-timeout", type=float, default=60.0)
+    ap.add_argument("--out", help="also write the JSON report to this file")
+    ap.add_argument("--keep-db", action="store_true", help="leave the temporary database behind")
+    stub_llm.add_arguments(ap)
+    args = ap.parse_args()
+    mix = parse_mix(args.mix)
+
+    stub, stub_stats = stub_llm.serve(args)
+    tmp = tempfile.mkdtemp(prefix="loadtest_")
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "APP_CONFIG": args.profile,
+        "DATABASE_URL": "sqlite:///" + os.path.join(tmp, "load.db"),
+        "GROQ_API_KEY": "load-test",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{stub.server_port}",
+        "ATTACHMENT_DIR": os.path.join(tmp, "attachments"),
+        "JINJA_CACHE_DIR": os.path.join(tmp, "jinja_cache"),
+        "JOB_WORKERS": str(args.job_workers),
+        "EMPTY_CHAT_SWEEP_INTERVAL": "0",
+    })
+
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "upgrade-db"],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    gunicorn = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-k", "gthread", "-w", str(args.workers),
+         "--threads", str(args.threads), "-b", f"127.0.0.1:{port}", "--timeout", "120",
+         "--log-level", "warning", "app:create_app()"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(base_url + "/login", gunicorn)
+
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + args.duration
+        users = [VirtualUser(i, base_url, mix, recorder, deadline, args.exam_timeout)
+                 for i in range(args.users)]
+        threads = [threading.Thread(target=u.run, daemon=True) for u in users]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.monotonic() - started
+    finally:
+        gunicorn.terminate()
+        try:
+            gunicorn.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            gunicorn.kill()
+        stub.shutdown()
+        if not args.keep_db:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    routes = recorder.report(elapsed)
+    report = {
+        "config": {
+            "users": args.users, "duration_s": args.duration, "workers": args.workers,
+            "threads": args.threads, "job_workers": args.job_workers, "profile": args.profile,
+            "mix": dict(mix), "llm_latency_ms": args.latency_ms,
+            "llm_tokens_per_sec": args.tokens_per_sec, "llm_reply_tokens": args.reply_tokens,
+            "llm_error_rate": args.error_rate, "llm_error_status": args.error_status,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": sum(r["requests"] for name, r in routes.items() if name.startswith(("GET", "POST"))),
+        "total_errors": sum(r["errors"] for r in routes.values()),
+        "stub_llm": stub_stats.as_dict(),
+        "routes": routes,
+    }
+    report["throughput_rps"] = round(report["total_requests"] / elapsed, 2)
+
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Worker startup cost: `import app` (python -X importtime) and create_app().
+
+Each run is a fresh interpreter, like a gunicorn worker being (re)spawned.
+It first imports the frameworks every worker needs (Flask, Flask-Login,
+Flask-SQLAlchemy, SQLAlchemy ORM) and then `import app`, so the import
+budget covers only what the app adds on top of that floor, not how fast the
+machine loads Flask. The run fails (exit 1) when the median import or
+create_app() time is over budget, or when a module that should load lazily
+(the LLM client stack, CLI-only modules) is imported at boot. Use it in CI
+to catch startup regressions.
+
+Measured on a dev laptop: framework floor 370-580 ms, app on top of it
+85-155 ms, create_app() ~25 ms. The defaults leave about 2x headroom.
+
+    python benchmarks/startup_bench.py --runs 5 --import-budget-ms 250
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# must not be imported by `import app`: the LLM client stack loads on the
+# first LLM call, the rest only inside the `flask` commands that use them
+LAZY_MODULES = ("groq", "httpx", "httpcore", "anyio", "pydantic",
+                "schema", "backfill", "multiprocessing")
+
+FRAMEWORKS = "flask, flask_login, flask_sqlalchemy, sqlalchemy.orm"
+
+BOOT = (
+    "import time\n"
+    "t0 = time.perf_counter()\n"
+    f"import {FRAMEWORKS}\n"
+    "t1 = time.perf_counter()\n"
+    "import app\n"
+    "t2 = time.perf_counter()\n"
+    "app.create_app()\n"
+    "t3 = time.perf_counter()\n"
+    "print((t1 - t0) * 1000, (t2 - t1) * 1000, (t3 - t2) * 1000)\n"
+)
+
+
+def boot_env(db_path):
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": env.get("GROQ_API_KEY") or "startup-bench",
+        "DATABASE_URL": "sqlite:///" + db_path,
+        "JOB_WORKERS": "0",
+        "REMINDER_SCHEDULER": "0",
+        "EMPTY_CHAT_SWEEP_INTERVAL": "0",
+        "SCHEMA_ON_BOOT": "0",
+        "PYTHONDONTWRITEBYTECODE": "",
+    })
+    return env
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from -X importtime output."""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cum_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue                      # header line
+        out[parts[2].strip()] = (self_us, cum_us)
+    return out
+
+
+def one_run(env):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", BOOT],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"boot failed:\n{proc.stderr[-2000:]}")
+    floor_ms, import_ms, create_ms = map(float, proc.stdout.strip().splitlines()[-1].split())
+    return floor_ms, import_ms, create_ms, parse_importtime(proc.stderr)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--import-budget-ms", type=float, default=250.0,
+                    help="for `import app` on top of the framework imports")
+    ap.add_argument("--create-app-budget-ms", type=float, default=150.0)
+    ap.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    env = boot_env(os.path.join(tempfile.mkdtemp(prefix="startupbench_"), "bench.db"))
+    # a deployed worker boots against an upgraded database
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "upgrade-db"],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    one_run(env)                          # warm the bytecode / OS caches
+
+    floors, imports, creates, modules = [], [], [], {}
+    for _ in range(args.runs):
+        floor_ms, import_ms, create_ms, mods = one_run(env)
+        floors.append(floor_ms)
+        imports.append(import_ms)
+        creates.append(create_ms)
+        modules = mods
+
+    slowest = sorted(modules.items(), key=lambda kv: kv[1][0], reverse=True)[:args.top]
+    lazy_loaded = sorted(m for m in modules if m.split(".")[0] in LAZY_MODULES)
+    result = {
+        "runs": args.runs,
+        "framework_ms": round(statistics.median(floors), 1),
+        "import_ms": round(statistics.median(imports), 1),
+        "create_app_ms": round(statistics.median(creates), 1),
+        "import_budget_ms": args.import_budget_ms,
+        "create_app_budget_ms": args.create_app_budget_ms,
+        "modules": len(modules),
+        "slowest_self_ms": {m: round(s / 1000, 1) for m, (s, _) in slowest},
+        "lazy_modules_imported": lazy_loaded,
+    }
+    failures = []
+    if result["import_ms"] > args.import_budget_ms:
+        failures.append(f"import app took {result['import_ms']} ms (budget {args.import_budget_ms})")
+    if result["create_app_ms"] > args.create_app_budget_ms:
+        failures.append(f"create_app() took {result['create_app_ms']} ms (budget {args.create_app_budget_ms})")
+    if lazy_loaded:
+        failures.append(f"imported at boot but should be lazy: {', '.join(lazy_loaded[:5])}")
+    result["ok"] = not failures
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"frameworks    {result['framework_ms']:>8} ms   (not budgeted)")
+        print(f"import app    {result['import_ms']:>8} ms   (budget {args.import_budget_ms})")
+        print(f"create_app()  {result['create_app_ms']:>8} ms   (budget {args.create_app_budget_ms})")
+        print(f"{result['modules']} modules; slowest (self time):")
+        for m, ms in result["slowest_self_ms"].items():
+            print(f"  {ms:>7} ms  {m}")
+        for f in failures:
+            print("FAIL:", f)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
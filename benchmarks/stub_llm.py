@@ -0,0 +1,182 @@
+"""
+Local stand-in for the Groq (OpenAI-compatible) chat completions API.
+
+Serves POST /openai/v1/chat/completions, the path the groq SDK calls under
+GROQ_BASE_URL, and the plain /v1/chat/completions. Both normal and
+streaming (stream=true, SSE) responses are supported. You can set:
+
+  --latency-ms      time to first token
+  --tokens-per-sec  generation speed after that (0 = instant)
+  --reply-tokens    length of a chat reply
+  --error-rate      fraction of requests answered with --error-status
+
+Exam guide prompts (asking for JSON) get a valid guide back, so the whole
+job path runs.
+
+    python benchmarks/stub_llm.py --port 8900 --latency-ms 300 --tokens-per-sec 200
+    GROQ_BASE_URL=http://127.0.0.1:8900 python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("focus revise practise notes summary breaks sleep plan topics exam "
+         "questions timetable review steady progress small goals today").split()
+
+GUIDE = {
+    "IMPORTANT_TOPICS": [f"Topic {i}" for i in range(1, 8)],
+    "MOST_ASKED_QUESTIONS": [f"Question {i}?" for i in range(1, 6)],
+    "SCORING_STRATEGY": [f"Strategy {i}" for i in range(1, 5)],
+    "EASY_SCORING_AREAS": [f"Area {i}" for i in range(1, 4)],
+    "STUDY_PLAN": [f"Step {i}" for i in range(1, 6)],
+    "EXAM_WRITING_TIPS": [f"Tip {i}" for i in range(1, 4)],
+}
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.streams = 0
+        self.errors = 0
+
+    def add(self, stream=False, error=False):
+        with self.lock:
+            self.requests += 1
+            self.streams += 1 if stream else 0
+            self.errors += 1 if error else 0
+
+    def as_dict(self):
+        with self.lock:
+            return {"requests": self.requests, "streams": self.streams, "injected_errors": self.errors}
+
+
+def reply_tokens(messages, n):
+    """Tokens (whitespace-joined pieces) of the reply for these messages."""
+    prompt = " ".join(str(m.get("content", "")) for m in messages)
+    if "JSON" in prompt:
+        return [json.dumps(GUIDE)]
+    rnd = random.Random(len(prompt))
+    words = [rnd.choice(WORDS) for _ in range(n)]
+    lines = [" ".join(words[i:i + 8]) for i in range(0, n, 8)]
+    return ("- " + "\n- ".join(lines)).split(" ")
+
+
+def make_handler(opts, stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                return self._json(200, stats.as_dict())
+            self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                return self._json(404, {"error": {"message": "not found"}})
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            stream = bool(req.get("stream"))
+
+            if random.random() < opts.error_rate:
+                stats.add(stream, error=True)
+                time.sleep(opts.latency_ms / 1000 / 2)
+                return self._json(opts.error_status, {"error": {
+                    "message": "injected error", "type": "stub_error", "code": "stub"}})
+            stats.add(stream)
+
+            tokens = reply_tokens(req.get("messages") or [], opts.reply_tokens)
+            per_token = 1 / opts.tokens_per_sec if opts.tokens_per_sec > 0 else 0
+            model = req.get("model") or "stub"
+            created = int(time.time())
+            time.sleep(opts.latency_ms / 1000)
+
+            if not stream:
+                time.sleep(per_token * len(tokens))
+                return self._json(200, {
+                    "id": f"chatcmpl-stub-{created}",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": " ".join(tokens)}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens),
+                              "total_tokens": len(tokens)},
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def chunk(delta, finish=None):
+                body = {"id": f"chatcmpl-stub-{created}", "object": "chat.completion.chunk",
+                        "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+                self.wfile.write(f"data: {json.dumps(body)}\n\n".encode())
+                self.wfile.flush()
+
+            try:
+                chunk({"role": "assistant", "content": ""})
+                for i, tok in enumerate(tokens):
+                    chunk({"content": tok if i == 0 else " " + tok})
+                    time.sleep(per_token)
+                chunk({}, finish="stop")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass                      # client stopped reading
+
+    return Handler
+
+
+def add_arguments(ap):
+    ap.add_argument("--latency-ms", type=float, default=300.0, help="time to first token")
+    ap.add_argument("--tokens-per-sec", type=float, default=200.0, help="0 = whole reply at once")
+    ap.add_argument("--reply-tokens", type=int, default=80)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="0..1 fraction of failed calls")
+    ap.add_argument("--error-status", type=int, default=500, help="e.g. 429 or 503")
+
+
+def serve(opts, host="127.0.0.1", port=0):
+    """Start the stub in a background thread; returns (server, stats)."""
+    stats = Stats()
+    server = ThreadingHTTPServer((host, port), make_handler(opts, stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server, stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    add_arguments(ap)
+    opts = ap.parse_args()
+
+    server, stats = serve(opts, opts.host, opts.port)
+    print(f"stub LLM on http://{opts.host}:{server.server_port} (GROQ_BASE_URL), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(json.dumps(stats.as_dict()))
+
+
+if __name__ == "__main__":
+    main()
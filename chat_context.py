@@ -0,0 +1,134 @@
+"""
+Bounded conversation context for the chat LLM.
+
+Only the last few messages of a session are replayed verbatim. Older messages
+are folded into a rolling summary stored on ChatSession, so the cost of one
+/send stays flat however long the session gets.
+
+Folding is an LLM call, so it never runs inside /send. Once a batch of
+unsummarised turns has piled up, build_history() queues a "fold_summary"
+background job (one per session at a time). Until the job is done, the
+overflow is sent verbatim within the token budget. The job pages through
+every unsummarised message older than the verbatim window, a batch per LLM
+call, and commits after each batch. A failed fold is recorded on the session
+and not retried before an exponential backoff.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from db import db
+from models import ChatSession, Message
+from ai_engine import summarize_conversation
+from jobqueue import jobs
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting
+    return len(text or "") // 4 + 1
+
+
+def to_turn(m):
+    role = "assistant" if m.emotion == "bot_reply" else "user"
+    return {"role": role, "content": m.text}
+
+
+def recent_query(s, exclude_id=None, limit=28):
+    """The newest unsummarised messages of a session, newest first."""
+    q = Message.query.filter(Message.session_id == s.id, Message.id > (s.summary_upto_id or 0))
+    if exclude_id is not None:
+        q = q.filter(Message.id != exclude_id)
+    return q.order_by(Message.id.desc()).limit(limit)
+
+
+def fold_page_query(s, boundary, limit):
+    """The oldest unsummarised messages before `boundary` (a Message.id), oldest first."""
+    return (Message.query
+            .filter(Message.session_id == s.id,
+                    Message.id > (s.summary_upto_id or 0), Message.id < boundary)
+            .order_by(Message.id.asc()).limit(limit))
+
+
+def build_history(s, exclude_id=None):
+    """
+    Return the history list for generate_ai_reply() / stream_ai_reply().
+
+    exclude_id is the message being answered; the AI engine appends that
+    one itself.
+    """
+    cfg = current_app.config
+    keep = cfg["CHAT_CONTEXT_KEEP_MESSAGES"]
+    batch = cfg["CHAT_CONTEXT_FOLD_BATCH"]
+    budget = cfg["CHAT_CONTEXT_TOKEN_BUDGET"]
+
+    rows = recent_query(s, exclude_id, limit=keep + 2 * batch).all()
+    rows.reverse()
+
+    overflow, recent = rows[:-keep] if len(rows) > keep else [], rows[-keep:]
+
+    # enough older turns piled up: summarise them in the background
+    if len(overflow) >= batch and (s.summary_retry_after is None or s.summary_retry_after <= datetime.utcnow()):
+        jobs.submit("fold_summary", {"session_id": s.id}, user_id=s.user_id,
+                    dedup_key=f"summary:{s.id}")
+
+    turns = [to_turn(m) for m in overflow + recent]
+
+    # drop the oldest verbatim turns if we are still over the token budget
+    used = estimate_tokens(s.summary)
+    kept = []
+    for t in reversed(turns):
+        used += estimate_tokens(t["content"])
+        if used > budget and kept:
+            break
+        kept.append(t)
+    kept.reverse()
+
+    history = []
+    if s.summary:
+        history.append({
+            "role": "system",
+            "content": "Summary of the earlier conversation:\n" + s.summary
+        })
+    return history + kept
+
+
+def fold_summary(session_id):
+    """Fold every unsummarised message older than the verbatim window into the summary."""
+    cfg = current_app.config
+    keep = cfg["CHAT_CONTEXT_KEEP_MESSAGES"]
+    batch = cfg["CHAT_CONTEXT_FOLD_BATCH"]
+
+    s = db.session.get(ChatSession, session_id)
+    if s is None:
+        return {"folded": 0}
+    # the oldest message that stays verbatim; everything before it may be folded
+    boundary = (db.session.query(Message.id)
+                .filter(Message.session_id == s.id)
+                .order_by(Message.id.desc()).offset(keep - 1).limit(1).scalar())
+    if boundary is None:
+        return {"folded": 0}
+
+    folded = 0
+    while True:
+        page = fold_page_query(s, boundary, batch).all()
+        if not page:
+            break
+        new_summary = summarize_conversation(s.summary, [to_turn(m) for m in page])
+        if not new_summary:
+            s.summary_failures = (s.summary_failures or 0) + 1
+            delay = min(cfg["CHAT_SUMMARY_RETRY_BASE"] * 2 ** (s.summary_failures - 1),
+                        cfg["CHAT_SUMMARY_RETRY_MAX"])
+            s.summary_retry_after = datetime.utcnow() + timedelta(seconds=delay)
+            db.session.commit()
+            return {"folded": folded, "retry_in": delay}
+        s.summary = new_summary
+        s.summary_upto_id = page[-1].id
+        s.summary_failures = 0
+        s.summary_retry_after = None
+        db.session.commit()
+        folded += len(page)
+    return {"folded": folded}
+
+
+@jobs.handler("fold_summary")
+def fold_summary_job(payload, job):
+    return fold_summary(payload["session_id"])
@@ -0,0 +1,100 @@
+"""
+Conditional GET for the per-user JSON list endpoints.
+
+Each (user, resource) pair has a version counter in resource_versions. Write
+routes call bump() in the same transaction as their change. A GET route
+wrapped in @conditional("notes") reads that counter first, which is a single
+primary-key lookup. If the client's If-None-Match or If-Modified-Since still
+matches, it returns 304 Not Modified before the view, and so its queries,
+runs. Otherwise the view runs and the response gets ETag / Last-Modified.
+
+The ETag also covers the query string (cursor, limit, days ...) and today's
+date, because several payloads depend on it (is_overdue, reminders).
+"""
+import hashlib
+from datetime import date, datetime, time, timedelta, timezone
+from functools import wraps
+
+from flask import request, make_response
+from flask_login import current_user
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import ResourceVersion
+
+
+ASSIGNMENTS = "assignments"
+NOTES = "notes"
+POMODORO = "pomodoro"
+EXAM_HISTORY = "exam_history"
+CHATS = "chats"             # the sidebar chat list; see sidebar.py
+
+
+def bump(user_ids, resource):
+    """Mark a resource as changed for one user or several. Caller commits."""
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    now = datetime.utcnow()
+    for uid in set(user_ids):
+        res = db.session.execute(update(ResourceVersion)
+                                 .where(ResourceVersion.user_id == uid,
+                                        ResourceVersion.resource == resource)
+                                 .values(version=ResourceVersion.version + 1, updated_at=now)
+                                 .execution_options(synchronize_session=False))
+        if res.rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(ResourceVersion(user_id=uid, resource=resource, version=1, updated_at=now))
+        except IntegrityError:
+            bump(uid, resource)
+
+
+def version(user_id, resource):
+    """Current version counter (0 before the first write)."""
+    row = db.session.get(ResourceVersion, (user_id, resource))
+    return row.version if row else 0
+
+
+def validators(user_id, resource):
+    """(etag, last_modified) for the current request's view of a resource."""
+    row = db.session.get(ResourceVersion, (user_id, resource))
+    version = row.version if row else 0
+    today = date.today()
+    raw = f"{resource}|{user_id}|{version}|{today.isoformat()}|{request.query_string.decode()}"
+    etag = hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+    # payloads also change at midnight, so never report older than today
+    midnight = datetime.combine(today, time.min).astimezone(timezone.utc).replace(tzinfo=None)
+    changed = max(row.updated_at if row else midnight, midnight)
+    # HTTP dates have whole seconds; round up so a write later in the same
+    # second is never reported as "not modified"
+    if changed.microsecond:
+        changed = changed.replace(microsecond=0) + timedelta(seconds=1)
+    return etag, changed.replace(tzinfo=timezone.utc)
+
+
+def conditional(resource):
+    """Decorator for a login-protected JSON GET view of `resource`."""
+    def wrap(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            etag, last_modified = validators(current_user.id, resource)
+
+            if request.if_none_match:
+                fresh = request.if_none_match.contains_weak(etag)
+            else:
+                ims = request.if_modified_since
+                fresh = ims is not None and last_modified <= ims
+
+            resp = make_response("", 304) if fresh else make_response(view(*args, **kwargs))
+            if resp.status_code in (200, 304):
+                resp.set_etag(etag, weak=True)
+                resp.last_modified = last_modified
+                # the browser may keep it, but must check with us before reuse
+                resp.cache_control.private = True
+                resp.cache_control.no_cache = True
+            return resp
+        return wrapped
+    return wrap
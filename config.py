@@ -1,8 +1,137 @@
+
 import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+SQLITE_URI = "sqlite:///" + os.path.join(BASE_DIR, "instance", "app.db")
+
+
+def production_engine_options(uri):
+    """Pool settings for the production profile; same code path for SQLite and PostgreSQL."""
+    if uri.startswith("sqlite"):
+        return {
+            "pool_size": 10,
+            "max_overflow": 10,
+            # sqlite3's own lock wait, on top of PRAGMA busy_timeout
+            "connect_args": {"timeout": 30},
+        }
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "pool_timeout": 30,
+    }
+
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(BASE_DIR, "instance", "app.db")
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL") or SQLITE_URI
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # PRAGMAs run on every new SQLite connection (ignored for other databases)
+    SQLITE_PRAGMAS = {}
+
+    # chat context sent to the LLM: last N messages verbatim, older ones
+    # folded into ChatSession.summary in batches
+    CHAT_CONTEXT_KEEP_MESSAGES = int(os.getenv("CHAT_CONTEXT_KEEP_MESSAGES", "8"))
+    CHAT_CONTEXT_FOLD_BATCH = int(os.getenv("CHAT_CONTEXT_FOLD_BATCH", "10"))
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1500"))
+    # a failed fold waits base * 2^(failures - 1) seconds, capped, before the next try
+    CHAT_SUMMARY_RETRY_BASE = int(os.getenv("CHAT_SUMMARY_RETRY_BASE", "60"))
+    CHAT_SUMMARY_RETRY_MAX = int(os.getenv("CHAT_SUMMARY_RETRY_MAX", "3600"))
+
+    # exam guide cache: in-process LRU in front of a shared SQLite table
+    EXAM_CACHE_LRU_SIZE = int(os.getenv("EXAM_CACHE_LRU_SIZE", "256"))
+    EXAM_CACHE_TTL_HOURS = int(os.getenv("EXAM_CACHE_TTL_HOURS", str(7 * 24)))
+    EXAM_CACHE_MAX_BYTES = int(os.getenv("EXAM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+    # chat transcript: messages rendered with the page / returned per older page
+    CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "50"))
+
+    # /notes/list page size (?limit= is capped at NOTES_MAX_PAGE_SIZE)
+    NOTES_PAGE_SIZE = int(os.getenv("NOTES_PAGE_SIZE", "20"))
+    NOTES_MAX_PAGE_SIZE = 100
+
+    # note attachments: content-addressed blob store and per-file size limit.
+    # MAX_CONTENT_LENGTH makes Flask refuse bigger bodies from Content-Length
+    # before reading them; the store also counts bytes for chunked uploads.
+    ATTACHMENT_DIR = os.getenv("ATTACHMENT_DIR") or os.path.join(BASE_DIR, "instance", "attachments")
+    ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(25 * 1024 * 1024)))
+    MAX_CONTENT_LENGTH = ATTACHMENT_MAX_BYTES + 64 * 1024
+    # let nginx/Apache send attachment files (X-Sendfile) instead of the worker
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "0") == "1"
+
+    # background jobs (jobqueue.py): worker threads per web process (0 = run
+    # `flask run-jobs` separately), lease length, retry backoff and attempts;
+    # done/failed jobs are deleted after JOB_RETENTION_DAYS (0 = keep forever)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "180"))
+    JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "5"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+    JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+    # pomodoro: sessions per /pomodoro/history page, and per /pomodoro/log batch
+    POMODORO_PAGE_SIZE = int(os.getenv("POMODORO_PAGE_SIZE", "50"))
+    POMODORO_MAX_PAGE_SIZE = 200
+    POMODORO_MAX_BATCH = 100
+    # longest date range one /pomodoro/stats request may cover
+    POMODORO_STATS_MAX_DAYS = 366
+
+    # reminder scheduler (reminders.py): assignments fire REMINDER_DAYS_BEFORE
+    # days before they are due at REMINDER_HOUR; notes at reminder_at
+    REMINDER_SCHEDULER = os.getenv("REMINDER_SCHEDULER", "1") == "1"
+    REMINDER_DAYS_BEFORE = int(os.getenv("REMINDER_DAYS_BEFORE", "1"))
+    REMINDER_HOUR = int(os.getenv("REMINDER_HOUR", "9"))
+    # how often each worker picks up reminder edits made through other workers
+    REMINDER_POLL_SECONDS = int(os.getenv("REMINDER_POLL_SECONDS", "5"))
+    REMINDER_CHANGE_RETENTION_HOURS = int(os.getenv("REMINDER_CHANGE_RETENTION_HOURS", "24"))
+    REMINDER_HEARTBEAT_SECONDS = 25
+
+    # static assets: serve the fingerprinted build from static/dist/ when
+    # `flask build-assets` has been run (turn off while editing static files)
+    STATIC_FINGERPRINT = os.getenv("STATIC_FINGERPRINT", "1") == "1"
+
+    # rendered templates/fragments/ panels (fragments.py) and the on-disk
+    # Jinja bytecode cache (empty JINJA_CACHE_DIR turns it off)
+    FRAGMENT_CACHE = os.getenv("FRAGMENT_CACHE", "1") == "1"
+    FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "512"))
+    JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", os.path.join(BASE_DIR, "instance", "jinja_cache"))
+
+    # create missing tables / columns at boot, so a fresh checkout just runs.
+    # Production turns this off: run `flask --app app upgrade-db` once per deploy,
+    # and workers refuse to start against a database without the schema
+    SCHEMA_ON_BOOT = os.getenv("SCHEMA_ON_BOOT", "1") == "1"
+
+    # app.logger level (job progress is logged at INFO)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+    # sidebar chat list cache (users per worker) and the background empty-chat sweeper
+    SIDEBAR_CACHE_SIZE = int(os.getenv("SIDEBAR_CACHE_SIZE", "5000"))
+    EMPTY_CHAT_SWEEP_INTERVAL = int(os.getenv("EMPTY_CHAT_SWEEP_INTERVAL", "600"))   # 0 disables
+    EMPTY_CHAT_MAX_AGE_MINUTES = int(os.getenv("EMPTY_CHAT_MAX_AGE_MINUTES", "60"))
+
+
+class ProductionConfig(Config):
+    """Several gunicorn workers writing to one database."""
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",          # readers no longer block the writer
+        "synchronous": "NORMAL",        # safe with WAL, far fewer fsyncs
+        "busy_timeout": 5000,           # wait for the write lock instead of "database is locked"
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,       # negative = KiB, so 64 MiB
+        "temp_store": "MEMORY",
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = production_engine_options(Config.SQLALCHEMY_DATABASE_URI)
+    SCHEMA_ON_BOOT = os.getenv("SCHEMA_ON_BOOT", "0") == "1"
+
+
+CONFIGS = {
+    "default": Config,
+    "production": ProductionConfig,
+}
+
+
+def get_config(name=None):
+    """Pick the profile from APP_CONFIG (default / production)."""
+    return CONFIGS[name or os.getenv("APP_CONFIG", "default")]
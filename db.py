@@ -1,2 +1,26 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
+
 db = SQLAlchemy()
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run the configured PRAGMAs on every new connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        cur.close()
+
+    # connections opened before the listener existed would miss the pragmas
+    engine.dispose()
+
+
+def missing_tables():
+    """Model tables the database does not have (one catalogue query)."""
+    existing = set(inspect(db.engine).get_table_names())
+    return sorted(set(db.metadata.tables) - existing)
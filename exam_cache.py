@@ -0,0 +1,179 @@
+"""
+Two-tier cache in front of generate_exam_helper().
+
+  1. in-process LRU (per worker); each entry expires with its database row
+  2. exam_guide_cache table in the app database (shared by all workers),
+     with a TTL and a total-size cap
+
+Concurrent requests for the same key inside one process share a single
+upstream call (single-flight).
+"""
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from db import db
+from models import ExamGuideCache
+from ai_engine import generate_exam_helper, MODEL_NAME, EXAM_PROMPT_VERSION, EXAM_ERROR_TEXT
+
+
+# last_hit_at only drives size-cap eviction order; don't write it on every hit
+HIT_RESOLUTION = timedelta(hours=1)
+
+
+def normalise_topic(topic):
+    """Case- and punctuation-insensitive form of a topic, in any script."""
+    t = unicodedata.normalize("NFKC", topic or "").casefold()
+    # keep letters, digits and combining marks (Devanagari vowel signs ...), plus C++ / C#
+    t = "".join(ch if ch in "+#" or unicodedata.category(ch)[0] in "LNM" else " " for ch in t)
+    return " ".join(t.split())
+
+
+def cache_key(topic):
+    norm = normalise_topic(topic)
+    if not norm:
+        # nothing but punctuation: key on the exact text, never on ""
+        norm = "raw:" + (topic or "").strip()
+    raw = f"{EXAM_PROMPT_VERSION}|{MODEL_NAME}|{norm}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRU:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= datetime.utcnow():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def put(self, key, value, expires_at):
+        with self.lock:
+            self.data[key] = (value, expires_at)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+
+class ExamGuideStore:
+    def __init__(self):
+        self.lru = LRU()
+        self.ttl = timedelta(days=7)
+        self.max_bytes = 50 * 1024 * 1024
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.lru.maxsize = app.config["EXAM_CACHE_LRU_SIZE"]
+        self.ttl = timedelta(hours=app.config["EXAM_CACHE_TTL_HOURS"])
+        self.max_bytes = app.config["EXAM_CACHE_MAX_BYTES"]
+
+    # ---------- SQLite tier ----------
+    def _db_get(self, key):
+        """(content, expires_at) or None."""
+        row = db.session.get(ExamGuideCache, key)
+        if row is None:
+            return None
+        now = datetime.utcnow()
+        if row.created_at < now - self.ttl:
+            db.session.delete(row)
+            db.session.commit()
+            return None
+        if row.last_hit_at is None or row.last_hit_at < now - HIT_RESOLUTION:
+            row.last_hit_at = now
+            db.session.commit()
+        return row.content, row.created_at + self.ttl
+
+    def _db_put(self, key, topic, content):
+        now = datetime.utcnow()
+        size = len(content.encode("utf-8"))
+        row = db.session.get(ExamGuideCache, key)
+        if row is None:
+            row = ExamGuideCache(key=key)
+            db.session.add(row)
+        row.topic = topic[:200]
+        row.content = content
+        row.size = size
+        row.created_at = now
+        row.last_hit_at = now
+        db.session.commit()
+        self._evict(now)
+
+    def _evict(self, now):
+        ExamGuideCache.query.filter(ExamGuideCache.created_at < now - self.ttl).delete()
+        total = db.session.query(db.func.coalesce(db.func.sum(ExamGuideCache.size), 0)).scalar()
+        if total > self.max_bytes:
+            # drop least recently used guides until we are back under the cap
+            victims = []
+            rows = (db.session.query(ExamGuideCache.key, ExamGuideCache.size)
+                    .order_by(ExamGuideCache.last_hit_at.asc())
+                    .yield_per(200))
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+            if victims:
+                ExamGuideCache.query.filter(ExamGuideCache.key.in_(victims)).delete(synchronize_session=False)
+        db.session.commit()
+
+    # ---------- public ----------
+    def get(self, topic):
+        """
+        Return (content, source) where source is "memory", "db", "shared"
+        (waited on another request's upstream call) or "miss".
+        """
+        key = cache_key(topic)
+
+        content = self.lru.get(key)
+        if content is not None:
+            return content, "memory"
+
+        hit = self._db_get(key)
+        if hit is not None:
+            content, expires_at = hit
+            self.lru.put(key, content, expires_at)
+            return content, "db"
+
+        with self.inflight_lock:
+            fut = self.inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self.inflight[key] = fut
+
+        if not leader:
+            return fut.result(), "shared"
+
+        try:
+            content = generate_exam_helper(topic)
+            if content != EXAM_ERROR_TEXT:
+                self.lru.put(key, content, datetime.utcnow() + self.ttl)
+                try:
+                    self._db_put(key, topic, content)
+                except Exception as e:
+                    db.session.rollback()
+                    print("EXAM CACHE WRITE ERROR:", e)
+            fut.set_result(content)
+            return content, "miss"
+        except Exception as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                self.inflight.pop(key, None)
+
+
+exam_guides = ExamGuideStore()
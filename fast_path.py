@@ -0,0 +1,112 @@
+"""
+Pre-LLM triage for /send.
+
+Some turns do not need a model call: crisis messages, greetings, thanks and
+short acknowledgements. triage() answers these from local templates. It is a
+dict lookup on the normalised message, plus the crisis flag that analyse()
+already computed. Anything else returns None and goes to the LLM as before.
+
+The path that served a reply is stored on the bot Message (reply_path) so LLM
+volume and fast-path hit rates can be counted from the messages table.
+"""
+import random
+import re
+from collections import namedtuple
+
+from ai_engine import SUGGESTIONS, get_suggestions
+
+
+PATH_LLM = "llm"
+PATH_CRISIS = "crisis"
+
+FastReply = namedtuple("FastReply", "path reply suggestions")
+
+CRISIS_REPLY = (
+    "• I'm really sorry you're feeling this way, and I'm glad you told me\n"
+    "• You don't have to go through this alone\n"
+    "• If you might act on these thoughts, call your local emergency number now\n"
+    "• Please reach out to a crisis helpline or someone you trust today\n"
+    "• Talking to a counsellor at your college can really help"
+)
+CRISIS_SUGGESTIONS = ["Breathing exercise", "Talk to someone", "Relax routine"]
+
+# intent -> (phrases, reply templates); a template is picked at random
+INTENTS = {
+    "greeting": (
+        ["hi", "hii", "hiii", "hello", "hey", "hey there", "hi there", "hello there", "yo",
+         "good morning", "good afternoon", "good evening", "hola", "namaste"],
+        ["• Hi! 👋 How can I help you today?\n• Ask me about studies, exams, stress or code",
+         "• Hello! What's on your mind today?\n• I can help with study plans, exams or just talking things through"],
+    ),
+    "thanks": (
+        ["thanks", "thank you", "thanks a lot", "thank you so much", "thx", "ty", "tysm",
+         "thanks so much", "many thanks"],
+        ["• You're welcome! 😊\n• Anything else I can help with?",
+         "• Happy to help!\n• Come back any time you need a hand"],
+    ),
+    "ack": (
+        ["ok", "okay", "okk", "k", "cool", "got it", "alright", "sure", "nice", "great",
+         "understood", "fine", "makes sense", "i see"],
+        ["• Great! 👍\n• Tell me if you want to go deeper on anything",
+         "• Got it\n• What would you like to do next?"],
+    ),
+    "goodbye": (
+        ["bye", "goodbye", "bye bye", "see you", "see ya", "good night", "gn", "cya"],
+        ["• Bye! Take care 👋\n• Good luck with your studies",
+         "• See you soon!\n• Remember to take breaks"],
+    ),
+    "wellbeing": (
+        ["how are you", "how r u", "how are you doing", "whats up", "what's up", "sup"],
+        ["• I'm doing well, thanks for asking!\n• How are you feeling today?"],
+    ),
+    "identity": (
+        ["who are you", "what are you", "what can you do", "help"],
+        ["• I'm your AI student assistant\n• I can make study plans and exam guides\n"
+         "• I can explain topics and help debug code\n• I'm also here if you're feeling stressed"],
+    ),
+}
+
+# only messages this short can be a rule match; anything longer goes to the model
+MAX_FAST_WORDS = 4
+
+_TRIM = re.compile(r"[^\w\s']+")
+_SPACES = re.compile(r"\s+")
+
+
+def _build():
+    table = {}
+    for intent, (phrases, replies) in INTENTS.items():
+        for p in phrases:
+            table[p] = (intent, replies)
+    return table
+
+
+_PHRASES = _build()
+
+
+def normalise(text):
+    """Lower-case, drop punctuation/emoji and collapse spaces: 'Thanks!! 🙏' -> 'thanks'."""
+    return _SPACES.sub(" ", _TRIM.sub(" ", text.lower())).strip()
+
+
+def triage(text, info):
+    """
+    Answer `text` locally if a rule matches. `info` is the text_analyser.Analysis
+    already computed for the message. Returns a FastReply, or None for the LLM.
+    """
+    if info.crisis:
+        return FastReply(PATH_CRISIS, CRISIS_REPLY, CRISIS_SUGGESTIONS)
+
+    if text.count(" ") >= MAX_FAST_WORDS * 2:
+        return None
+    key = normalise(text)
+    if not key or key.count(" ") >= MAX_FAST_WORDS:
+        return None
+
+    hit = _PHRASES.get(key)
+    if hit is None:
+        return None
+
+    intent, replies = hit
+    topic = info.topic if info.topic in SUGGESTIONS else "general"
+    return FastReply(intent, random.choice(replies), get_suggestions(topic))
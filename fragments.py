@@ -0,0 +1,89 @@
+"""
+Render cache for the templates/fragments/ panels.
+
+render() builds a fragment with the template alone. It skips Flask's
+context processors, so fragments never pay for inject_sessions (the sidebar
+chat list), which none of them use. They get only the context passed in,
+plus the Jinja globals (url_for, config).
+
+The output is memoised per (template, key). Static panels use the default
+key. Per-user panels pass a key that includes everything the output depends
+on, e.g. (user_id, assignments version, today), and a function that builds
+the template context. The function only runs on a miss, so a hit costs no
+queries. A write makes a new key, and the old entry ages out of the LRU.
+invalidate() drops entries explicitly, for one template or all of them.
+
+The Jinja environment also gets a FileSystemBytecodeCache, so compiled
+templates survive worker restarts.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache
+
+
+class FragmentCache:
+    def __init__(self):
+        self.enabled = True
+        self.maxsize = 512
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        """Call before anything touches app.jinja_env."""
+        # disable memoisation when templates are being edited
+        self.enabled = app.config["FRAGMENT_CACHE"] and not (app.debug or app.config["TEMPLATES_AUTO_RELOAD"])
+        self.maxsize = app.config["FRAGMENT_CACHE_SIZE"]
+
+        cache_dir = app.config["JINJA_CACHE_DIR"]
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(cache_dir)}
+
+    def render(self, name, key=(), context=None):
+        """`context` is a dict, or a function returning one (called on a miss only)."""
+        if not self.enabled:
+            return self._render(name, context)
+        cache_key = (name, key)
+        with self.lock:
+            html = self.data.get(cache_key)
+            if html is not None:
+                self.data.move_to_end(cache_key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        html = self._render(name, context)
+        with self.lock:
+            self.data[cache_key] = html
+            self.data.move_to_end(cache_key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+        return html
+
+    def _render(self, name, context):
+        if callable(context):
+            context = context()
+        return current_app.jinja_env.get_template(name).render(context or {})
+
+    def invalidate(self, name=None, key=None):
+        """Drop one entry, every entry of one template, or everything."""
+        with self.lock:
+            if name is None:
+                self.data.clear()
+            elif key is not None:
+                self.data.pop((name, key), None)
+            else:
+                for k in [k for k in self.data if k[0] == name]:
+                    del self.data[k]
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.data), "hits": self.hits, "misses": self.misses}
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,258 @@
+"""
+Durable background jobs in the app database (no external broker).
+
+    submit()  -> inserts a queued row, or returns the queued/running job with
+                 the same dedup_key (a partial unique index enforces this)
+    worker    -> claims the next runnable row with a conditional UPDATE and
+                 holds a lease until locked_until (the visibility timeout).
+                 If the worker dies, the lease expires and another worker
+                 picks the job up again, unless it has used up max_attempts
+                 (a job that keeps killing its worker), then it is failed.
+    handler   -> on success the row becomes done with a JSON result. Writes
+                 the handler leaves uncommitted are committed in the same
+                 transaction, or rolled back if the lease was lost meanwhile.
+                 On error it is re-queued with exponential backoff until
+                 max_attempts, then marked failed.
+
+Workers run as daemon threads inside the web process (JOB_WORKERS > 0) or
+in their own process with `flask --app app run-jobs`. When idle, a worker
+deletes done/failed rows older than JOB_RETENTION_DAYS, at most once an hour
+per process.
+"""
+import json
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, text, update
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import Job
+
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+ACTIVE = "status IN ('queued', 'running')"
+
+
+def runnable_query(now):
+    """What a worker polls for: the next queued job that is due, or one whose lease expired."""
+    runnable = or_(and_(Job.status == QUEUED, Job.run_after <= now),
+                   and_(Job.status == RUNNING, Job.locked_until < now,
+                        Job.attempts < Job.max_attempts))
+    return (db.session.query(Job.id, Job.status, Job.locked_until)
+            .filter(runnable).order_by(Job.run_after, Job.id).limit(1))
+
+
+def exhausted_query(now, limit=100):
+    """Expired leases with no attempts left: the worker died on the last one."""
+    return (db.session.query(Job.id)
+            .filter(Job.status == RUNNING, Job.locked_until < now,
+                    Job.attempts >= Job.max_attempts)
+            .limit(limit))
+
+
+def purge_query(cutoff, limit=500):
+    """Finished jobs last touched before cutoff."""
+    return (db.session.query(Job.id)
+            .filter(Job.status.in_((DONE, FAILED)), Job.updated_at < cutoff)
+            .limit(limit))
+
+
+def active_query(dedup_key):
+    # spelled like the ux_jobs_dedup_active predicate so SQLite can use that partial index
+    return Job.query.filter(Job.dedup_key == dedup_key, text(ACTIVE)).limit(1)
+
+
+class JobQueue:
+    def __init__(self):
+        self.handlers = {}
+        self.visibility_timeout = 180
+        self.backoff_base = 5
+        self.max_attempts = 3
+        self.poll_interval = 1.0
+        self.retention = timedelta(days=7)
+        self.next_purge = datetime.min
+        self.wakeup = threading.Event()
+
+    def init_app(self, app):
+        self.visibility_timeout = app.config["JOB_VISIBILITY_TIMEOUT"]
+        self.backoff_base = app.config["JOB_BACKOFF_BASE"]
+        self.max_attempts = app.config["JOB_MAX_ATTEMPTS"]
+        self.poll_interval = app.config["JOB_POLL_INTERVAL"]
+        days = app.config["JOB_RETENTION_DAYS"]
+        self.retention = timedelta(days=days) if days > 0 else None
+
+    def handler(self, kind):
+        """Register fn(payload, job) -> JSON-able result for a job kind."""
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    # ---------- producer side ----------
+    def submit(self, kind, payload, user_id=None, dedup_key=None, run_after=None):
+        """
+        Queue a job that runs no earlier than run_after (default: now).
+        Returns (job, created); created is False for a dedup hit.
+        """
+        if dedup_key:
+            job = self._active(dedup_key)
+            if job:
+                return job, False
+
+        job = Job(kind=kind, user_id=user_id, dedup_key=dedup_key, payload=json.dumps(payload),
+                  max_attempts=self.max_attempts, run_after=run_after or datetime.utcnow())
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # an identical job was queued between our check and insert
+            db.session.rollback()
+            job = self._active(dedup_key)
+            if job:
+                return job, False
+            raise
+        self.wakeup.set()
+        return job, True
+
+    def _active(self, dedup_key):
+        return active_query(dedup_key).first()
+
+    # ---------- worker side ----------
+    def claim(self, worker_id):
+        """Lease the next runnable job, or return None."""
+        now = datetime.utcnow()
+        self.fail_exhausted(now)
+        for _ in range(5):
+            candidate = runnable_query(now).first()
+            if candidate is None:
+                return None
+            # only one worker's UPDATE can match the row it saw
+            res = db.session.execute(
+                update(Job)
+                .where(Job.id == candidate.id, Job.status == candidate.status,
+                       or_(Job.locked_until.is_(None), Job.locked_until == candidate.locked_until))
+                .values(status=RUNNING, worker=worker_id, attempts=Job.attempts + 1,
+                        locked_until=now + timedelta(seconds=self.visibility_timeout),
+                        updated_at=now)
+                .execution_options(synchronize_session=False))
+            db.session.commit()
+            if res.rowcount == 1:
+                return db.session.get(Job, candidate.id)
+        return None
+
+    def fail_exhausted(self, now):
+        """Mark expired leases that are out of attempts as failed. Read-only when there are none."""
+        ids = [i for (i,) in exhausted_query(now)]
+        if not ids:
+            return 0
+        res = db.session.execute(update(Job)
+                                 .where(Job.id.in_(ids), Job.status == RUNNING, Job.locked_until < now)
+                                 .values(status=FAILED, locked_until=None, updated_at=now,
+                                         error="worker lost on the last attempt")
+                                 .execution_options(synchronize_session=False))
+        db.session.commit()
+        return res.rowcount
+
+    def purge_finished(self, batch=500):
+        """Delete done/failed jobs older than the retention period. Runs at most hourly."""
+        now = datetime.utcnow()
+        if self.retention is None or now < self.next_purge:
+            return 0
+        self.next_purge = now + timedelta(hours=1)
+        cutoff = now - self.retention
+        purged = 0
+        while True:
+            ids = [i for (i,) in purge_query(cutoff, batch)]
+            if not ids:
+                break
+            res = db.session.execute(Job.__table__.delete()
+                                     .where(Job.id.in_(ids), Job.status.in_((DONE, FAILED))))
+            db.session.commit()
+            purged += res.rowcount
+        if purged:
+            current_app.logger.info("purged %d finished job(s)", purged)
+        return purged
+
+    def _finish(self, job, worker_id, **values):
+        """Set the job's final state and commit, with any writes the handler left pending."""
+        values["updated_at"] = datetime.utcnow()
+        # a worker whose lease expired must not overwrite the new owner's row
+        res = db.session.execute(update(Job)
+                                 .where(Job.id == job.id, Job.worker == worker_id, Job.status == RUNNING)
+                                 .values(**values)
+                                 .execution_options(synchronize_session=False))
+        if res.rowcount:
+            db.session.commit()
+        else:
+            # someone else owns the job now; their run's writes win
+            db.session.rollback()
+        return res.rowcount
+
+    def run_one(self, worker_id):
+        """Claim and run one job. Returns False when there was nothing to do."""
+        job = self.claim(worker_id)
+        if job is None:
+            return False
+
+        fn = self.handlers.get(job.kind)
+        try:
+            if fn is None:
+                raise LookupError(f"no handler for job kind {job.kind!r}")
+            result = fn(json.loads(job.payload), job)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning("job %s (%s) attempt %s failed: %s", job.id, job.kind, job.attempts, e)
+            if job.attempts >= job.max_attempts:
+                self._finish(job, worker_id, status=FAILED, error=str(e), locked_until=None)
+            else:
+                delay = self.backoff_base * 2 ** (job.attempts - 1) * random.uniform(0.8, 1.2)
+                self._finish(job, worker_id, status=QUEUED, error=str(e), locked_until=None,
+                             run_after=datetime.utcnow() + timedelta(seconds=delay))
+            return True
+
+        self._finish(job, worker_id, status=DONE, result=json.dumps(result), error=None,
+                     locked_until=None)
+        return True
+
+    def work(self, app, worker_id, stop=None):
+        """Worker loop; sleeps poll_interval (or until a submit) when idle."""
+        while not (stop and stop.is_set()):
+            try:
+                with app.app_context():
+                    busy = self.run_one(worker_id)
+                    if not busy:
+                        self.purge_finished()
+            except Exception:
+                app.logger.exception("job worker error")
+                busy = False
+            if not busy:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+
+    def start_workers(self, app, count):
+        threads = []
+        for i in range(count):
+            worker_id = f"{socket.gethostname()}:{os.getpid()}:{i}"
+            t = threading.Thread(target=self.work, args=(app, worker_id),
+                                 name=f"job-worker-{i}", daemon=True)
+            t.start()
+            threads.append(t)
+        return threads
+
+
+def job_status(job):
+    """Public view of a job for the polling endpoint."""
+    out = {"id": job.id, "kind": job.kind, "status": job.status, "attempts": job.attempts}
+    if job.status == DONE:
+        out["result"] = json.loads(job.result) if job.result else None
+    elif job.error:
+        out["error"] = job.error
+    return out
+
+
+jobs = JobQueue()
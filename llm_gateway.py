@@ -0,0 +1,137 @@
+"""
+LLM gateway: one pooled Groq client plus a bounded worker pool.
+
+Completions run on the pool instead of the request thread, every call has a
+deadline, and callers get a Future back (or a chunk iterator for streams).
+Run gunicorn with threaded workers (-k gthread --threads N) so a single
+worker process can keep many completions in flight.
+
+The Groq / httpx client is built on first use. groq and httpx are imported
+at that point too, so importing the app (every worker boot) does not pay
+for them.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class LLMBusyError(RuntimeError):
+    """Raised when the gateway queue is full and the caller's deadline ran out."""
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when a completion does not finish before its deadline."""
+
+
+_END = object()
+
+
+class LLMGateway:
+    def __init__(self, max_workers=8, max_pending=32, max_connections=16, timeout=60.0):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.http = None
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        # running + queued calls; submit() waits (up to the deadline) for a slot
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import httpx
+                    from groq import Groq
+
+                    self.http = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                        ),
+                        timeout=self.timeout,
+                    )
+                    self._client = Groq(api_key=os.getenv("GROQ_API_KEY"), http_client=self.http,
+                                        max_retries=1)
+        return self._client
+
+    def _submit(self, fn, deadline):
+        if not self.slots.acquire(timeout=deadline):
+            raise LLMBusyError("LLM gateway is busy")
+        try:
+            fut = self.pool.submit(fn)
+        except Exception:
+            self.slots.release()
+            raise
+        fut.add_done_callback(lambda _f: self.slots.release())
+        return fut
+
+    def submit(self, deadline=None, **params):
+        """Start a chat completion on the pool and return its Future."""
+        deadline = deadline or self.timeout
+        return self._submit(
+            lambda: self.client.chat.completions.create(timeout=deadline, **params),
+            deadline,
+        )
+
+    def complete(self, deadline=None, **params):
+        """Run a chat completion on the pool and wait for it, at most `deadline` seconds."""
+        deadline = deadline or self.timeout
+        started = time.monotonic()
+        fut = self.submit(deadline=deadline, **params)
+        try:
+            return fut.result(timeout=max(0.0, deadline - (time.monotonic() - started)))
+        except FutureTimeout:
+            fut.cancel()
+            raise LLMTimeoutError(f"LLM call exceeded {deadline}s")
+
+    def stream(self, deadline=None, **params):
+        """
+        Run a streaming completion on the pool and yield its chunks here.
+        Closing the generator early (client went away) stops the upstream read.
+        """
+        deadline = deadline or self.timeout
+        end = time.monotonic() + deadline
+        chunks = queue.Queue()
+        stop = threading.Event()
+
+        def run():
+            try:
+                upstream = self.client.chat.completions.create(stream=True, timeout=deadline, **params)
+                try:
+                    for chunk in upstream:
+                        if stop.is_set():
+                            break
+                        chunks.put(chunk)
+                finally:
+                    upstream.close()
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(_END)
+
+        self._submit(run, deadline)
+        try:
+            while True:
+                try:
+                    item = chunks.get(timeout=max(0.0, end - time.monotonic()))
+                except queue.Empty:
+                    raise LLMTimeoutError(f"LLM stream exceeded {deadline}s")
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+
+gateway = LLMGateway(
+    max_workers=int(os.getenv("LLM_MAX_WORKERS", "8")),
+    max_pending=int(os.getenv("LLM_MAX_PENDING", "32")),
+    max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "16")),
+    timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+)
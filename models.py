@@ -1,8 +1,10 @@
 
 from datetime import datetime, date
+from sqlalchemy import select, tuple_, union_all
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from db import db
+from search import html_to_text
 
 
 # ===================== USER =====================
@@ -26,11 +28,18 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+    @classmethod
+    def by_username(cls, username):
+        return cls.query.filter_by(username=username)
+
 
 
 # ===================== CHAT SESSION =====================
 class ChatSession(db.Model):
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        db.Index("ix_chat_sessions_user_archived_updated", "user_id", "archived", "updated_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -39,6 +48,10 @@ class ChatSession(db.Model):
     pinned = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    summary = db.Column(db.Text)                          # rolling summary of older turns
+    summary_upto_id = db.Column(db.Integer, default=0)    # last Message.id folded into summary
+    summary_failures = db.Column(db.Integer, default=0)   # consecutive failed folds
+    summary_retry_after = db.Column(db.DateTime)          # no new fold job before this
 
     messages = db.relationship(
         "Message",
@@ -47,10 +60,19 @@ class ChatSession(db.Model):
         cascade="all, delete-orphan"
     )
 
+    @classmethod
+    def latest_for(cls, user_id):
+        """The user's most recently updated chat."""
+        return cls.query.filter_by(user_id=user_id).order_by(cls.updated_at.desc()).limit(1)
+
 
 # ===================== MESSAGE =====================
 class Message(db.Model):
     __tablename__ = "messages"
+    __table_args__ = (
+        db.Index("ix_messages_session_created", "session_id", "created_at"),
+        db.Index("ix_messages_session_id", "session_id", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -63,12 +85,27 @@ class Message(db.Model):
     emotion = db.Column(db.String(50))
     score = db.Column(db.Float)
     crisis_flag = db.Column(db.Boolean, default=False)
+    # bot replies only: "llm", or the fast_path intent that answered locally
+    reply_path = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @classmethod
+    def page_for(cls, session_id, before=None, limit=50):
+        """Messages older than `before` (an id), newest first; one extra row tells if there are more."""
+        q = cls.query.filter(cls.session_id == session_id)
+        if before is not None:
+            q = q.filter(cls.id < before)
+        return q.order_by(cls.id.desc()).limit(limit + 1)
+
 
 # ===================== ASSIGNMENT =====================
 class Assignment(db.Model):
     __tablename__ = "assignments"
+    __table_args__ = (
+        db.Index("ix_assignments_user_due_status", "user_id", "due_date", "status"),
+        # reminder scheduler startup load: upcoming due dates across all users
+        db.Index("ix_assignments_due_date", "due_date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -84,25 +121,150 @@ class Assignment(db.Model):
 
 class Note(db.Model):
     __tablename__ = 'notes'
+    __table_args__ = (
+        # notes list keyset page: newest first, id breaks created_at ties
+        db.Index("ix_notes_user_created_id", "user_id", db.text("created_at DESC"), db.text("id DESC")),
+        db.Index("ix_notes_reminder_at", "reminder_at"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     title = db.Column(db.String(200), default="Untitled")
     content = db.Column(db.Text, nullable=False)
     tags = db.Column(db.String(200), default="")
     reminder_at = db.Column(db.DateTime, nullable=True)
-    shared_with = db.Column(db.String(400), default="")
+    content_text = db.Column(db.Text)           # html_to_text(content), what search indexes
+    # read-only compatibility shadow of the pre-note_shares schema: nothing
+    # writes it any more and only migrate_note_shares() reads it. Shares live
+    # in NoteShare. Drop the column once every deployment has run upgrade-db.
+    shared_with = db.deferred(db.Column(db.String(400)))
     attachments = db.Column(db.String(1000), default="") 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
+
+    shares = db.relationship("NoteShare", backref="note", lazy=True, cascade="all, delete-orphan")
+    files = db.relationship("Attachment", backref="note", lazy=True, order_by="Attachment.id")
+
+    @classmethod
+    def page_for(cls, user_id, before=None, limit=20, head_chars=400):
+        """
+        One keyset page of the notes visible to a user, newest first.
+
+        before is the (created_at, id) of the last note on the previous page.
+        Only the first head_chars of content are read, for the excerpt. Each
+        half of the UNION walks its own index in order (ix_notes_user_created_id
+        and ix_note_shares_user_created) and stops after `limit` rows; only the
+        final merge of at most 2 * limit rows is sorted.
+        """
+        cols = (cls.id, cls.user_id, cls.title, cls.tags, cls.reminder_at, cls.created_at,
+                db.func.substr(cls.content, 1, head_chars).label("head"))
+
+        def half(q, created_at, note_id):
+            if before is not None:
+                at, nid = before
+                # row-value comparison, so SQLite can seek straight into the index
+                q = q.where(tuple_(created_at, note_id) < tuple_(at, nid))
+            q = q.order_by(created_at.desc(), note_id.desc()).limit(limit)
+            return select(q.subquery())
+
+        own = half(select(*cols).where(cls.user_id == user_id), cls.created_at, cls.id)
+        # sharing with yourself is refused, so the halves never overlap
+        shared = half(select(*cols)
+                      .select_from(NoteShare)
+                      .join(cls, cls.id == NoteShare.note_id)
+                      .where(NoteShare.user_id == user_id),
+                      NoteShare.note_created_at, NoteShare.note_id)
+        u = union_all(own, shared).subquery()
+        return select(u).order_by(u.c.created_at.desc(), u.c.id.desc()).limit(limit)
+
+
+@db.event.listens_for(Note, "before_insert")
+@db.event.listens_for(Note, "before_update")
+def _note_content_text(mapper, connection, note):
+    note.content_text = html_to_text(note.content)
+
+
+class NoteShare(db.Model):
+    """One row per (note, user it is shared with); replaces Note.shared_with."""
+    __tablename__ = "note_shares"
+    __table_args__ = (
+        db.Index("ix_note_shares_user_note", "user_id", "note_id"),
+        # shared half of Note.page_for, in the notes list order
+        db.Index("ix_note_shares_user_created", "user_id",
+                 db.text("note_created_at DESC"), db.text("note_id DESC")),
+    )
+
+    note_id = db.Column(db.Integer, db.ForeignKey("notes.id"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    note_created_at = db.Column(db.DateTime)    # copy of Note.created_at, which never changes
+
+    @classmethod
+    def usernames_for(cls, note_ids):
+        """(note_id, username) of everyone the notes are shared with, oldest share first."""
+        return (db.session.query(cls.note_id, User.username)
+                .join(User, User.id == cls.user_id)
+                .filter(cls.note_id.in_(note_ids))
+                .order_by(cls.created_at.asc()))
+
+    user = db.relationship("User")
+
+
+# ===================== ATTACHMENTS =====================
+class Blob(db.Model):
+    """One stored file per distinct content, shared by every attachment with that hash."""
+    __tablename__ = "blobs"
+    __table_args__ = (
+        db.Index("ix_blobs_refcount_unref", "refcount", "unreferenced_at"),
+    )
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # set when refcount drops to 0; gc-attachments removes the file after a grace period
+    unreferenced_at = db.Column(db.DateTime, nullable=True)
+
+
+class Attachment(db.Model):
+    """A file attached to a note: the user's filename pointing at a shared Blob."""
+    __tablename__ = "attachments"
+    __table_args__ = (
+        db.Index("ix_attachments_note_id", "note_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey("notes.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    blob_sha256 = db.Column(db.String(64), db.ForeignKey("blobs.sha256"), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100), nullable=False, default="application/octet-stream")
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.filename,
+            "size": self.size,
+            "content_type": self.content_type,
+            "url": f"/attachments/{self.id}/{self.filename}",
+        }
+
+
 class ExamHelper(db.Model):
     __tablename__ = 'exam_helpers'
-    
+    __table_args__ = (
+        db.Index("ix_exam_helpers_user_created", "user_id", "created_at"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     topic = db.Column(db.String(200), nullable=False)
     generated_content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user = db.relationship('User', backref=db.backref('exam_helpers', lazy=True))
+
+    @classmethod
+    def history_for(cls, user_id, limit=10):
+        return cls.query.filter_by(user_id=user_id).order_by(cls.created_at.desc()).limit(limit)
     
     def __repr__(self):
         return f'<ExamHelper {self.topic}>'
@@ -116,4 +278,155 @@ class ExamHelper(db.Model):
         }
 
 
+# ===================== EXAM GUIDE CACHE =====================
+class ExamGuideCache(db.Model):
+    """Shared (not per-user) exam guides, keyed on normalised topic + prompt version + model."""
+    __tablename__ = "exam_guide_cache"
+
+    key = db.Column(db.String(64), primary_key=True)
+    topic = db.Column(db.String(200), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_hit_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+# ===================== POMODORO =====================
+class PomodoroSession(db.Model):
+    """One finished (or cancelled) pomodoro; rows are only ever appended."""
+    __tablename__ = "pomodoro_sessions"
+    __table_args__ = (
+        db.Index("ix_pomodoro_user_date", "user_id", "date"),
+        db.Index("ix_pomodoro_user_id", "user_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)       # 0=Mon, 6=Sun
+    start = db.Column(db.String(20), default="")          # client's local clock time
+    end = db.Column(db.String(20), default="")
+    success = db.Column(db.Boolean, nullable=False, default=False)
+    work_minutes = db.Column(db.Integer, nullable=False, default=25)
+    note = db.Column(db.String(1000), default="")
+    reflection = db.Column(db.String(1000), default="")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def page_for(cls, user_id, before=None, limit=20):
+        """Sessions older than `before` (an id), newest first; one extra row tells if there are more."""
+        q = cls.query.filter(cls.user_id == user_id)
+        if before is not None:
+            q = q.filter(cls.id < before)
+        return q.order_by(cls.id.desc()).limit(limit + 1)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "date": self.date.isoformat(),
+            "weekday": self.weekday,
+            "start": self.start,
+            "end": self.end,
+            "success": self.success,
+            "work_minutes": self.work_minutes,
+            "note": self.note,
+            "reflection": self.reflection,
+        }
+
+
+class PomodoroRollup(db.Model):
+    """
+    Running totals per user and bucket, updated by every /pomodoro/log.
+    period is "day" (bucket 2026-10-18), "week" (ISO week 2026-W42) or
+    "weekday" (0=Mon .. 6=Sun, all time).
+    """
+    __tablename__ = "pomodoro_rollups"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    period = db.Column(db.String(10), primary_key=True)
+    bucket = db.Column(db.String(10), primary_key=True)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    successes = db.Column(db.Integer, nullable=False, default=0)
+    focus_minutes = db.Column(db.Integer, nullable=False, default=0)
+
 
+class PomodoroTotals(db.Model):
+    """All-time totals and success streaks per user (streaks need session order)."""
+    __tablename__ = "pomodoro_totals"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    successes = db.Column(db.Integer, nullable=False, default=0)
+    focus_minutes = db.Column(db.Integer, nullable=False, default=0)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    best_streak = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ===================== JOB QUEUE =====================
+class Job(db.Model):
+    """A unit of background work; see jobqueue.py for the state machine."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # what workers poll: next runnable job, and expired leases
+        db.Index("ix_jobs_status_run_after", "status", "run_after"),
+        db.Index("ix_jobs_status_locked_until", "status", "locked_until"),
+        # retention: finished jobs by age
+        db.Index("ix_jobs_status_updated_at", "status", "updated_at"),
+        # at most one queued/running job per dedup key
+        # the predicate text must match jobqueue.ACTIVE
+        db.Index("ux_jobs_dedup_active", "dedup_key", unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'running')"),
+                 postgresql_where=db.text("status IN ('queued', 'running')")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    dedup_key = db.Column(db.String(128), nullable=True)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.String(20), nullable=False, default="queued")   # queued/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ===================== RESOURCE VERSIONS =====================
+class ResourceVersion(db.Model):
+    """Per-user change counter for a cached JSON resource; see conditional.py."""
+    __tablename__ = "resource_versions"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    resource = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# ===================== REMINDER CHANGES =====================
+class ReminderChange(db.Model):
+    """Outbox of assignment / note reminder edits, polled by every worker's scheduler."""
+    __tablename__ = "reminder_changes"
+    __table_args__ = (
+        db.Index("ix_reminder_changes_created", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)        # assignment / note
+    item_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# ===================== BACKFILL CHECKPOINT =====================
+class BackfillCheckpoint(db.Model):
+    """Last primary key a resumable backfill job has finished, by job name."""
+    __tablename__ = "backfill_checkpoints"
+
+    name = db.Column(db.String(80), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,222 @@
+"""
+Pomodoro statistics from incrementally maintained rollups.
+
+log_pomodoro() calls apply_sessions() in the same transaction as the insert.
+That adds the batch to the user's day / ISO-week / weekday buckets
+(pomodoro_rollups) and to their all-time totals and streaks
+(pomodoro_totals). /pomodoro/stats then reads one row per day and week in
+the requested range, plus 7 weekday rows and 1 totals row. Its cost depends
+on the range, however many sessions the user has logged.
+
+Focus minutes count successful sessions only, as the old browser-side charts did.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from models import PomodoroSession, PomodoroRollup, PomodoroTotals
+
+
+WEEKDAY_LABELS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def week_key(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _upsert_insert():
+    """The dialect's insert() with on_conflict_do_update, or None."""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+
+def _upsert(rows):
+    """Add rows' counters onto existing rollup rows (INSERT ... ON CONFLICT DO UPDATE)."""
+    upsert_insert = _upsert_insert()
+    if upsert_insert is None:
+        for r in rows:
+            row = db.session.get(PomodoroRollup, (r["user_id"], r["period"], r["bucket"]))
+            if row is None:
+                db.session.add(PomodoroRollup(**r))
+            else:
+                row.sessions += r["sessions"]
+                row.successes += r["successes"]
+                row.focus_minutes += r["focus_minutes"]
+        return
+
+    stmt = upsert_insert(PomodoroRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "period", "bucket"],
+        set_={
+            "sessions": PomodoroRollup.sessions + stmt.excluded.sessions,
+            "successes": PomodoroRollup.successes + stmt.excluded.successes,
+            "focus_minutes": PomodoroRollup.focus_minutes + stmt.excluded.focus_minutes,
+        })
+    db.session.execute(stmt, rows)
+
+
+def apply_sessions(user_id, sessions):
+    """
+    Fold newly logged sessions (dicts with date, success, work_minutes, in
+    the order they happened) into the user's rollups. Caller commits.
+    """
+    buckets = defaultdict(lambda: [0, 0, 0])
+    for s in sessions:
+        minutes = s["work_minutes"] if s["success"] else 0
+        for key in (("day", s["date"].isoformat()),
+                    ("week", week_key(s["date"])),
+                    ("weekday", str(s["date"].weekday()))):
+            b = buckets[key]
+            b[0] += 1
+            b[1] += 1 if s["success"] else 0
+            b[2] += minutes
+
+    _upsert([
+        {"user_id": user_id, "period": period, "bucket": bucket,
+         "sessions": n, "successes": ok, "focus_minutes": minutes}
+        for (period, bucket), (n, ok, minutes) in buckets.items()
+    ])
+
+    _add_totals(user_id, sessions)
+
+
+def _streaks(sessions):
+    """(leading successes, trailing successes, longest run of successes) of a batch."""
+    runs = [0]
+    for s in sessions:
+        if s["success"]:
+            runs[-1] += 1
+        else:
+            runs.append(0)
+    return runs[0], runs[-1], max(runs)
+
+
+def _add_totals(user_id, sessions):
+    """
+    Add a batch onto the user's totals row in one statement, so concurrent
+    logs neither lose increments nor race on the first insert.
+
+    The streaks follow from the batch alone: if it has no failure the
+    current streak grows by its length, otherwise it restarts at the
+    trailing run. The best streak is the old best, the best run inside the
+    batch, or the old current streak extended by the leading run.
+    """
+    n = len(sessions)
+    successes = sum(1 for s in sessions if s["success"])
+    minutes = sum(s["work_minutes"] for s in sessions if s["success"])
+    lead, tail, best = _streaks(sessions)
+
+    greatest = func.max if db.engine.dialect.name == "sqlite" else func.greatest
+    changes = {
+        "sessions": PomodoroTotals.sessions + n,
+        "successes": PomodoroTotals.successes + successes,
+        "focus_minutes": PomodoroTotals.focus_minutes + minutes,
+        "current_streak": PomodoroTotals.current_streak + n if successes == n else tail,
+        "best_streak": greatest(PomodoroTotals.best_streak, best, PomodoroTotals.current_streak + lead),
+    }
+    first = {"user_id": user_id, "sessions": n, "successes": successes, "focus_minutes": minutes,
+             "current_streak": tail, "best_streak": best}
+
+    upsert_insert = _upsert_insert()
+    if upsert_insert is not None:
+        stmt = upsert_insert(PomodoroTotals).values(**first)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=["user_id"], set_=changes))
+        return
+
+    res = db.session.execute(update(PomodoroTotals).where(PomodoroTotals.user_id == user_id).values(**changes)
+                             .execution_options(synchronize_session=False))
+    if res.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(PomodoroTotals(**first))
+    except IntegrityError:
+        # another request inserted the row first
+        _add_totals(user_id, sessions)
+
+
+def rebuild(log=print, chunk=5000):
+    """Recompute every user's rollups from pomodoro_sessions (upgrade-db / repair)."""
+    db.session.query(PomodoroRollup).delete()
+    db.session.query(PomodoroTotals).delete()
+    db.session.commit()
+
+    done = 0
+    last_id = 0
+    while True:
+        rows = (db.session.query(PomodoroSession.id, PomodoroSession.user_id, PomodoroSession.date,
+                                 PomodoroSession.success, PomodoroSession.work_minutes)
+                .filter(PomodoroSession.id > last_id)
+                .order_by(PomodoroSession.id).limit(chunk).all())
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        by_user = defaultdict(list)
+        for r in rows:
+            by_user[r.user_id].append({"date": r.date, "success": r.success,
+                                       "work_minutes": r.work_minutes})
+        for user_id, sessions in by_user.items():
+            apply_sessions(user_id, sessions)
+        db.session.commit()
+        done += len(rows)
+
+    if done:
+        log(f"rebuilt pomodoro stats from {done} session(s)")
+    return done
+
+
+def _rate(successes, sessions):
+    return round(successes / sessions, 3) if sessions else 0
+
+
+def rollup_query(user_id, period, first, last):
+    return PomodoroRollup.query.filter(PomodoroRollup.user_id == user_id, PomodoroRollup.period == period,
+                                       PomodoroRollup.bucket >= first, PomodoroRollup.bucket <= last)
+
+
+def _rows(user_id, period, first, last):
+    return {r.bucket: r for r in rollup_query(user_id, period, first, last)}
+
+
+def stats(user_id, start, end):
+    """Chart-ready arrays for start..end (inclusive dates), plus all-time weekday and totals."""
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    daily = _rows(user_id, "day", start.isoformat(), end.isoformat())
+    weeks = sorted({week_key(d) for d in days})
+    weekly = _rows(user_id, "week", weeks[0], weeks[-1])
+    weekday = _rows(user_id, "weekday", "0", "6")
+    totals = db.session.get(PomodoroTotals, user_id)
+
+    def series(keys, rows):
+        got = [rows.get(k) for k in keys]
+        return {
+            "focus_minutes": [r.focus_minutes if r else 0 for r in got],
+            "sessions": [r.sessions if r else 0 for r in got],
+            "success_rate": [_rate(r.successes, r.sessions) if r else 0 for r in got],
+        }
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "daily": {"labels": [d.isoformat() for d in days], **series([d.isoformat() for d in days], daily)},
+        "weekly": {"labels": weeks, **series(weeks, weekly)},
+        "weekday": {"labels": WEEKDAY_LABELS, **series([str(i) for i in range(7)], weekday)},
+        "totals": {
+            "sessions": totals.sessions if totals else 0,
+            "focus_minutes": totals.focus_minutes if totals else 0,
+            "success_rate": _rate(totals.successes, totals.sessions) if totals else 0,
+            "current_streak": totals.current_streak if totals else 0,
+            "best_streak": totals.best_streak if totals else 0,
+        },
+    }
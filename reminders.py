@@ -0,0 +1,308 @@
+"""
+In-process reminder scheduler with Server-Sent Events delivery.
+
+The scheduler keeps a time-ordered heap of upcoming reminders:
+  * assignments: REMINDER_DAYS_BEFORE days before due_date at REMINDER_HOUR
+  * notes: at Note.reminder_at
+
+Every worker process runs a scheduler and pushes due reminders to the
+/reminders/stream connections it holds, so each client hears from the
+worker it is connected to. The heap is loaded once, in start(). After that
+it is only updated incrementally:
+
+  * the write routes call record() in the same transaction as their change,
+    which adds a row to the reminder_changes outbox, and then update the
+    local heap straight away (schedule_assignment / schedule_note / cancel)
+  * every REMINDER_POLL_SECONDS each scheduler reads the outbox rows it has
+    not seen (a primary-key range scan) and re-reads just those items, so a
+    reminder edited through another worker is on this heap within seconds
+
+Changed or deleted items are not removed from the heap. Their entry is
+replaced, and stale heap items are skipped when popped. Every reminder is
+also re-checked against the database before it fires.
+
+An assignment created or edited after its reminder time, but not yet past
+its due date (e.g. added in the evening for tomorrow, or due today), fires
+on the next tick, unless this worker already sent that same reminder (the
+poll brings back the worker's own changes too). load() does not replay
+those, since they fired before the restart.
+
+/reminders/stream holds its response open indefinitely, so run gunicorn with
+threaded workers (-k gthread --threads N); a sync worker would be tied up by
+a single open stream.
+"""
+import heapq
+import itertools
+import queue
+import threading
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func
+
+from db import db
+from models import Assignment, Note, ReminderChange
+
+
+Reminder = namedtuple("Reminder", "fire_at user_id payload")
+
+ASSIGNMENT = "assignment"
+NOTE = "note"
+
+
+def assignment_fire_at(due_date, days_before, hour):
+    return datetime.combine(due_date - timedelta(days=days_before), time(hour=hour))
+
+
+def upcoming_assignments_query(today):
+    return Assignment.query.filter(Assignment.due_date >= today, Assignment.status != "completed")
+
+
+def upcoming_notes_query(now):
+    return Note.query.filter(Note.reminder_at > now)
+
+
+def changes_query(after_id, limit=500):
+    """Outbox rows written after after_id, oldest first."""
+    return ReminderChange.query.filter(ReminderChange.id > after_id).order_by(ReminderChange.id).limit(limit)
+
+
+class ReminderScheduler:
+    def __init__(self):
+        self.app = None
+        self.days_before = 1
+        self.hour = 9
+        self.poll_seconds = 5
+        self.retention = timedelta(days=1)
+        self.heap = []                  # (fire_at, seq, key)
+        self.entries = {}               # key -> (seq, Reminder); the live version of each key
+        self.subscribers = {}           # user_id -> set of queue.Queue
+        self.sent = {}                  # assignment key -> last payload fired here
+        self.seq = itertools.count()
+        self.cond = threading.Condition()
+        self.last_change_id = 0         # highest reminder_changes.id applied here
+        self.next_purge = datetime.min
+        self.thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.days_before = app.config["REMINDER_DAYS_BEFORE"]
+        self.hour = app.config["REMINDER_HOUR"]
+        self.poll_seconds = app.config["REMINDER_POLL_SECONDS"]
+        self.retention = timedelta(hours=app.config["REMINDER_CHANGE_RETENTION_HOURS"])
+
+    # ---------- building reminders from rows ----------
+    def _assignment_reminder(self, a, now):
+        if a.due_date is None or a.status == "completed" or a.due_date < now.date():
+            return None
+        fire_at = assignment_fire_at(a.due_date, self.days_before, self.hour)
+        days = (a.due_date - now.date()).days
+        when = "today" if days == 0 else "tomorrow" if days == 1 else f"in {days} days"
+        return Reminder(fire_at, a.user_id, {
+            "kind": ASSIGNMENT,
+            "id": a.id,
+            "title": a.title,
+            "due_date": a.due_date.isoformat(),
+            "message": f"{a.title} is due {when}",
+        })
+
+    def _note_reminder(self, n, now):
+        if n.reminder_at is None or n.reminder_at < now:
+            return None
+        return Reminder(n.reminder_at, n.user_id, {
+            "kind": NOTE,
+            "id": n.id,
+            "title": n.title,
+            "reminder_at": n.reminder_at.strftime("%Y-%m-%d %H:%M"),
+            "message": f"Reminder: {n.title}",
+        })
+
+    def _upcoming(self, kind, row, now, late=False):
+        """
+        The reminder still to fire for a row, or None.
+
+        With late=True (a change to the row, not a reload) an assignment whose
+        reminder time has passed but which is not yet overdue fires now.
+        """
+        if row is None:
+            return None
+        if kind == ASSIGNMENT:
+            r = self._assignment_reminder(row, now)
+            if r and late and r.fire_at <= now:
+                if self.sent.get((ASSIGNMENT, row.id)) == r.payload:
+                    return None
+                return r._replace(fire_at=now)
+        else:
+            r = self._note_reminder(row, now)
+        return r if r and r.fire_at > now else None
+
+    def _put(self, key, reminder):
+        """Insert or replace one entry. Caller holds self.cond."""
+        if reminder is None:
+            self.entries.pop(key, None)
+            return
+        seq = next(self.seq)
+        self.entries[key] = (seq, reminder)
+        heapq.heappush(self.heap, (reminder.fire_at, seq, key))
+        self.cond.notify()
+
+    # ---------- called by the routes ----------
+    def record(self, kind, item_id):
+        """Queue the change for the other workers' schedulers. Caller commits."""
+        db.session.add(ReminderChange(kind=kind, item_id=item_id))
+
+    def schedule_assignment(self, a):
+        if self.app is None:
+            return
+        with self.cond:
+            self._put((ASSIGNMENT, a.id), self._upcoming(ASSIGNMENT, a, datetime.now(), late=True))
+
+    def schedule_note(self, n):
+        if self.app is None:
+            return
+        with self.cond:
+            self._put((NOTE, n.id), self._upcoming(NOTE, n, datetime.now()))
+
+    def cancel(self, kind, item_id):
+        with self.cond:
+            self.entries.pop((kind, item_id), None)
+
+    # ---------- loading ----------
+    def load(self):
+        """Fill the heap from the database once, at startup."""
+        # take the outbox position first: anything written while the rows
+        # below are read is replayed by the next poll
+        high = db.session.query(func.max(ReminderChange.id)).scalar() or 0
+        now = datetime.now()
+        loaded = {}
+        for a in upcoming_assignments_query(now.date()):
+            r = self._upcoming(ASSIGNMENT, a, now)
+            if r:
+                loaded[(ASSIGNMENT, a.id)] = r
+        for n in upcoming_notes_query(now):
+            loaded[(NOTE, n.id)] = self._note_reminder(n, now)
+
+        with self.cond:
+            # a route may have scheduled something meanwhile; its entry is newer
+            for key, r in loaded.items():
+                if key not in self.entries:
+                    self._put(key, r)
+            self.last_change_id = max(self.last_change_id, high)
+        db.session.remove()
+        return len(loaded)
+
+    def poll_changes(self, batch=500):
+        """Apply outbox rows written since the last poll, by any worker."""
+        changes = changes_query(self.last_change_id, batch).all()
+        if changes:
+            now = datetime.now()
+            keys = {(c.kind, c.item_id) for c in changes}
+            fresh = {}
+            for kind, model in ((ASSIGNMENT, Assignment), (NOTE, Note)):
+                ids = [item_id for k, item_id in keys if k == kind]
+                if ids:
+                    for row in model.query.filter(model.id.in_(ids)):
+                        fresh[(kind, row.id)] = row
+            with self.cond:
+                for key in keys:
+                    self._put(key, self._upcoming(key[0], fresh.get(key), now, late=True))
+                self.last_change_id = changes[-1].id
+
+        if datetime.now() >= self.next_purge:
+            cutoff = datetime.utcnow() - self.retention
+            ReminderChange.query.filter(ReminderChange.created_at < cutoff).delete()
+            db.session.commit()
+            today = datetime.now().date().isoformat()
+            with self.cond:
+                self.sent = {k: p for k, p in self.sent.items() if p["due_date"] >= today}
+            self.next_purge = datetime.now() + timedelta(hours=1)
+        db.session.remove()
+        return len(changes)
+
+    def _still_due(self, key, reminder):
+        """Re-read the row, in case it changed since it was scheduled."""
+        kind, item_id = key
+        now = datetime.now()
+        if kind == ASSIGNMENT:
+            row = db.session.get(Assignment, item_id)
+            fresh = row and self._assignment_reminder(row, now)
+            return bool(fresh) and fresh.payload["due_date"] == reminder.payload["due_date"]
+        row = db.session.get(Note, item_id)
+        return bool(row) and row.reminder_at is not None and \
+            row.reminder_at.strftime("%Y-%m-%d %H:%M") == reminder.payload["reminder_at"]
+
+    # ---------- firing ----------
+    def _pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self.heap)
+            live = self.entries.get(key)
+            if live and live[0] == seq:          # skip replaced / cancelled entries
+                del self.entries[key]
+                due.append((key, live[1]))
+                if key[0] == ASSIGNMENT:
+                    self.sent[key] = live[1].payload
+        return due
+
+    def run(self):
+        next_poll = datetime.now()
+        while True:
+            with self.cond:
+                now = datetime.now()
+                due = self._pop_due(now)
+                if not due and now < next_poll:
+                    wake = next_poll
+                    if self.heap:
+                        wake = min(wake, self.heap[0][0])
+                    self.cond.wait(timeout=max(0.0, (wake - now).total_seconds()))
+                    due = self._pop_due(datetime.now())
+
+            try:
+                with self.app.app_context():
+                    if datetime.now() >= next_poll:
+                        self.poll_changes()
+                        next_poll = datetime.now() + timedelta(seconds=self.poll_seconds)
+                        # a polled change may already be due
+                        with self.cond:
+                            due += self._pop_due(datetime.now())
+                    for key, reminder in due:
+                        if self._still_due(key, reminder):
+                            self.publish(reminder.user_id, reminder.payload)
+            except Exception:
+                self.app.logger.exception("reminder scheduler error")
+
+    def start(self):
+        """Load the heap now (before serving requests), then start the thread."""
+        with self.app.app_context():
+            count = self.load()
+        self.app.logger.info("reminder scheduler: %d upcoming reminder(s)", count)
+        self.thread = threading.Thread(target=self.run, name="reminder-scheduler", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    # ---------- SSE subscribers ----------
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=100)
+        with self.cond:
+            self.subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self.cond:
+            subs = self.subscribers.get(user_id)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self.subscribers[user_id]
+
+    def publish(self, user_id, payload):
+        with self.cond:
+            subs = list(self.subscribers.get(user_id, ()))
+        for q in subs:
+            try:
+                q.put_nowait(payload)
+            except queue.Full:
+                pass            # client stopped reading; it reloads the panel on reconnect
+
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,329 @@
+"""
+Keeping an existing database in step with models.py.
+
+db.create_all() only creates missing tables; it never adds a column or an
+index to a table that already exists in instance/app.db. upgrade() fills that
+gap and is exposed as `flask --app app upgrade-db`.
+
+check_query_plans() runs EXPLAIN QUERY PLAN over the queries our routes issue
+and reports any that fall back to a full table scan
+(`flask --app app check-query-plans`, exits non-zero on failure).
+"""
+import re
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, inspect, text
+from db import db
+
+
+# table -> {column name: SQL type / default used for ALTER TABLE}
+ADDED_COLUMNS = {
+    "chat_sessions": {
+        "summary": "TEXT",
+        "summary_upto_id": "INTEGER DEFAULT 0",
+        "summary_failures": "INTEGER DEFAULT 0",
+        "summary_retry_after": "DATETIME",
+    },
+    "messages": {
+        "reply_path": "VARCHAR(20)",
+    },
+    "notes": {
+        "content_text": "TEXT",
+    },
+    "note_shares": {
+        "note_created_at": "DATETIME",
+    },
+}
+
+
+def ensure_columns():
+    """Add any column listed in ADDED_COLUMNS that the live database is missing."""
+    insp = inspect(db.engine)
+    tables = set(insp.get_table_names())
+    with db.engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if table not in tables:
+                continue
+            existing = {c["name"] for c in insp.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def ensure_indexes(log=print):
+    """
+    Create every index declared on the models that the database is missing.
+
+    Each index is built in its own short transaction so live writers are only
+    held up for one index at a time, never for the whole migration.
+    """
+    created = []
+    sqlite = db.engine.dialect.name == "sqlite"
+    for table in db.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            with db.engine.begin() as conn:
+                if sqlite:
+                    conn.exec_driver_sql("PRAGMA busy_timeout = 30000")
+                existing = {i["name"] for i in inspect(conn).get_indexes(table.name)}
+                if index.name in existing:
+                    continue
+                log(f"creating index {index.name} on {table.name}")
+                index.create(conn)
+                created.append(index.name)
+
+    if created and sqlite:
+        # refresh planner statistics so the new indexes actually get picked
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    return created
+
+
+def migrate_note_shares(log=print, chunk=500):
+    """
+    Copy the old comma-separated Note.shared_with usernames into note_shares.
+    Safe to run more than once: pairs that already exist are skipped. The
+    column itself is no longer written, so this only ever picks up rows from
+    before the share table; remove it together with Note.shared_with.
+    """
+    from models import User, Note, NoteShare
+
+    added = 0
+    last_id = 0
+    while True:
+        notes = (db.session.query(Note.id, Note.shared_with)
+                 .filter(Note.id > last_id, Note.shared_with.isnot(None), Note.shared_with != "")
+                 .order_by(Note.id).limit(chunk).all())
+        if not notes:
+            break
+        last_id = notes[-1].id
+
+        wanted = {(n.id, u.strip()) for n in notes for u in n.shared_with.split(",") if u.strip()}
+        names = {u for _, u in wanted}
+        ids = dict(db.session.query(User.username, User.id).filter(User.username.in_(names)).all())
+        existing = set(db.session.query(NoteShare.note_id, NoteShare.user_id)
+                       .filter(NoteShare.note_id.in_([n.id for n in notes])).all())
+        created = dict(db.session.query(Note.id, Note.created_at)
+                       .filter(Note.id.in_([n.id for n in notes])).all())
+
+        for note_id, username in wanted:
+            uid = ids.get(username)
+            if uid is None or (note_id, uid) in existing:
+                continue
+            db.session.add(NoteShare(note_id=note_id, user_id=uid, note_created_at=created[note_id]))
+            existing.add((note_id, uid))
+            added += 1
+        db.session.commit()
+
+    if added:
+        log(f"migrated {added} note share(s)")
+    return added
+
+
+def migrate_note_share_dates(log=print):
+    """Copy notes.created_at onto note_shares rows written before note_created_at existed."""
+    res = db.session.execute(text(
+        "UPDATE note_shares SET note_created_at = "
+        "(SELECT created_at FROM notes WHERE notes.id = note_shares.note_id) "
+        "WHERE note_created_at IS NULL"))
+    db.session.commit()
+    if res.rowcount:
+        log(f"filled note dates for {res.rowcount} note share(s)")
+    return res.rowcount
+
+
+def migrate_note_text(log=print, chunk=500):
+    """Fill notes.content_text (the search index source) for rows written before it existed."""
+    from models import Note
+    from search import html_to_text
+
+    done = 0
+    while True:
+        rows = (db.session.query(Note.id, Note.content)
+                .filter(Note.content_text.is_(None)).limit(chunk).all())
+        if not rows:
+            break
+        db.session.execute(db.update(Note), [{"id": r.id, "content_text": html_to_text(r.content)}
+                                             for r in rows])
+        db.session.commit()
+        done += len(rows)
+
+    if done:
+        log(f"filled search text for {done} note(s)")
+    return done
+
+
+def migrate_attachments(upload_dir, log=print, chunk=200):
+    """
+    Move the old comma-separated Note.attachments files from upload_dir into
+    the content-addressed store and clear the column. Missing files are
+    skipped. The old files are left in place, so delete them by hand once
+    the migration has been checked.
+    """
+    import os
+    from models import Note
+    from attachments import attachment_store
+
+    added = 0
+    last_id = 0
+    while True:
+        notes = (Note.query
+                 .filter(Note.id > last_id, Note.attachments.isnot(None), Note.attachments != "")
+                 .order_by(Note.id).limit(chunk).all())
+        if not notes:
+            break
+        last_id = notes[-1].id
+
+        for note in notes:
+            for name in (x.strip() for x in note.attachments.split(",")):
+                path = os.path.join(upload_dir, name)
+                if not name or not os.path.isfile(path):
+                    continue
+                with open(path, "rb") as f:
+                    attachment_store.add(note, note.user_id, f, name)
+                added += 1
+            note.attachments = ""
+        db.session.commit()
+
+    if added:
+        log(f"migrated {added} attachment(s)")
+    return added
+
+
+def create_schema(log=print):
+    """Tables, columns and FTS indexes only: what a fresh database needs to serve requests."""
+    db.create_all()
+    ensure_columns()
+    migrate_note_share_dates(log=log)
+    # before the FTS triggers switch to content_text, so they never see NULLs
+    migrate_note_text(log=log)
+    from search import ensure_search_schema
+    ensure_search_schema(log=log)
+
+
+def upgrade(log=print, upload_dir=None):
+    db.create_all()
+    ensure_columns()
+    created = ensure_indexes(log=log)
+    migrate_note_shares(log=log)
+    migrate_note_share_dates(log=log)
+    if upload_dir:
+        migrate_attachments(upload_dir, log=log)
+
+    from models import PomodoroSession, PomodoroTotals
+    if db.session.query(PomodoroTotals.user_id).first() is None and \
+            db.session.query(PomodoroSession.id).first() is not None:
+        import pomodoro_stats
+        pomodoro_stats.rebuild(log=log)
+
+    migrate_note_text(log=log)
+    from search import ensure_search_schema
+    ensure_search_schema(log=log)
+    return created
+
+
+# ---------------------------------------------------------
+# QUERY PLAN CHECK
+# ---------------------------------------------------------
+
+def route_queries(user_id=1, session_id=1):
+    """
+    The read queries behind the hot routes and background loops, built by the
+    same functions the routes call, so the check cannot drift from them.
+    """
+    from sqlalchemy.orm import with_parent
+    import assignments_api
+    import chat_context
+    import jobqueue
+    import pomodoro_stats
+    import reminders
+    from conditional import NOTES
+    from models import (User, ChatSession, Message, Note, NoteShare, Attachment, Blob, ExamHelper,
+                        PomodoroSession, PomodoroTotals, ResourceVersion)
+    from search import INDEXES, search_statement, to_match
+    from sidebar import index_query
+
+    today = date.today()
+    now = datetime.utcnow()
+    session = ChatSession(id=session_id, user_id=user_id, summary_upto_id=0)
+    note = Note(id=1, user_id=user_id)
+    week = pomodoro_stats.week_key(today)
+    queries = {
+        "login": User.by_username("someone"),
+        "sidebar": index_query(user_id),
+        "index": ChatSession.latest_for(user_id),
+        "chat": Message.page_for(session_id, before=10**9),
+        "chat_context": chat_context.recent_query(session, exclude_id=10**9),
+        "chat_summary_fold": chat_context.fold_page_query(session, boundary=10**9, limit=10),
+        "assignments": assignments_api.list_query(user_id),
+        "assignments_reminders": assignments_api.reminders_query(user_id, today),
+        "assignments_due_today": assignments_api.due_today_query(user_id, today),
+        "notes_list": Note.page_for(user_id, before=(now, 10**9)),
+        "notes_shared_with": NoteShare.usernames_for([1, 2, 3]),
+        # the lazy loader behind Note.files
+        "note_attachments": db.select(Attachment).where(with_parent(note, Note.files)),
+        # db.session.get() lookups on every conditional GET and attachment download
+        "resource_version": db.select(ResourceVersion).filter_by(user_id=user_id, resource=NOTES),
+        "attachment": db.select(Attachment).filter_by(id=1),
+        "blob": db.select(Blob).filter_by(sha256="0" * 64),
+        "exam_history": ExamHelper.history_for(user_id),
+        "pomodoro_history": PomodoroSession.page_for(user_id, before=10**9),
+        "pomodoro_daily": pomodoro_stats.rollup_query(user_id, "day", today.isoformat(), today.isoformat()),
+        "pomodoro_weekly": pomodoro_stats.rollup_query(user_id, "week", week, week),
+        "pomodoro_totals": db.select(PomodoroTotals).filter_by(user_id=user_id),
+        "job_claim": jobqueue.runnable_query(now),
+        "job_exhausted": jobqueue.exhausted_query(now),
+        "job_purge": jobqueue.purge_query(now),
+        "job_dedup": jobqueue.active_query("exam:x"),
+        "reminder_changes": reminders.changes_query(0),
+        "reminder_load_assignments": reminders.upcoming_assignments_query(today),
+        "reminder_load_notes": reminders.upcoming_notes_query(now),
+    }
+    for name in INDEXES:
+        queries[f"search_{name}"] = search_statement(name, user_id, to_match("exam"), 20)
+    return queries
+
+
+def explain(conn, query):
+    stmt = getattr(query, "statement", query)   # ORM Query or Core select
+    # expand IN (...) lists into one placeholder per value
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    args = tuple(params[k] for k in compiled.positiontup) if compiled.positiontup else params
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), args).fetchall()
+    return [r[-1] for r in rows]
+
+
+def full_scans(plan, tables):
+    """Plan lines that read a whole table without an index ("SCAN notes", "SCAN TABLE notes AS n")."""
+    bad = []
+    for line in plan:
+        m = re.match(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$", line.strip())
+        if m and m.group(1) in tables:
+            bad.append(line)
+    return bad
+
+
+def check_query_plans(log=print):
+    """
+    Return the names of route queries whose plan contains a full table scan.
+
+    Plans are taken against an empty in-memory SQLite copy of the model
+    schema, so the result depends only on the declared indexes and not on
+    whatever statistics the live database happens to have.
+    """
+    from search import create_search_tables
+
+    engine = create_engine("sqlite://")
+    db.metadata.create_all(engine)
+    tables = set(db.metadata.tables)
+    failed = []
+    with engine.connect() as conn:
+        create_search_tables(conn)
+        for name, query in route_queries().items():
+            plan = explain(conn, query)
+            bad = full_scans(plan, tables)
+            log(f"{'FAIL' if bad else 'ok  '} {name}: " + " | ".join(plan))
+            if bad:
+                failed.append(name)
+    engine.dispose()
+    return failed
@@ -0,0 +1,175 @@
+"""
+Full-text search over messages, notes and exam guides (SQLite FTS5).
+
+Each searchable table gets an external-content FTS5 index, so the text is not
+stored twice. The content comes from a small view that adds an `owner` column
+("u<user_id>"). Every query matches on owner:u<id>, so the per-user filter
+runs inside the index instead of after the join. Triggers keep the indexes in
+step with inserts, updates and deletes.
+
+Note content is HTML. The index reads notes.content_text instead, a
+tag-stripped, entity-decoded copy kept up to date by a model event, so
+searching "span" or "style" does not match markup.
+"""
+import html
+import re
+
+from sqlalchemy import inspect, text
+from db import db
+
+
+# name -> (base table, indexed columns, title column for results)
+INDEXES = {
+    "messages": ("messages", ["text"], None),
+    "notes": ("notes", ["title", "content", "tags"], "title"),
+    "exam_guides": ("exam_helpers", ["topic", "generated_content"], "topic"),
+}
+
+# indexed column -> base table expression it is read from
+SOURCES = {
+    "notes": {"content": "content_text"},
+}
+
+MARK_START, MARK_END = "\x02", "\x03"
+
+
+def html_to_text(s):
+    """Visible text of an HTML fragment: tags dropped, entities decoded, whitespace collapsed."""
+    s = html.unescape(re.sub(r"<[^>]*>", " ", s or ""))
+    return " ".join(s.split())
+
+
+def _names(name):
+    return f"{name}_fts", f"{name}_fts_src"
+
+
+def _ddl(name):
+    table, cols, _ = INDEXES[name]
+    fts, src = _names(name)
+    source = SOURCES.get(name, {})
+    col_list = ", ".join(cols)
+    view_cols = ", ".join(f"{source[c]} AS {c}" if c in source else c for c in cols)
+    new_vals = ", ".join(f"new.{source.get(c, c)}" for c in cols)
+    old_vals = ", ".join(f"old.{source.get(c, c)}" for c in cols)
+    return [
+        f"CREATE VIEW IF NOT EXISTS {src} AS "
+        f"SELECT id, {view_cols}, 'u' || user_id AS owner FROM {table}",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{col_list}, owner, content='{src}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {col_list}, owner) VALUES (new.id, {new_vals}, 'u' || new.user_id); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}, owner) VALUES ('delete', old.id, {old_vals}, 'u' || old.user_id); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}, owner) VALUES ('delete', old.id, {old_vals}, 'u' || old.user_id); "
+        f"INSERT INTO {fts}(rowid, {col_list}, owner) VALUES (new.id, {new_vals}, 'u' || new.user_id); END",
+    ]
+
+
+def search_available():
+    return db.engine.dialect.name == "sqlite"
+
+
+def ensure_search_schema(log=print):
+    """Create missing FTS tables, views and triggers. New indexes are filled from existing rows."""
+    if not search_available():
+        return []
+    existing = set(inspect(db.engine).get_table_names())
+    created = []
+    with db.engine.begin() as conn:
+        for name in INDEXES:
+            fts, src = _names(name)
+            ddl = _ddl(name)
+            # the view / triggers changed (e.g. a new SOURCES entry): recreate and refill
+            stored = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'view' AND name = ?", (src,)).scalar()
+            outdated = stored is not None and \
+                " ".join(stored.split()) != " ".join(ddl[0].replace(" IF NOT EXISTS", "").split())
+            if outdated:
+                conn.exec_driver_sql(f"DROP VIEW {src}")
+                for suffix in ("ai", "ad", "au"):
+                    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            for stmt in ddl:
+                conn.exec_driver_sql(stmt)
+            if fts not in existing or outdated:
+                conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+                created.append(fts)
+                log(f"{'rebuilt' if outdated else 'created and filled'} {fts}")
+    return created
+
+
+def rebuild_search(log=print):
+    """Re-read every indexed row from its base table, then merge index segments."""
+    ensure_search_schema(log=log)
+    for name in INDEXES:
+        fts, _ = _names(name)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('optimize')")
+        log(f"rebuilt {fts}")
+
+
+def to_match(q):
+    """Turn free text into a safe FTS5 query: every word must match, the last one as a prefix."""
+    words = re.findall(r"\w+", q or "")[:12]
+    if not words:
+        return None
+    parts = [f'"{w}"' for w in words]
+    parts[-1] += "*"
+    return " ".join(parts)
+
+
+def clean_snippet(s):
+    s = html.escape(html_to_text(s))
+    return s.replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def create_search_tables(conn):
+    """Run the FTS DDL on a bare connection (the query plan check's scratch database)."""
+    for name in INDEXES:
+        for stmt in _ddl(name):
+            conn.exec_driver_sql(stmt)
+
+
+def search_statement(name, user_id, match, limit):
+    """The ranked MATCH query for one index, with its parameters bound."""
+    table, cols, title_col = INDEXES[name]
+    fts, _ = _names(name)
+    weights = ", ".join(["1.0"] * len(cols) + ["0.0"])     # owner column does not count
+    extra = ", t.session_id" if name == "messages" else ""
+    title = f", t.{title_col}" if title_col else ", NULL"
+    sql = (
+        f"SELECT t.id{title}{extra}, "
+        # column -1 lets FTS5 pick the column with the best match
+        f"snippet({fts}, -1, '{MARK_START}', '{MARK_END}', '…', 12), "
+        f"bm25({fts}, {weights}) AS rank "
+        f"FROM {fts} JOIN {table} t ON t.id = {fts}.rowid "
+        f"WHERE {fts} MATCH :q ORDER BY rank LIMIT :limit"
+    )
+    return text(sql).bindparams(q=f"owner:u{int(user_id)} AND ({match})", limit=limit)
+
+
+def _search_one(name, user_id, match, limit):
+    rows = db.session.execute(search_statement(name, user_id, match, limit)).all()
+
+    out = []
+    for r in rows:
+        item = {"type": name, "id": r[0], "title": r[1], "snippet": clean_snippet(r[-2]), "rank": r[-1]}
+        if name == "messages":
+            item["session_id"] = r[2]
+        out.append(item)
+    return out
+
+
+def search(user_id, q, types=None, limit=20):
+    """Ranked results for one user across the requested indexes, best match first."""
+    match = to_match(q)
+    if not match:
+        return []
+    results = []
+    for name in (types or INDEXES):
+        if name in INDEXES:
+            results.extend(_search_one(name, user_id, match, limit))
+    # bm25 is lower-is-better
+    results.sort(key=lambda r: r["rank"])
+    return results[:limit]
@@ -0,0 +1,130 @@
+"""
+Per-user sidebar chat index.
+
+inject_sessions() used to clean up empty chats and run two queries on every
+render_template call. The index is now built with one query and cached per
+user, tagged with the user's "chats" version counter (conditional.py). The
+routes that change a user's chats call invalidate(), which bumps that counter
+in the same transaction. The counter lives in the database, so a rename in one
+gunicorn worker makes the cached copy in every other worker stale on its next
+read. A cache hit costs one primary-key lookup.
+
+Deleting old empty chats is done in the background, so page renders never
+write. Every worker runs a small timer, but the sweep itself is a job that
+waits in the queue for the next interval boundary, and while it waits the
+other workers' timers find it there (dedup_key) instead of adding another.
+So it runs once per interval in total.
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, or_
+from db import db
+from models import ChatSession, Message
+from conditional import CHATS, bump, version
+from jobqueue import jobs
+
+
+SidebarEntry = namedtuple("SidebarEntry", "id title archived")
+
+
+def index_query(user_id):
+    """Archived chats plus active chats that have at least one message, newest first."""
+    has_messages = exists().where(Message.session_id == ChatSession.id)
+    return (db.session.query(ChatSession.id, ChatSession.title, ChatSession.archived)
+            .filter(ChatSession.user_id == user_id)
+            .filter(or_(ChatSession.archived == True, has_messages))
+            .order_by(ChatSession.updated_at.desc()))
+
+
+class SidebarIndex:
+    def __init__(self, maxsize=5000):
+        self.maxsize = maxsize
+        self.entries = {}               # user_id -> (chats version, entries)
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config["SIDEBAR_CACHE_SIZE"]
+
+    def _load(self, user_id):
+        rows = index_query(user_id).all()
+        # active first then archived, so templates can render both
+        active = [SidebarEntry(r.id, r.title, False) for r in rows if not r.archived]
+        archived = [SidebarEntry(r.id, r.title, True) for r in rows if r.archived]
+        return active + archived
+
+    def get(self, user_id):
+        current = version(user_id, CHATS)
+        with self.lock:
+            hit = self.entries.get(user_id)
+        if hit and hit[0] == current:
+            return hit[1]
+
+        items = self._load(user_id)
+        with self.lock:
+            if len(self.entries) >= self.maxsize:
+                self.entries.clear()
+            self.entries[user_id] = (current, items)
+        return items
+
+    def invalidate(self, user_ids):
+        """Mark one or several users' chat lists as changed, in every worker. Caller commits."""
+        bump(user_ids, CHATS)
+
+
+sidebar_index = SidebarIndex()
+
+
+# ---------------------------------------------------------
+# EMPTY CHAT SWEEPER
+# ---------------------------------------------------------
+
+def sweep_empty_chats(older_than_minutes=60):
+    """Delete chats with no messages that are older than the cutoff. Returns the count."""
+    cutoff = datetime.utcnow() - timedelta(minutes=older_than_minutes)
+    has_messages = exists().where(Message.session_id == ChatSession.id)
+    rows = (db.session.query(ChatSession.id, ChatSession.user_id)
+            .filter(ChatSession.created_at < cutoff)
+            .filter(~has_messages)
+            .all())
+    if not rows:
+        return 0
+
+    ChatSession.query.filter(ChatSession.id.in_([r.id for r in rows])).delete(synchronize_session=False)
+    sidebar_index.invalidate([r.user_id for r in rows])
+    db.session.commit()
+    return len(rows)
+
+
+@jobs.handler("sweep_empty_chats")
+def sweep_empty_chats_job(payload, job):
+    return {"deleted": sweep_empty_chats(payload["older_than_minutes"])}
+
+
+def queue_sweep(interval, older_than_minutes):
+    """Queue the sweep for the next interval boundary unless another worker already has."""
+    run_after = datetime.utcfromtimestamp((time.time() // interval + 1) * interval)
+    _, created = jobs.submit("sweep_empty_chats", {"older_than_minutes": older_than_minutes},
+                             dedup_key="sweep_empty_chats", run_after=run_after)
+    return created
+
+
+def start_sweeper(app):
+    interval = app.config["EMPTY_CHAT_SWEEP_INTERVAL"]
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    queue_sweep(interval, app.config["EMPTY_CHAT_MAX_AGE_MINUTES"])
+            except Exception:
+                app.logger.exception("empty chat sweeper error")
+
+    t = threading.Thread(target=run, name="empty-chat-sweeper", daemon=True)
+    t.start()
+    return t
@@ -1,188 +1,281 @@
 // static/chatgpt.js - final polished client
-const chatForm = document.getElementById("chat-form");
-const chatBox = document.getElementById("chat-box");
-const messageInput = document.getElementById("message");
-const suggestionsPlaceholder = document.getElementById("suggestions-placeholder");
-
-function scrollToBottom() {
-  if (!chatBox) return;
-  // small delay helps when images/code inserted
-  setTimeout(() => { chatBox.scrollTop = chatBox.scrollHeight; }, 40);
-}
 
-function autoResizeTextarea(el) {
-  if (!el) return;
-  el.style.height = "1px";
-  el.style.height = Math.min(el.scrollHeight, 420) + "px";
+// read a text/event-stream body and call onEvent(event, data) for each event.
+// Global on purpose: templates/chat.html loads this file for it.
+async function readEventStream(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let idx;
+    while ((idx = buf.indexOf("\n\n")) !== -1) {
+      const raw = buf.slice(0, idx);
+      buf = buf.slice(idx + 2);
+      let event = "message", data = "";
+      raw.split("\n").forEach(line => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
 }
 
-if (messageInput) {
-  messageInput.addEventListener("input", (e) => autoResizeTextarea(e.target));
-  autoResizeTextarea(messageInput);
-}
+// the markdown chat client below needs showdown; pages without it (chat.html
+// has its own sender) only use readEventStream, and nothing here leaks into them
+(function () {
+  if (!window.showdown) return;
+
+  const chatForm = document.getElementById("chat-form");
+  const chatBox = document.getElementById("chat-box");
+  const messageInput = document.getElementById("message");
+  const suggestionsPlaceholder = document.getElementById("suggestions-placeholder");
+
+  function scrollToBottom() {
+    if (!chatBox) return;
+    // small delay helps when images/code inserted
+    setTimeout(() => { chatBox.scrollTop = chatBox.scrollHeight; }, 40);
+  }
+
+  function autoResizeTextarea(el) {
+    if (!el) return;
+    el.style.height = "1px";
+    el.style.height = Math.min(el.scrollHeight, 420) + "px";
+  }
+
+  if (messageInput) {
+    messageInput.addEventListener("input", (e) => autoResizeTextarea(e.target));
+    autoResizeTextarea(messageInput);
+  }
 
-// showdown markdown converter
-const converter = new showdown.Converter({tables:true, simplifiedAutoLink:true, strikethrough:true, tasklists:true});
-if (window.hljs) { hljs.configure({ignoreUnescapedHTML: true}); }
+  // showdown markdown converter
+  const converter = new showdown.Converter({tables:true, simplifiedAutoLink:true, strikethrough:true, tasklists:true});
+  if (window.hljs) { hljs.configure({ignoreUnescapedHTML: true}); }
 
-// helper to create a message row (returns appended row)
-function appendUserMessage(text, timeLabel="just now") {
-  const row = document.createElement("div");
-  row.className = "msg-row right";
+  // helper to create a message row (returns appended row)
+  function appendUserMessage(text, timeLabel="just now", scroll=true) {
+    const row = document.createElement("div");
+    row.className = "msg-row right";
 
-  const bubble = document.createElement("div");
-  bubble.className = "msg user";
+    const bubble = document.createElement("div");
+    bubble.className = "msg user";
 
-  const meta = document.createElement("div");
-  meta.className = "meta";
-  meta.textContent = `You • ${timeLabel}`;
+    const meta = document.createElement("div");
+    meta.className = "meta";
+    meta.textContent = `You • ${timeLabel}`;
 
-  const content = document.createElement("div");
-  content.className = "content";
-  content.textContent = text;
+    const content = document.createElement("div");
+    content.className = "content";
+    content.textContent = text;
 
-  bubble.appendChild(meta);
-  bubble.appendChild(content);
+    bubble.appendChild(meta);
+    bubble.appendChild(content);
 
-  const avatar = document.createElement("div");
-  avatar.className = "msg-avatar user";
-  avatar.textContent = "You";
+    const avatar = document.createElement("div");
+    avatar.className = "msg-avatar user";
+    avatar.textContent = "You";
 
-  row.appendChild(bubble);
-  row.appendChild(avatar);
+    row.appendChild(bubble);
+    row.appendChild(avatar);
 
-  chatBox.appendChild(row);
-  scrollToBottom();
-  return {row, bubble, content};
-}
+    chatBox.appendChild(row);
+    if (scroll) scrollToBottom();
+    return {row, bubble, content};
+  }
 
-function appendAssistantMessageHtml(htmlContent, timeLabel="just now") {
-  const row = document.createElement("div");
-  row.className = "msg-row left";
+  function appendAssistantMessageHtml(htmlContent, timeLabel="just now", scroll=true) {
+    const row = document.createElement("div");
+    row.className = "msg-row left";
 
-  const avatar = document.createElement("div");
-  avatar.className = "msg-avatar bot";
-  avatar.textContent = "AI";
+    const avatar = document.createElement("div");
+    avatar.className = "msg-avatar bot";
+    avatar.textContent = "AI";
 
-  const bubble = document.createElement("div");
-  bubble.className = "msg bot";
+    const bubble = document.createElement("div");
+    bubble.className = "msg bot";
 
-  const meta = document.createElement("div");
-  meta.className = "meta";
-  meta.textContent = `Bot • ${timeLabel}`;
+    const meta = document.createElement("div");
+    meta.className = "meta";
+    meta.textContent = `Bot • ${timeLabel}`;
 
-  const content = document.createElement("div");
-  content.className = "content";
-  content.innerHTML = htmlContent;
+    const content = document.createElement("div");
+    content.className = "content";
+    content.innerHTML = htmlContent;
 
-  bubble.appendChild(meta);
-  bubble.appendChild(content);
+    bubble.appendChild(meta);
+    bubble.appendChild(content);
 
-  row.appendChild(avatar);
-  row.appendChild(bubble);
-  chatBox.appendChild(row);
+    row.appendChild(avatar);
+    row.appendChild(bubble);
+    chatBox.appendChild(row);
 
-  // highlight codeblocks if present
-  if (window.hljs) bubble.querySelectorAll('pre code').forEach((b) => hljs.highlightElement(b));
+    // highlight codeblocks if present
+    if (window.hljs) bubble.querySelectorAll('pre code').forEach((b) => hljs.highlightElement(b));
 
-  scrollToBottom();
-  return {row, bubble, content};
-}
+    if (scroll) scrollToBottom();
+    return {row, bubble, content};
+  }
 
-function createTypingNode() {
-  const row = document.createElement("div");
-  row.className = "msg-row left";
-  const avatar = document.createElement("div");
-  avatar.className = "msg-avatar bot";
-  avatar.textContent = "AI";
-
-  const bubble = document.createElement("div");
-  bubble.className = "msg typing";
-
-  const meta = document.createElement("div");
-  meta.className = "meta";
-  meta.textContent = `Bot • just now`;
-
-  const content = document.createElement("div");
-  content.className = "content";
-  content.innerHTML = `<span class="typing-dots"><span></span><span></span><span></span></span>`;
-
-  bubble.appendChild(meta);
-  bubble.appendChild(content);
-  row.appendChild(avatar);
-  row.appendChild(bubble);
-  chatBox.appendChild(row);
-  scrollToBottom();
-  return row;
-}
+  function createTypingNode() {
+    const row = document.createElement("div");
+    row.className = "msg-row left";
+    const avatar = document.createElement("div");
+    avatar.className = "msg-avatar bot";
+    avatar.textContent = "AI";
 
-if (chatForm) {
-  chatForm.addEventListener("submit", async (e) => {
-    e.preventDefault();
-    const text = (messageInput.value || "").trim();
-    if (!text) return;
+    const bubble = document.createElement("div");
+    bubble.className = "msg typing";
 
-    // append user message immediately
-    appendUserMessage(text, "just now");
-    messageInput.value = "";
-    autoResizeTextarea(messageInput);
+    const meta = document.createElement("div");
+    meta.className = "meta";
+    meta.textContent = `Bot • just now`;
 
-    // show typing
-    const typingNode = createTypingNode();
+    const content = document.createElement("div");
+    content.className = "content";
+    content.innerHTML = `<span class="typing-dots"><span></span><span></span><span></span></span>`;
 
-    // clear suggestions area
-    if (suggestionsPlaceholder) suggestionsPlaceholder.innerHTML = "AI suggestions will appear after each reply.";
+    bubble.appendChild(meta);
+    bubble.appendChild(content);
+    row.appendChild(avatar);
+    row.appendChild(bubble);
+    chatBox.appendChild(row);
+    scrollToBottom();
+    return row;
+  }
 
-    const sessionId = chatForm.dataset.session;
-    const data = new URLSearchParams();
-    data.append("message", text);
+  // older transcript pages, fetched when the user scrolls near the top
+  let loadingOlder = false;
 
+  async function loadOlderMessages() {
+    if (!chatBox || loadingOlder || chatBox.dataset.hasMore !== "true" || !chatBox.dataset.before) return;
+    loadingOlder = true;
     try {
-      const res = await fetch(`/send/${sessionId}`, { method: "POST", body: data });
-      const json = await res.json();
-
-      // remove typing
-      typingNode.remove();
-
-      // render assistant reply (supports markdown -> HTML)
-      const md = json.reply || "";
-      const html = converter.makeHtml(md);
-      const node = appendAssistantMessageHtml(html, "just now");
-
-      // render code highlight (if present)
-      if (window.hljs) node.bubble && node.bubble.querySelectorAll('pre code').forEach(b => hljs.highlightElement(b));
-
-      // suggestions
-      if (json.suggestions && json.suggestions.length && suggestionsPlaceholder) {
-        suggestionsPlaceholder.innerHTML = "";
-        const box = document.createElement("div");
-        box.className = "suggestion-box";
-        json.suggestions.forEach(s => {
-          const btn = document.createElement("button");
-          btn.className = "suggestion-btn";
-          btn.textContent = s;
-          btn.addEventListener("click", () => {
-            messageInput.value = s;
-            autoResizeTextarea(messageInput);
-            messageInput.focus();
-          });
-          box.appendChild(btn);
-        });
-        suggestionsPlaceholder.appendChild(box);
-      }
-
-      scrollToBottom();
-    } catch (err) {
-      typingNode.remove();
-      appendAssistantMessageHtml("<p><strong>System:</strong> Failed to send. Try again.</p>", "System");
+      const res = await fetch(`/chat/${chatBox.dataset.session}/messages?before=${chatBox.dataset.before}`);
+      const page = await res.json();
+      const fromBottom = chatBox.scrollHeight - chatBox.scrollTop;
+      const first = chatBox.firstChild;
+      page.messages.forEach(m => {
+        const node = m.role === "assistant"
+          ? appendAssistantMessageHtml(converter.makeHtml(m.text), m.time, false)
+          : appendUserMessage(m.text, m.time, false);
+        chatBox.insertBefore(node.row, first);
+      });
+      chatBox.scrollTop = chatBox.scrollHeight - fromBottom;
+      if (page.before) chatBox.dataset.before = page.before;
+      chatBox.dataset.hasMore = page.has_more ? "true" : "false";
+    } finally {
+      loadingOlder = false;
     }
-  });
+  }
+
+  if (chatBox) {
+    chatBox.addEventListener("scroll", () => {
+      if (chatBox.scrollTop < 200) loadOlderMessages();
+    });
+  }
 
-  // Enter to send, Shift+Enter for newline
-  messageInput.addEventListener("keydown", (e) => {
-    if (e.key === "Enter" && !e.shiftKey) {
+  if (chatForm) {
+    chatForm.addEventListener("submit", async (e) => {
       e.preventDefault();
-      chatForm.requestSubmit();
-    }
-  });
-}
+      const text = (messageInput.value || "").trim();
+      if (!text) return;
+
+      // append user message immediately
+      appendUserMessage(text, "just now");
+      messageInput.value = "";
+      autoResizeTextarea(messageInput);
+
+      // show typing
+      const typingNode = createTypingNode();
+
+      // clear suggestions area
+      if (suggestionsPlaceholder) suggestionsPlaceholder.innerHTML = "AI suggestions will appear after each reply.";
+
+      const sessionId = chatForm.dataset.session;
+      const data = new URLSearchParams();
+      data.append("message", text);
+
+      try {
+        const res = await fetch(`/send/${sessionId}?stream=1`, {
+          method: "POST",
+          headers: { "Accept": "text/event-stream" },
+          body: data
+        });
+
+        let json = null;
+        let node = null;
+        let partial = "";
+
+        if (res.body && (res.headers.get("Content-Type") || "").includes("text/event-stream")) {
+          // streaming: render tokens as they arrive, final markdown on "done"
+          await readEventStream(res, (event, payload) => {
+            if (event === "token") {
+              if (!node) {
+                typingNode.remove();
+                node = appendAssistantMessageHtml("", "just now");
+              }
+              partial += payload.text;
+              node.content.textContent = partial;
+              scrollToBottom();
+            } else if (event === "done" || event === "error") {
+              json = payload;
+            }
+          });
+        } else {
+          json = await res.json();
+        }
+
+        // remove typing
+        typingNode.remove();
+        json = json || { reply: partial, suggestions: [] };
+
+        // render assistant reply (supports markdown -> HTML)
+        const md = json.reply || "";
+        const html = converter.makeHtml(md);
+        if (node) {
+          node.content.innerHTML = html;
+        } else {
+          node = appendAssistantMessageHtml(html, "just now");
+        }
+
+        // render code highlight (if present)
+        if (window.hljs) node.bubble && node.bubble.querySelectorAll('pre code').forEach(b => hljs.highlightElement(b));
+
+        // suggestions
+        if (json.suggestions && json.suggestions.length && suggestionsPlaceholder) {
+          suggestionsPlaceholder.innerHTML = "";
+          const box = document.createElement("div");
+          box.className = "suggestion-box";
+          json.suggestions.forEach(s => {
+            const btn = document.createElement("button");
+            btn.className = "suggestion-btn";
+            btn.textContent = s;
+            btn.addEventListener("click", () => {
+              messageInput.value = s;
+              autoResizeTextarea(messageInput);
+              messageInput.focus();
+            });
+            box.appendChild(btn);
+          });
+          suggestionsPlaceholder.appendChild(box);
+        }
+
+        scrollToBottom();
+      } catch (err) {
+        typingNode.remove();
+        appendAssistantMessageHtml("<p><strong>System:</strong> Failed to send. Try again.</p>", "System");
+      }
+    });
+
+    // Enter to send, Shift+Enter for newline
+    messageInput.addEventListener("keydown", (e) => {
+      if (e.key === "Enter" && !e.shiftKey) {
+        e.preventDefault();
+        chatForm.requestSubmit();
+      }
+    });
+  }
+})();
@@ -1,5 +1,5 @@
 async function loadReminders(days = 3) {
-    const res = await fetch(`/api/assignments/reminders?days=${days}`);
+    const res = await fetch(`/api/assignments/reminders?days=${days}`, { cache: "no-cache" });
     const reminders = await res.json();
     const reminderBox = document.getElementById("reminder-panel");
     if (Array.isArray(reminders) && reminders.length > 0) {
@@ -51,71 +51,141 @@ function initQuickNotes() {
     loadNotes();
 }
 
+// ---------------------
+// NOTES LIST (paged, infinite scroll)
+// ---------------------
+let notesCursor = null;
+let notesDone = false;
+let notesLoading = false;
+let notesObserver = null;
+
+function attachmentsHtml(files) {
+    if (!files.length) return "<em>No attachments</em>";
+    return files.map(f => {
+        if (f.content_type.startsWith("image/")) {
+            return `<img src="${f.url}" class="thumb" 
+                    style="width:120px;border-radius:6px;margin:6px;cursor:pointer;"
+                    onclick="openImage('${f.url}')">`;
+        }
+        return `📎 <a target="_blank" href="${f.url}">${f.name}</a>`;
+    }).join("");
+}
+
+function noteItemHtml(n) {
+    return `
+        <div class="note-item" data-id="${n.id}">
+            <div class="note-title-row">
+                <span>${n.title}</span>
+                ${n.owned ? `<button class="tb-btn btn-note-delete" data-id="${n.id}">Delete</button>` : ""}
+            </div>
+
+            <div class="note-content" data-id="${n.id}">${n.excerpt}</div>
+            <button class="tb-btn btn-note-open" data-id="${n.id}">Open</button>
+
+            <div class="note-tags" style="font-size:12px;color:#3fa9ff;margin-top:6px;">
+                Tags: ${n.tags || "<em>none</em>"}
+            </div>
+
+            <!-- Upload attachments -->
+            <div style="margin-top:10px;">
+                <input type="file" class="note-file-input" data-id="${n.id}">
+                <button class="tb-btn btn-note-upload" data-id="${n.id}">Upload</button>
+            </div>
+
+            <!-- Attachments are loaded with the full note -->
+            <div class="attachments-box" data-id="${n.id}" style="margin-top:10px;"></div>
+
+            <!-- Share -->
+            <div style="margin-top:6px;">
+                <button class="tb-btn btn-share-note" data-id="${n.id}">Share</button>
+                <input class="share-username-input" data-id="${n.id}" type="text" placeholder="Friend username"
+                       style="width:130px;display:none;">
+                <button class="tb-btn btn-share-send" data-id="${n.id}" style="display:none;">Send</button>
+            </div>
+
+            <div style="font-size:11px;color:#18b46e;margin-top:6px;">
+                Shared with: ${n.shared_with || "<em>none</em>"}
+            </div>
+        </div>
+    `;
+}
+
+// fetch one note's full content + attachments and show it in place of the excerpt
+function openNote(id) {
+    return fetch('/notes/' + id, { cache: 'no-cache' })
+        .then(r => r.json())
+        .then(n => {
+            if (n.error) return alert(n.error);
+            const content = document.querySelector(`.note-content[data-id='${id}']`);
+            const box = document.querySelector(`.attachments-box[data-id='${id}']`);
+            const btn = document.querySelector(`.btn-note-open[data-id='${id}']`);
+            if (content) content.innerHTML = n.content;
+            if (box) box.innerHTML = attachmentsHtml(n.attachments);
+            if (btn) btn.remove();
+        });
+}
+
 function loadNotes() {
-    fetch('/notes/list')
+    notesCursor = null;
+    notesDone = false;
+    const container = document.getElementById('notes-list');
+    if (!container) return;
+    container.innerHTML = "";
+    loadMoreNotes();
+}
+
+function loadMoreNotes() {
+    if (notesLoading || notesDone) return;
+    notesLoading = true;
+
+    const url = '/notes/list' + (notesCursor ? '?cursor=' + encodeURIComponent(notesCursor) : '');
+    // no-cache: revalidate with the ETag; the server answers 304 if nothing changed
+    fetch(url, { cache: 'no-cache' })
         .then(r => r.json())
-        .then(notes => {
+        .then(page => {
             const container = document.getElementById('notes-list');
+            if (!container) return;
 
-            if (!notes.length) {
+            if (!notesCursor && !page.notes.length) {
                 container.innerHTML = "<div class='empty'>No notes yet.</div>";
-                return;
+            } else {
+                container.insertAdjacentHTML("beforeend", page.notes.map(noteItemHtml).join(""));
             }
 
-            container.innerHTML = notes.map(n => `
-                <div class="note-item" data-id="${n.id}">
-                    <div class="note-title-row">
-                        <span>${n.title}</span>
-                        <button class="tb-btn btn-note-delete" data-id="${n.id}">Delete</button>
-                    </div>
-
-                    <div class="note-content">${n.content}</div>
-
-                    <div class="note-tags" style="font-size:12px;color:#3fa9ff;margin-top:6px;">
-                        Tags: ${n.tags || "<em>none</em>"}
-                    </div>
-
-                    <!-- Upload attachments -->
-                    <div style="margin-top:10px;">
-                        <input type="file" class="note-file-input" data-id="${n.id}">
-                        <button class="tb-btn btn-note-upload" data-id="${n.id}">Upload</button>
-                    </div>
-
-                    <!-- Preview attachments -->
-                    <div class="attachments-box" data-id="${n.id}" style="margin-top:10px;">
-                        ${
-                            n.attachments.length
-                            ? n.attachments.map(f => {
-                                let low = f.toLowerCase();
-                                if (low.endsWith(".jpg") || low.endsWith(".png") || low.endsWith(".jpeg") || low.endsWith(".gif")) {
-                                    return `<img src="/static/uploads/notes/${f}" class="thumb" 
-                                            style="width:120px;border-radius:6px;margin:6px;cursor:pointer;"
-                                            onclick="openImage('/static/uploads/notes/${f}')">`;
-                                }
-                                return `📎 <a target="_blank" href="/static/uploads/notes/${f}">${f}</a>`;
-                            }).join("")
-                            : "<em>No attachments</em>"
-                        }
-                    </div>
-
-                    <!-- Share -->
-                    <div style="margin-top:6px;">
-                        <button class="tb-btn btn-share-note" data-id="${n.id}">Share</button>
-                        <input class="share-username-input" data-id="${n.id}" type="text" placeholder="Friend username"
-                               style="width:130px;display:none;">
-                        <button class="tb-btn btn-share-send" data-id="${n.id}" style="display:none;">Send</button>
-                    </div>
-
-                    <div style="font-size:11px;color:#18b46e;margin-top:6px;">
-                        Shared with: ${n.shared_with || "<em>none</em>"}
-                    </div>
-                </div>
-            `).join("");
+            notesCursor = page.next_cursor;
+            notesDone = !page.next_cursor;
 
             setupDeleteHandlers();
             setupUploadHandlers();
             setupShareHandlers();
-        });
+            setupOpenHandlers();
+            watchNotesEnd(container);
+        })
+        .finally(() => { notesLoading = false; });
+}
+
+// load the next page when the end of the list scrolls into view
+function watchNotesEnd(container) {
+    let sentinel = document.getElementById('notes-sentinel');
+    if (!sentinel) {
+        sentinel = document.createElement('div');
+        sentinel.id = 'notes-sentinel';
+        sentinel.style.height = '1px';
+    }
+    container.after(sentinel);
+
+    if (notesObserver) notesObserver.disconnect();
+    if (notesDone) return;
+    notesObserver = new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) loadMoreNotes();
+    });
+    notesObserver.observe(sentinel);
+}
+
+function setupOpenHandlers() {
+    document.querySelectorAll('.btn-note-open').forEach(btn => {
+        btn.onclick = () => openNote(btn.dataset.id);
+    });
 }
 function setupDeleteHandlers() {
     document.querySelectorAll('.btn-note-delete').forEach(btn => {
@@ -134,13 +204,16 @@ function setupUploadHandlers() {
 
             if (!input.files.length) return alert("Choose a file");
 
-            let fd = new FormData();
-            fd.append("file", input.files[0]);
-
-            fetch('/notes/upload/' + id, {method:"POST", body:fd})
+            // raw body, so the server can stream it straight into the store
+            const file = input.files[0];
+            fetch('/notes/upload/' + id, {
+                method:"POST",
+                body:file,
+                headers:{'Content-Type': file.type || 'application/octet-stream', 'X-Filename': encodeURIComponent(file.name)}
+            })
                 .then(r => r.json())
                 .then(res => {
-                    if (res.ok) loadNotes();
+                    if (res.ok) openNote(id);
                     else alert(res.error);
                 });
         };
@@ -83,20 +83,76 @@ window.initPomodoro = function () {
     })();
   }
 
+  // finished sessions wait in localStorage until the server has them, and
+  // are sent in one batch (also picks up anything left over while offline).
+  // Each carries a client id, so a flush removes exactly the ones it sent.
+  function pendingSessions() {
+    try {
+      return JSON.parse(localStorage.getItem("pomodoroQueue") || "[]");
+    } catch (e) {
+      return [];
+    }
+  }
+
+  function localDate() {
+    const d = new Date();
+    return `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, "0")}-${String(d.getDate()).padStart(2, "0")}`;
+  }
+
+  function sessionId() {
+    return window.crypto && crypto.randomUUID
+      ? crypto.randomUUID()
+      : Date.now().toString(36) + Math.random().toString(36).slice(2);
+  }
+
+  function sendQueued() {
+    let batch = pendingSessions();
+    if (!batch.length) return;
+    if (batch.some((s) => !s.id)) {
+      // queued by an older version of this page
+      batch = batch.map((s) => (s.id ? s : { ...s, id: sessionId() }));
+      localStorage.setItem("pomodoroQueue", JSON.stringify(batch));
+    }
+
+    return fetch("/pomodoro/log", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ sessions: batch }),
+    })
+      .then((r) => r.json())
+      .then((res) => {
+        if (!res.ok) return;
+        // the server logs at most one batch, in order; drop just those and
+        // keep anything queued while this request was in flight
+        const sent = new Set(batch.slice(0, res.logged).map((s) => s.id));
+        localStorage.setItem("pomodoroQueue",
+          JSON.stringify(pendingSessions().filter((s) => !sent.has(s.id))));
+      })
+      .catch(() => {});
+  }
+
+  // one request at a time: a flush asked for while one is in flight runs
+  // after it, and only sends what is still queued by then
+  let flushing = Promise.resolve();
+
+  function flushSessions() {
+    flushing = flushing.then(sendQueued);
+    return flushing;
+  }
+
   function logSession(success) {
-    const body = new URLSearchParams({
+    const queue = pendingSessions();
+    queue.push({
+      id: sessionId(),
       start: startTime || new Date().toLocaleTimeString(),
       end: new Date().toLocaleTimeString(),
       success: success ? "true" : "false",
       note: notesTextarea.value || "",
       work_minutes: workLen,
+      date: localDate(),
     });
-
-    return fetch("/pomodoro/log", {
-      method: "POST",
-      headers: { "Content-Type": "application/x-www-form-urlencoded" },
-      body,
-    }).then((r) => r.json());
+    localStorage.setItem("pomodoroQueue", JSON.stringify(queue));
+    return flushSessions();
   }
 
   function finishSession(success) {
@@ -121,63 +177,65 @@ window.initPomodoro = function () {
   }
 
   // History + stats + charts
+  let historyBefore = null;
+
+  function sessionItemHtml(s) {
+    const mark = s.success ? "✔️" : "✖️";
+    const note = s.note ? `<br><em>${s.note}</em>` : "";
+    return `<li>${s.date || ""} ${s.start} - ${s.end} ${mark}${note}</li>`;
+  }
+
+  function showOlderButton(hasMore) {
+    const old = document.getElementById("pomodoro-history-more");
+    if (old) old.remove();
+    if (!hasMore) return;
+    sessionList.insertAdjacentHTML(
+      "beforeend",
+      `<li id="pomodoro-history-more"><button class="tb-btn">Show older</button></li>`
+    );
+    document.querySelector("#pomodoro-history-more button").onclick = loadOlderSessions;
+  }
+
+  function loadOlderSessions() {
+    if (!historyBefore) return;
+    fetch("/pomodoro/history?before=" + historyBefore, { cache: "no-cache" })
+      .then((r) => r.json())
+      .then((page) => {
+        showOlderButton(false);
+        sessionList.insertAdjacentHTML("beforeend", page.sessions.map(sessionItemHtml).join(""));
+        historyBefore = page.before;
+        showOlderButton(page.has_more);
+      });
+  }
+
   function loadHistoryAndStats() {
-    fetch("/pomodoro/history")
+    fetch("/pomodoro/history", { cache: "no-cache" })
       .then((r) => r.json())
-      .then((list) => {
-        const totalSessions = list.length;
-        let focusMinutes = 0;
-        let currentStreak = 0;
-        let bestStreak = 0;
-
-        list.forEach((s) => {
-          if (s.success) {
-            focusMinutes += s.work_minutes || workLen;
-            currentStreak++;
-            if (currentStreak > bestStreak) bestStreak = currentStreak;
-          } else {
-            currentStreak = 0;
-          }
-        });
+      .then((page) => {
+        sessionList.innerHTML = page.sessions.map(sessionItemHtml).join("");
+        historyBefore = page.before;
+        showOlderButton(page.has_more);
+      });
 
+    // totals and charts come pre-aggregated from the server (last 14 days)
+    fetch("/pomodoro/stats?end=" + localDate(), { cache: "no-cache" })
+      .then((r) => r.json())
+      .then((stats) => {
         document.getElementById("stats-focus-min").textContent =
-          focusMinutes + " min";
+          stats.totals.focus_minutes + " min";
         document.getElementById("stats-sessions").textContent =
-          String(totalSessions);
+          String(stats.totals.sessions);
         document.getElementById("stats-streak").textContent =
-          String(bestStreak);
-
-        // history list
-        sessionList.innerHTML = list
-          .slice()
-          .reverse()
-          .map((s) => {
-            const mark = s.success ? "✔️" : "✖️";
-            const note = s.note ? `<br><em>${s.note}</em>` : "";
-            return `<li>${s.date || ""} ${s.start} - ${s.end} ${mark}${note}</li>`;
-          })
-          .join("");
-
-        loadCharts(list);
+          String(stats.totals.best_streak);
+
+        loadCharts(stats);
       });
   }
 
-  function loadCharts(list) {
-    const daily = {};
-    const weekly = [0, 0, 0, 0, 0, 0, 0]; // Mon-Sun
-
-    list.forEach((s) => {
-      if (!s.success) return;
-      const mins = s.work_minutes || workLen;
-      const dateKey = s.date || "Unknown";
-      daily[dateKey] = (daily[dateKey] || 0) + mins;
-
-      const w = typeof s.weekday === "number" ? s.weekday : 0;
-      weekly[w] += mins;
-    });
-
-    const dailyLabels = Object.keys(daily);
-    const dailyValues = Object.values(daily);
+  function loadCharts(stats) {
+    const dailyLabels = stats.daily.labels;
+    const dailyValues = stats.daily.focus_minutes;
+    const weekly = stats.weekday.focus_minutes; // Mon-Sun
 
     const dailyCtx = document.getElementById("dailyChart").getContext("2d");
     const weeklyCtx = document.getElementById("weeklyChart").getContext("2d");
@@ -205,7 +263,7 @@ window.initPomodoro = function () {
     weeklyChart = new Chart(weeklyCtx, {
       type: "line",
       data: {
-        labels: ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+        labels: stats.weekday.labels,
         datasets: [
           {
             label: "Weekly focus (min)",
@@ -298,5 +356,5 @@ window.initPomodoro = function () {
   // Init
   timer = duration;
   updateDisplay();
-  loadHistoryAndStats();
+  flushSessions().then(loadHistoryAndStats);
 };
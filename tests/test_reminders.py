@@ -0,0 +1,50 @@
+import os
+import sys
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminders import ASSIGNMENT, ReminderScheduler
+
+
+def assignment(due_date, status="pending"):
+    return SimpleNamespace(id=1, user_id=7, title="Problem set", due_date=due_date, status=status)
+
+
+def scheduler():
+    s = ReminderScheduler()
+    s.days_before, s.hour = 1, 9
+    return s
+
+
+def test_assignment_added_after_reminder_hour_fires_now():
+    s = scheduler()
+    now = datetime.combine(date.today(), datetime.min.time()) + timedelta(hours=20)
+    for due in (now.date(), now.date() + timedelta(days=1)):
+        r = s._upcoming(ASSIGNMENT, assignment(due), now, late=True)
+        assert r is not None and r.fire_at == now
+
+
+def test_reload_does_not_replay_missed_reminders():
+    s = scheduler()
+    now = datetime.combine(date.today(), datetime.min.time()) + timedelta(hours=20)
+    assert s._upcoming(ASSIGNMENT, assignment(now.date() + timedelta(days=1)), now) is None
+
+
+def test_overdue_or_completed_assignment_never_fires():
+    s = scheduler()
+    now = datetime.now()
+    assert s._upcoming(ASSIGNMENT, assignment(now.date() - timedelta(days=1)), now, late=True) is None
+    assert s._upcoming(ASSIGNMENT, assignment(now.date(), "completed"), now, late=True) is None
+
+
+def test_late_reminder_fires_once_per_worker():
+    s = scheduler()
+    now = datetime.combine(date.today(), datetime.min.time()) + timedelta(hours=20)
+    a = assignment(now.date() + timedelta(days=1))
+    with s.cond:
+        s._put((ASSIGNMENT, a.id), s._upcoming(ASSIGNMENT, a, now, late=True))
+        assert [key for key, _ in s._pop_due(now)] == [(ASSIGNMENT, a.id)]
+        # the same change comes back through the outbox poll
+        assert s._upcoming(ASSIGNMENT, a, now, late=True) is None
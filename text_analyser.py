@@ -0,0 +1,139 @@
+"""
+Single-pass text analyser for incoming chat messages.
+
+All lexicons (crisis phrases, emotion words, topic words) are compiled once
+into one trie-shaped alternation regex. One scan of the lower-cased text gives
+emotion, score, crisis flag and topic, and one tokenising regex gives the title
+words. Matching is by substring, as in the old detect_emotion / detect_topic,
+and overlapping phrases are all found.
+"""
+import re
+from collections import namedtuple
+
+
+CRISIS_PHRASES = [
+    "i want to die", "kill myself", "suicide", "i'll kill myself", "i can't go on"
+]
+
+# checked in this order; the first emotion with a hit wins
+EMOTIONS = [
+    ("stressed", 0.85, ["stressed", "stress", "overwhelmed", "pressure"]),
+    ("anxious", 0.8, ["anxious", "anxiety", "panic", "worried"]),
+    ("sad", 0.8, ["sad", "depressed", "unhappy", "down"]),
+    ("angry", 0.8, ["angry", "mad", "furious"]),
+    ("lonely", 0.75, ["alone", "lonely", "isolated"]),
+    ("happy", 0.9, ["happy", "great", "good", "awesome"]),
+]
+
+TOPICS = {
+    "study": ["study", "learn", "syllabus", "notes"],
+    "exam": ["exam", "test", "marks", "result", "prepare"],
+    "stress": ["stress", "pressure", "overwhelmed", "tired"],
+    "coding": ["python", "code", "debug", "error", "logic"],
+}
+
+STOPWORDS = {
+    "i","me","my","we","our","you","your","the","a","an","and","or","but","to","for","of","in","on",
+    "is","are","was","were","this","that","these","those","with","by","from","at","be","as","it's","its"
+}
+
+Analysis = namedtuple("Analysis", "emotion score crisis topic title_tokens")
+
+
+_NONE = 1 << 30   # "no hit" rank
+
+
+def _build():
+    # phrase -> (is crisis, best emotion rank, best topic rank); lower rank wins
+    table = {}
+
+    def add(p, crisis=False, emotion=_NONE, topic=_NONE):
+        c, e, t = table.get(p, (False, _NONE, _NONE))
+        table[p] = (c or crisis, min(e, emotion), min(t, topic))
+
+    for p in CRISIS_PHRASES:
+        add(p, crisis=True)
+    for rank, (_, _, words) in enumerate(EMOTIONS):
+        for w in words:
+            add(w, emotion=rank)
+    for rank, words in enumerate(TOPICS.values()):
+        for w in words:
+            add(w, topic=rank)
+
+    # the regex reports only the longest phrase starting at a position; any
+    # shorter phrase that is its prefix occurs there too, so fold those in
+    phrases = sorted(table, key=len, reverse=True)
+    kinds = {}
+    for q in phrases:
+        hits = [table[p] for p in phrases if q.startswith(p)]
+        kinds[q] = (any(h[0] for h in hits), min(h[1] for h in hits), min(h[2] for h in hits))
+    pattern = re.compile(_trie_regex(phrases))
+    return kinds, pattern
+
+
+def _trie_regex(words):
+    """
+    Alternation of `words` nested as a character trie, e.g. stress(?:ed)?.
+    re tries one branch per leading character instead of every phrase in turn.
+    """
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        alts = [re.escape(ch) + emit(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = "(?:" + "|".join(alts) + ")"
+        return body + "?" if "" in node else body
+
+    return emit(trie)
+
+
+_KINDS, _PATTERN = _build()
+_TOPIC_NAMES = list(TOPICS)
+_TOKEN = re.compile(r"[0-9A-Za-z]+")
+
+
+def analyse(text):
+    raw = text or ""
+    t = raw.lower()
+
+    crisis, emotion_rank, topic_rank = False, _NONE, _NONE
+    search = _PATTERN.search
+    m = search(t)
+    while m is not None:
+        c, e, tp = _KINDS[m.group()]
+        crisis = crisis or c
+        emotion_rank = min(emotion_rank, e)
+        topic_rank = min(topic_rank, tp)
+        # restart one character later so overlapping phrases are found too
+        m = search(t, m.start() + 1)
+
+    if crisis:
+        emotion, score = "crisis", 1.0
+    elif emotion_rank != _NONE:
+        emotion, score, _ = EMOTIONS[emotion_rank]
+    else:
+        emotion, score = "neutral", 0.5
+    topic = _TOPIC_NAMES[topic_rank] if topic_rank != _NONE else "general"
+
+    tokens = [w.lower() for w in _TOKEN.findall(raw)]
+    return Analysis(emotion, score, crisis, topic, tokens)
+
+
+def analyse_many(texts):
+    """analyse() for a list of texts (e.g. a backfill chunk)."""
+    return [analyse(t) for t in texts]
+
+
+def title_from_tokens(tokens, max_words=4):
+    words = [w for w in tokens if w not in STOPWORDS]
+    if not words:
+        words = tokens[:max_words]
+    words = words[:max_words]
+    title = " ".join(w.capitalize() for w in words).strip()
+    return title or "New Chat"